@@ -0,0 +1,68 @@
+"""Time to create many requests through `POST /request` one at a time and through one `POST /request/batch`.
+
+python -m benchmarks.bench_batch [--repeat 10] [--prompts 3] [--image-size 16384]
+"""
+
+import argparse
+import asyncio
+import functools
+import json
+import os
+import sys
+
+from litestar import Litestar
+from litestar.testing import AsyncTestClient
+
+from benchmarks.common import bench_client, measure
+
+BATCH_SIZES = (1, 10, 50)
+
+
+async def one_by_one(
+    client: AsyncTestClient[Litestar], project_id: str, size: int, prompts: int, image_size: int
+) -> None:
+    for _ in range(size):
+        response = await client.post(
+            "request",
+            # Distinct payloads so content addressing does not collapse the writes
+            files=[("images", os.urandom(image_size)) for _ in range(prompts)],
+            data={
+                "text": json.dumps(["a dog"] * prompts),
+                "id": json.dumps([None] * prompts),
+                "project_id": project_id,
+            },
+        )
+        if response.status_code != 202:
+            raise RuntimeError(response.text)
+
+
+async def batched(client: AsyncTestClient[Litestar], project_id: str, size: int, prompts: int, image_size: int) -> None:
+    response = await client.post(
+        "request/batch",
+        files=[("images", os.urandom(image_size)) for _ in range(size * prompts)],
+        data={"requests": json.dumps([{"project_id": project_id, "text": ["a dog"] * prompts}] * size)},
+    )
+    if response.status_code != 202 or any(result["status_code"] != 202 for result in response.json()):
+        raise RuntimeError(response.text)
+
+
+async def main(repeat: int, prompts: int, image_size: int) -> None:
+    sys.stdout.write(f"{prompts} prompts per request, latencies in ms\n")
+    sys.stdout.write(f"{'requests':>9} {'one by one p50':>15} {'batch p50':>10} {'speedup':>8}\n")
+    async with bench_client(metrics=False) as client:
+        project_id = (await client.post("project", json={"name": "bench"})).json()["id"]
+        for size in BATCH_SIZES:
+            single = await measure(functools.partial(one_by_one, client, project_id, size, prompts, image_size), repeat)
+            batch = await measure(functools.partial(batched, client, project_id, size, prompts, image_size), repeat)
+            sys.stdout.write(
+                f"{size:>9} {single['p50']:>15.1f} {batch['p50']:>10.1f} {single['p50'] / batch['p50']:>7.1f}x\n"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--prompts", type=int, default=3)
+    parser.add_argument("--image-size", type=int, default=16 * 1024)
+    args = parser.parse_args()
+    asyncio.run(main(args.repeat, args.prompts, args.image_size))
@@ -0,0 +1,59 @@
+"""Latency of `POST /request` as the number of prompts per request grows.
+
+python -m benchmarks.bench_create_request [--repeat 20] [--image-size 262144]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+from sqlalchemy import Engine, event
+
+from benchmarks.common import bench_client, measure
+
+PROMPT_COUNTS = (1, 5, 10, 20, 50)
+
+
+async def main(repeat: int, image_size: int) -> None:
+    statements = 0
+
+    def count(*_: object) -> None:
+        nonlocal statements
+        statements += 1
+
+    event.listen(Engine, "before_cursor_execute", count)
+    sys.stdout.write(f"{'prompts':>8} {'p50 ms':>9} {'p95 ms':>9} {'ms/prompt':>10} {'sql/request':>12}\n")
+    async with bench_client() as client:
+        project_id = (await client.post("project", json={"name": "bench"})).json()["id"]
+        for prompt_count in PROMPT_COUNTS:
+            # Distinct payloads so content addressing does not collapse the writes
+            files = [("images", os.urandom(image_size)) for _ in range(prompt_count)]
+            data = {
+                "text": json.dumps([f"prompt {i}" for i in range(prompt_count)]),
+                "id": json.dumps([None] * prompt_count),
+                "project_id": project_id,
+            }
+
+            async def create(files: list[tuple[str, bytes]] = files, data: dict[str, str] = data) -> None:
+                response = await client.post("request", files=files, data=data)
+                if response.status_code != 202:
+                    raise RuntimeError(response.text)
+
+            statements = 0
+            stats = await measure(create, repeat)
+            per_request = statements / repeat
+            sys.stdout.write(
+                f"{prompt_count:>8} {stats['p50']:>9.2f} {stats['p95']:>9.2f} "
+                f"{stats['p50'] / prompt_count:>10.2f} {per_request:>12.1f}\n"
+            )
+    event.remove(Engine, "before_cursor_execute", count)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--image-size", type=int, default=256 * 1024)
+    args = parser.parse_args()
+    asyncio.run(main(args.repeat, args.image_size))
@@ -0,0 +1,83 @@
+"""Event-loop lag while output generations run concurrently, with and without the resource cache.
+
+A ticker sleeps 1 ms in a loop and records how late it wakes up; every generation picks one of the
+largest resource files. Storage writes are discarded so only reading the resources is measured.
+
+python -m benchmarks.bench_event_loop_lag [--concurrency 32] [--rounds 20]
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from collections.abc import Awaitable, Callable, Sequence
+from pathlib import Path
+from uuid import UUID, uuid4
+
+from src.service.image_generation.generator import ResourcePath, generate_output, get_output
+from src.service.image_generation.resources import ResourceCache
+from src.service.storage.base import StorageServer
+from src.service.storage.local import LocalFileStorage
+
+TEXTS = ["a model wearing a hat, a bag and a shoe"]
+TICK = 0.001
+
+
+class DiscardStorage(LocalFileStorage):
+    async def create(self, image: bytes) -> UUID:
+        return uuid4()
+
+
+async def blocking_generate_output(texts: Sequence[str], storage: StorageServer) -> UUID:
+    # The generator before the resource cache
+    with Path(ResourcePath / await get_output(" ".join(texts))).open("rb") as file:
+        return await storage.create(file.read())
+
+
+async def run(generate: Callable[[], Awaitable[object]], concurrency: int, rounds: int) -> tuple[list[float], float]:
+    lags: list[float] = []
+    done = asyncio.Event()
+
+    async def ticker() -> None:
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(TICK)
+            lags.append((time.perf_counter() - start - TICK) * 1000)
+
+    task = asyncio.create_task(ticker())
+    start = time.perf_counter()
+    for _ in range(rounds):
+        await asyncio.gather(*(generate() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    done.set()
+    await task
+    return sorted(lags), concurrency * rounds / elapsed
+
+
+async def main(concurrency: int, rounds: int) -> None:
+    storage = DiscardStorage("bench")
+    cold = ResourceCache(ResourcePath, 0)
+    warm = ResourceCache(ResourcePath, 32 * 1024 * 1024)
+    await warm.preload([await get_output(" ".join(TEXTS))])
+    scenarios: dict[str, Callable[[], Awaitable[object]]] = {
+        "blocking read": lambda: blocking_generate_output(TEXTS, storage),
+        "threaded read, no cache": lambda: generate_output(TEXTS, storage, cold),
+        "preloaded cache": lambda: generate_output(TEXTS, storage, warm),
+    }
+    sys.stdout.write(f"{'scenario':<26} {'p50 lag':>9} {'p99 lag':>9} {'max lag':>9} {'gen/s':>9}\n")
+    for label, generate in scenarios.items():
+        lags, throughput = await run(generate, concurrency, rounds)
+        p99 = lags[min(len(lags) - 1, int(len(lags) * 0.99))]
+        sys.stdout.write(
+            f"{label:<26} {statistics.median(lags):>9.3f} {p99:>9.3f} {lags[-1]:>9.3f} {throughput:>9.0f}\n"
+        )
+    sys.stdout.write("lag in ms\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.concurrency, args.rounds))
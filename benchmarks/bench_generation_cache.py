@@ -0,0 +1,60 @@
+"""Time from `POST /request` to a finished job when the prompts were already generated and when they were not.
+
+python -m benchmarks.bench_generation_cache [--repeat 50] [--prompts 3] [--image-size 16384]
+"""
+
+import argparse
+import asyncio
+import functools
+import json
+import os
+import sys
+
+from litestar import Litestar
+from litestar.testing import AsyncTestClient
+
+from benchmarks.common import bench_client, measure
+from src.service.cache import generation_cache
+
+
+async def generate(client: AsyncTestClient[Litestar], project_id: str, texts: list[str], images: list[bytes]) -> None:
+    response = await client.post(
+        "request",
+        files=[("images", image) for image in images],
+        data={"text": json.dumps(texts), "id": json.dumps([None] * len(texts)), "project_id": project_id},
+    )
+    if response.status_code != 202:
+        raise RuntimeError(response.text)
+    while (job := (await client.get(response.headers["location"])).json())["status"] in ("pending", "running"):
+        await asyncio.sleep(0)
+    if job["status"] != "done":
+        raise RuntimeError(f"job {job['id']}: {job['status']}")
+
+
+async def fresh(client: AsyncTestClient[Litestar], project_id: str, prompts: int, images: list[bytes]) -> None:
+    # New texts every time, always a miss
+    await generate(client, project_id, [os.urandom(8).hex() for _ in range(prompts)], images)
+
+
+async def main(repeat: int, prompts: int, image_size: int) -> None:
+    images = [os.urandom(image_size) for _ in range(prompts)]
+    async with bench_client(metrics=False) as client:
+        project_id = (await client.post("project", json={"name": "bench"})).json()["id"]
+        miss = await measure(functools.partial(fresh, client, project_id, prompts, images), repeat)
+        texts = [f"a dog {i}" for i in range(prompts)]
+        await generate(client, project_id, texts, images)
+        hit = await measure(functools.partial(generate, client, project_id, texts, images), repeat)
+    sys.stdout.write(f"{prompts} prompts of {image_size} byte images, latencies in ms\n")
+    sys.stdout.write(f"{'':>6} {'p50':>9} {'p95':>9}\n")
+    for name, result in (("miss", miss), ("hit", hit)):
+        sys.stdout.write(f"{name:>6} {result['p50']:>9.2f} {result['p95']:>9.2f}\n")
+    sys.stdout.write(f"cache {generation_cache.stats()}\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--prompts", type=int, default=3)
+    parser.add_argument("--image-size", type=int, default=16 * 1024)
+    args = parser.parse_args()
+    asyncio.run(main(args.repeat, args.prompts, args.image_size))
@@ -0,0 +1,217 @@
+"""Throughput and p50/p95/p99 latency of the API under concurrent clients, with saved baselines.
+
+Every scenario runs on a fresh application served on the event loop: requests are created with 1 to 50
+prompts and images, updated, their images streamed, projects listed and large projects deleted.
+`--save` writes the results as a JSON baseline, `--compare` reports the change against one and exits
+non-zero when a scenario lost more throughput, or gained more p95 latency, than `--tolerance`.
+
+python -m benchmarks.bench_load [--concurrency 8] [--iterations 50] [--image-size 32768]
+    [--scenario NAME ...] [--save baseline.json] [--compare baseline.json] [--tolerance 0.2]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+from typing import Any
+
+import httpx
+
+from benchmarks.common import concurrent_client, latency_stats
+
+Operation = Callable[[], Awaitable[None]]
+
+
+def expect(response: httpx.Response, status: int) -> None:
+    if response.status_code != status:
+        raise RuntimeError(f"{response.request.method} {response.request.url}: {response.status_code} {response.text}")
+
+
+def request_form(project_id: str, prompts: int, image_size: int) -> dict[str, Any]:
+    # Distinct payloads so content addressing does not collapse the writes
+    return {
+        "files": [("images", os.urandom(image_size)) for _ in range(prompts)],
+        "data": {
+            "text": json.dumps([f"prompt {i}" for i in range(prompts)]),
+            "id": json.dumps([None] * prompts),
+            "project_id": project_id,
+        },
+    }
+
+
+async def create_project(client: httpx.AsyncClient, name: str) -> str:
+    response = await client.post("project", json={"name": name})
+    expect(response, 201)
+    project_id: str = response.json()["id"]
+    return project_id
+
+
+async def create_request(client: httpx.AsyncClient, project_id: str, prompts: int, image_size: int) -> dict[str, Any]:
+    response = await client.post("request", **request_form(project_id, prompts, image_size))
+    expect(response, 202)
+    body: dict[str, Any] = response.json()
+    return body
+
+
+def creating(prompts: int) -> Callable[[httpx.AsyncClient, int, int], Awaitable[list[Operation]]]:
+    async def prepare(client: httpx.AsyncClient, iterations: int, image_size: int) -> list[Operation]:
+        project_id = await create_project(client, "bench")
+
+        def operation(form: dict[str, Any]) -> Operation:
+            async def run() -> None:
+                expect(await client.post("request", **form), 202)
+
+            return run
+
+        return [operation(request_form(project_id, prompts, image_size)) for _ in range(iterations)]
+
+    return prepare
+
+
+async def updating(client: httpx.AsyncClient, iterations: int, image_size: int) -> list[Operation]:
+    project_id = await create_project(client, "bench")
+
+    def operation(request: dict[str, Any]) -> Operation:
+        # Keeps the prompts, with new texts and images
+        prompt_ids = [prompt["id"] for prompt in request["prompts"]]
+        form = request_form(project_id, len(prompt_ids), image_size)
+        form["data"]["text"] = json.dumps([f"updated {i}" for i in range(len(prompt_ids))])
+        form["data"]["id"] = json.dumps(prompt_ids)
+
+        async def run() -> None:
+            expect(await client.put(f"request/{request['id']}", **form), 202)
+
+        return run
+
+    return [operation(await create_request(client, project_id, 5, image_size)) for _ in range(iterations)]
+
+
+async def streaming(client: httpx.AsyncClient, iterations: int, image_size: int) -> list[Operation]:
+    request = await create_request(client, await create_project(client, "bench"), 1, 32 * image_size)
+    path = f"image/{request['prompts'][0]['image']}"
+
+    async def run() -> None:
+        response = await client.get(path)
+        expect(response, 200)
+        if len(response.content) != 32 * image_size:
+            raise RuntimeError(f"{path}: {len(response.content)} bytes")
+
+    return [run] * iterations
+
+
+async def listing(client: httpx.AsyncClient, iterations: int, image_size: int) -> list[Operation]:
+    for i in range(100):
+        await create_project(client, f"project {i}")
+
+    async def run() -> None:
+        response = await client.get("project", params={"limit": 100})
+        expect(response, 200)
+
+    return [run] * iterations
+
+
+async def deleting(client: httpx.AsyncClient, iterations: int, image_size: int) -> list[Operation]:
+    def operation(project_id: str) -> Operation:
+        async def run() -> None:
+            expect(await client.delete(f"project/{project_id}"), 204)
+
+        return run
+
+    operations = []
+    # 10 requests of 10 prompts each, a project per five iterations of the other scenarios
+    for i in range(max(1, iterations // 5)):
+        project_id = await create_project(client, f"large {i}")
+        for _ in range(10):
+            await create_request(client, project_id, 10, image_size // 8)
+        operations.append(operation(project_id))
+    return operations
+
+
+SCENARIOS: dict[str, Callable[[httpx.AsyncClient, int, int], Awaitable[list[Operation]]]] = {
+    "create request, 1 prompt": creating(1),
+    "create request, 10 prompts": creating(10),
+    "create request, 50 prompts": creating(50),
+    "update request, 5 prompts": updating,
+    "stream image": streaming,
+    "list projects": listing,
+    "delete large project": deleting,
+}
+
+
+async def drive(operations: list[Operation], concurrency: int) -> dict[str, float]:
+    """Run `operations` on `concurrency` clients, each taking the next one as soon as its last completed."""
+    pending = iter(operations)
+    samples: list[float] = []
+
+    async def client() -> None:
+        for operation in pending:
+            start = time.perf_counter()
+            await operation()
+            samples.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {"throughput": len(samples) / elapsed} | latency_stats(samples)
+
+
+async def run(scenario: str, concurrency: int, iterations: int, image_size: int) -> dict[str, float]:
+    async with concurrent_client() as client:
+        operations = await SCENARIOS[scenario](client, iterations, image_size)
+        return await drive(operations, concurrency)
+
+
+def compare(results: dict[str, dict[str, float]], baseline: dict[str, dict[str, float]], tolerance: float) -> bool:
+    """Write the change of every scenario against `baseline`, True when none regressed."""
+    passed = True
+    sys.stdout.write(f"\n{'scenario':<28} {'req/s':>9} {'p95 ms':>9} {'verdict':>10}\n")
+    for scenario, result in results.items():
+        if scenario not in baseline:
+            sys.stdout.write(f"{scenario:<28} {'':>9} {'':>9} {'new':>10}\n")
+            continue
+        throughput = result["throughput"] / baseline[scenario]["throughput"] - 1
+        p95 = result["p95"] / baseline[scenario]["p95"] - 1
+        regressed = throughput < -tolerance or p95 > tolerance
+        passed = passed and not regressed
+        verdict = "REGRESSED" if regressed else "ok"
+        sys.stdout.write(f"{scenario:<28} {throughput:>+9.1%} {p95:>+9.1%} {verdict:>10}\n")
+    return passed
+
+
+async def main(args: argparse.Namespace) -> None:
+    scenarios = args.scenario or list(SCENARIOS)
+    settings = {"concurrency": args.concurrency, "iterations": args.iterations, "image_size": args.image_size}
+    sys.stdout.write(", ".join(f"{key} {value}" for key, value in settings.items()) + ", latencies in ms\n")
+    sys.stdout.write(f"{'scenario':<28} {'req/s':>9} {'p50':>9} {'p95':>9} {'p99':>9}\n")
+    results = {}
+    for scenario in scenarios:
+        result = await run(scenario, args.concurrency, args.iterations, args.image_size)
+        results[scenario] = result
+        sys.stdout.write(
+            f"{scenario:<28} {result['throughput']:>9.1f} {result['p50']:>9.2f} "
+            f"{result['p95']:>9.2f} {result['p99']:>9.2f}\n"
+        )
+    if args.save:
+        args.save.write_text(json.dumps({"settings": settings, "scenarios": results}, indent=2) + "\n")
+    if args.compare:
+        baseline = json.loads(args.compare.read_text())
+        if baseline["settings"] != settings:
+            sys.stdout.write(f"\nbaseline was recorded with {baseline['settings']}\n")
+        if not compare(results, baseline["scenarios"], args.tolerance):
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--image-size", type=int, default=32 * 1024)
+    parser.add_argument("--scenario", action="append", choices=list(SCENARIOS))
+    parser.add_argument("--save", type=Path)
+    parser.add_argument("--compare", type=Path)
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    asyncio.run(main(parser.parse_args()))
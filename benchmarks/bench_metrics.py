@@ -0,0 +1,79 @@
+"""Overhead of the metrics instrumentation: route latency, SQL statement and storage metrics on and off.
+
+Every scenario runs against an application with the instrumentation and one without it; the cost of a
+single histogram observation is measured on its own.
+
+python -m benchmarks.bench_metrics [--repeat 300] [--prompts 20]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import timeit
+
+from litestar import Litestar
+from litestar.testing import AsyncTestClient
+
+from benchmarks.common import bench_client, measure
+from src.service.cache import project_tree_cache
+from src.service.metrics import Registry
+
+
+async def seed(client: AsyncTestClient[Litestar], prompts: int) -> dict[str, str]:
+    project_id = (await client.post("project", json={"name": "bench"})).json()["id"]
+    request = await client.post(
+        "request",
+        files=[("images", os.urandom(64 * 1024)) for _ in range(prompts)],
+        data={"text": json.dumps(["a dog"] * prompts), "id": json.dumps([None] * prompts), "project_id": project_id},
+    )
+    if request.status_code != 202:
+        raise RuntimeError(request.text)
+    body = request.json()
+    return {"project": project_id, "request": body["id"], "image": body["prompts"][0]["image"]}
+
+
+async def run(metrics: bool, repeat: int, prompts: int) -> dict[str, float]:
+    async with bench_client(metrics) as client:
+        ids = await seed(client, prompts)
+        paths = {
+            "GET /project/{id}": f"project/{ids['project']}",
+            "GET /request/{id}": f"request/{ids['request']}",
+            "GET /request": "request",
+            "GET /image/{id}": f"image/{ids['image']}",
+        }
+        p50: dict[str, float] = {}
+        for label, path in paths.items():
+
+            async def get(path: str = path) -> None:
+                res = await client.get(path)
+                if res.status_code != 200:
+                    raise RuntimeError(res.text)
+
+            await measure(get, 20)
+            p50[label] = (await measure(get, repeat))["p50"]
+        return p50
+
+
+async def main(repeat: int, prompts: int) -> None:
+    # Every project read goes to the database
+    project_tree_cache.max_bytes = 0
+    histogram = Registry().histogram("bench_seconds", "Bench", ("method", "route", "status"))
+    observe = timeit.timeit(lambda: histogram.observe(0.01, "GET", "/project/{id:uuid}", "200"), number=100_000)
+    sys.stdout.write(f"histogram observation: {observe / 100_000 * 1e9:.0f} ns\n\n")
+
+    off = await run(False, repeat, prompts)
+    on = await run(True, repeat, prompts)
+    sys.stdout.write(f"{'route':<20} {'off p50 ms':>11} {'on p50 ms':>10} {'overhead':>9}\n")
+    for label in off:
+        overhead = (on[label] - off[label]) / off[label]
+        sys.stdout.write(f"{label:<20} {off[label]:>11.3f} {on[label]:>10.3f} {overhead:>9.1%}\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=300)
+    parser.add_argument("--prompts", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.repeat, args.prompts))
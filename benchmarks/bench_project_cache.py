@@ -0,0 +1,86 @@
+"""Read throughput of GET /project/{id} under a mixed read/write load, with and without the tree cache.
+
+Every project holds a few requests with a few prompts each; writes rename a random prompt, which
+invalidates the cached tree of its project.
+
+python -m benchmarks.bench_project_cache [--projects 20] [--requests 10] [--prompts 4] [--operations 2000]
+    [--write-ratio 0.1]
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+import time
+
+from litestar import Litestar
+from litestar.testing import AsyncTestClient
+
+from benchmarks.common import bench_client
+from src.service.cache import project_tree_cache
+
+
+async def seed(client: AsyncTestClient[Litestar], projects: int, requests: int, prompts: int) -> dict[str, list[str]]:
+    """Return the prompt ids of every project."""
+    tree: dict[str, list[str]] = {}
+    for i in range(projects):
+        project_id = (await client.post("project", json={"name": f"project_{i}"})).json()["id"]
+        tree[project_id] = []
+        for _ in range(requests):
+            request_id = (await client.post("request/base", json={"project_id": project_id})).json()["id"]
+            for k in range(prompts):
+                res = await client.post(
+                    "prompt", files={"image": b""}, data={"text": f"prompt {k}", "request_id": request_id}
+                )
+                tree[project_id].append(res.json()["id"])
+    return tree
+
+
+async def run(
+    client: AsyncTestClient[Litestar], tree: dict[str, list[str]], operations: int, write_ratio: float
+) -> tuple[float, float, float]:
+    """Return reads/s, the p95 read latency in ms and the hit ratio."""
+    rng = random.Random(0)  # noqa: S311
+    project_ids = list(tree)
+    hits, misses = project_tree_cache.hits, project_tree_cache.misses
+    latencies: list[float] = []
+    for _ in range(operations):
+        project_id = rng.choice(project_ids)
+        if rng.random() < write_ratio:
+            prompt_id = rng.choice(tree[project_id])
+            res = await client.put(f"prompt/{prompt_id}", files={"image": b""}, data={"text": str(rng.random())})
+        else:
+            start = time.perf_counter()
+            res = await client.get(f"project/{project_id}")
+            latencies.append(time.perf_counter() - start)
+        if res.status_code != 200:
+            raise RuntimeError(f"{res.request.method} {res.request.url} answered {res.status_code}")
+    latencies.sort()
+    lookups = project_tree_cache.hits - hits + project_tree_cache.misses - misses
+    hit_ratio = (project_tree_cache.hits - hits) / lookups if lookups else 0.0
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000
+    return len(latencies) / sum(latencies), p95, hit_ratio
+
+
+async def main(projects: int, requests: int, prompts: int, operations: int, write_ratio: float) -> None:
+    max_bytes = project_tree_cache.max_bytes
+    async with bench_client() as client:
+        tree = await seed(client, projects, requests, prompts)
+        sys.stdout.write(f"{'cache':<10} {'reads/s':>9} {'p95 ms':>9} {'hit ratio':>10}\n")
+        for label, budget in (("disabled", 0), ("enabled", max_bytes)):
+            project_tree_cache.clear()
+            project_tree_cache.max_bytes = budget
+            throughput, p95, hit_ratio = await run(client, tree, operations, write_ratio)
+            sys.stdout.write(f"{label:<10} {throughput:>9.0f} {p95:>9.3f} {hit_ratio:>10.2%}\n")
+    project_tree_cache.max_bytes = max_bytes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--projects", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=10)
+    parser.add_argument("--prompts", type=int, default=4)
+    parser.add_argument("--operations", type=int, default=2000)
+    parser.add_argument("--write-ratio", type=float, default=0.1)
+    args = parser.parse_args()
+    asyncio.run(main(args.projects, args.requests, args.prompts, args.operations, args.write_ratio))
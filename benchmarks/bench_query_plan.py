@@ -0,0 +1,116 @@
+"""`EXPLAIN QUERY PLAN` and timings of the hot lookups before and after the schema upgrade.
+
+Builds a database in the pre-index schema, seeds it, then runs `create_missing_indexes` on it.
+Run with `python -m benchmarks.bench_query_plan [--projects 200] [--requests 20] [--prompts 10]`.
+"""
+
+import argparse
+import datetime as dt
+import sys
+import time
+import uuid
+from pathlib import Path
+from typing import Any
+
+from sqlalchemy import Connection, create_engine, insert, text
+
+from src.helpers import remove_database
+from src.model import Project, Prompt, Request
+from src.model.base import Base
+from src.model.migrate import create_missing_indexes
+
+DB = Path("bench_plan.sqlite")
+
+QUERIES = {
+    "project by name": "SELECT id FROM project_table WHERE name = :name",
+    "selectin Project.requests": "SELECT id FROM request_table WHERE project_id IN (:project_id)",
+    "selectin Request.prompts": "SELECT id, text FROM prompt_table WHERE request_id IN (:request_id)",
+    "cascade delete prompts": "DELETE FROM prompt_table WHERE request_id = :request_id",
+    "keyset page of prompts": (
+        "SELECT id FROM prompt_table WHERE (created_at, id) > (:created_at, :id) ORDER BY created_at, id LIMIT 101"
+    ),
+}
+
+
+def seed(connection: Connection, projects: int, requests: int, prompts: int) -> dict[str, object]:
+    start = dt.datetime(2024, 1, 1, tzinfo=dt.UTC)
+    project_rows: list[dict[str, Any]] = []
+    request_rows: list[dict[str, Any]] = []
+    prompt_rows: list[dict[str, Any]] = []
+    for p in range(projects):
+        project_id = uuid.uuid4()
+        project_rows.append({"id": project_id, "name": f"project {p}", "created_at": start, "updated_at": start})
+        for _ in range(requests):
+            request_id = uuid.uuid4()
+            request_rows.append({"id": request_id, "project_id": project_id, "created_at": start, "updated_at": start})
+            for i in range(prompts):
+                created = start + dt.timedelta(microseconds=len(prompt_rows))
+                prompt_rows.append(
+                    {
+                        "id": uuid.uuid4(),
+                        "text": f"prompt {i}",
+                        "request_id": request_id,
+                        "created_at": created,
+                        "updated_at": created,
+                    }
+                )
+    connection.execute(insert(Project), project_rows)
+    connection.execute(insert(Request), request_rows)
+    connection.execute(insert(Prompt), prompt_rows)
+    middle = prompt_rows[len(prompt_rows) // 2]
+    return {
+        "name": project_rows[-1]["name"],
+        "project_id": project_rows[-1]["id"].hex,
+        "request_id": request_rows[-1]["id"].hex,
+        "created_at": middle["created_at"].strftime("%Y-%m-%d %H:%M:%S.%f"),
+        "id": middle["id"].hex,
+    }
+
+
+def report(connection: Connection, params: dict[str, object], repeat: int) -> None:
+    for label, sql in QUERIES.items():
+        plan = connection.execute(text(f"EXPLAIN QUERY PLAN {sql}"), params).all()
+        nested = connection.begin_nested()
+        start = time.perf_counter()
+        for _ in range(repeat):
+            connection.execute(text(sql), params)
+        elapsed = (time.perf_counter() - start) * 1000 / repeat
+        nested.rollback()
+        sys.stdout.write(f"  {label:<28} {elapsed:>8.3f} ms\n")
+        for row in plan:
+            sys.stdout.write(f"      {row[-1]}\n")
+
+
+def main(projects: int, requests: int, prompts: int, repeat: int) -> None:
+    remove_database(DB)
+    engine = create_engine(f"sqlite:///{DB}")
+    try:
+        with engine.begin() as connection:
+            Base.metadata.create_all(connection)
+            # Start from the schema as it was before the indexes were declared
+            for table in Base.metadata.sorted_tables:
+                for index in table.indexes:
+                    index.drop(connection)
+            params = seed(connection, projects, requests, prompts)
+        sys.stdout.write(
+            f"{projects} projects, {projects * requests} requests, {projects * requests * prompts} prompts\n"
+        )
+        with engine.begin() as connection:
+            sys.stdout.write("before upgrade\n")
+            report(connection, params, repeat)
+            created = create_missing_indexes(connection)
+            sys.stdout.write(f"after upgrade (created {', '.join(created)})\n")
+            report(connection, params, repeat)
+    finally:
+        engine.dispose()
+        remove_database(DB)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--projects", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--prompts", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    main(args.projects, args.requests, args.prompts, args.repeat)
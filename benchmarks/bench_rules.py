@@ -0,0 +1,75 @@
+"""Cost of picking a generator output as the number of keyword rules grows.
+
+Compares the compiled `RuleSet` with the linear substring scan it replaced.
+
+python -m benchmarks.bench_rules [--repeat 200]
+"""
+
+import argparse
+import random
+import string
+import sys
+import time
+from collections.abc import Callable
+
+from src.service.image_generation.rules import Rule, RuleSet
+
+RULE_COUNTS = (10, 100, 1000, 10000)
+TEXT = "a model wearing a black leather jacket, sunglasses and white shoes walking a golden retriever " * 4
+
+
+def random_word(rng: random.Random) -> str:
+    return "".join(rng.choices(string.ascii_lowercase, k=rng.randint(5, 10)))
+
+
+def make_rules(count: int, rng: random.Random) -> list[Rule]:
+    rules = [
+        Rule(tuple(random_word(rng) for _ in range(rng.randint(1, 3))), (f"{i}.png",), rng.randint(0, 100))
+        for i in range(count)
+    ]
+    # A few rules that do apply, so both matchers return an output
+    rules += [Rule(("jacket",), ("jacket.png",), 50), Rule(("golden", "retriever"), ("golden.png",), 60)]
+    return rules
+
+
+def linear_scan(rules: list[Rule]) -> Callable[[str], Rule | None]:
+    ordered = sorted(rules, key=lambda rule: -rule.priority)
+
+    def match(text: str) -> Rule | None:
+        for rule in ordered:
+            if all(keyword in text for keyword in rule.keywords):
+                return rule
+        return None
+
+    return match
+
+
+def time_per_call(match: Callable[[str], Rule | None], repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        match(TEXT)
+    return (time.perf_counter() - start) * 1_000_000 / repeat
+
+
+def main(repeat: int) -> None:
+    rng = random.Random(0)  # noqa: S311
+    sys.stdout.write(f"{'rules':>8} {'linear us':>11} {'compiled us':>12} {'compile ms':>11}\n")
+    for count in RULE_COUNTS:
+        rules = make_rules(count, rng)
+        start = time.perf_counter()
+        compiled = RuleSet(rules)
+        compile_ms = (time.perf_counter() - start) * 1000
+        linear = linear_scan(rules)
+        if compiled.match(TEXT) != linear(TEXT):
+            raise RuntimeError("Compiled rules disagree with the linear scan")
+        sys.stdout.write(
+            f"{count:>8} {time_per_call(linear, repeat):>11.1f} {time_per_call(compiled.match, repeat):>12.1f} "
+            f"{compile_ms:>11.1f}\n"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    main(args.repeat)
@@ -0,0 +1,91 @@
+"""Serialization of the prompt/request lists and the project tree, through the DTOs and straight from rows.
+
+One project holds `--prompts` prompts spread over `--requests` requests, inserted directly into the
+database. The project tree cache is disabled so every read encodes the tree again.
+
+python -m benchmarks.bench_serialization [--prompts 10000] [--requests 100] [--repeat 10]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+from datetime import UTC, datetime
+from uuid import uuid4
+
+from litestar import Litestar
+from litestar.testing import AsyncTestClient
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from benchmarks.common import bench_client, measure
+from src.model import Project, Prompt, Request
+from src.service.cache import project_tree_cache
+from src.settings import get_settings
+
+PAGE = 1000
+
+
+async def seed(engine: AsyncEngine, prompts: int, requests: int) -> str:
+    now = datetime.now(UTC)
+    project_id = uuid4()
+    request_ids = [uuid4() for _ in range(requests)]
+    async with engine.begin() as connection:
+        await connection.execute(insert(Project), [{"id": project_id, "name": "bench"}])
+        await connection.execute(
+            insert(Request), [{"id": id, "project_id": project_id, "created_at": now} for id in request_ids]
+        )
+        await connection.execute(
+            insert(Prompt),
+            [
+                {"text": f"prompt {i}", "image": uuid4() if i % 2 else None, "request_id": request_ids[i % requests]}
+                for i in range(prompts)
+            ],
+        )
+    return str(project_id)
+
+
+async def read_pages(client: AsyncTestClient[Litestar], path: str) -> None:
+    cursor = None
+    while True:
+        res = await client.get(path, params={"limit": PAGE, **({"cursor": cursor} if cursor else {})})
+        if res.status_code != 200:
+            raise RuntimeError(res.text)
+        cursor = res.headers.get("x-next-cursor")
+        if cursor is None:
+            return
+
+
+async def main(prompts: int, requests: int, repeat: int) -> None:
+    project_tree_cache.max_bytes = 0
+    async with bench_client() as client:
+        project_id = await seed(client.app.state.db_engine, prompts, requests)
+
+        async def read_tree() -> None:
+            res = await client.get(f"project/{project_id}")
+            if res.status_code != 200:
+                raise RuntimeError(res.text)
+
+        scenarios = {
+            "project tree": read_tree,
+            f"prompt list ({PAGE}/page)": lambda: read_pages(client, "prompt"),
+            f"request list ({PAGE}/page)": lambda: read_pages(client, "request"),
+        }
+        sys.stdout.write(f"{'response':<26} {'path':<5} {'p50 ms':>9} {'p95 ms':>9}\n")
+        for label, action in scenarios.items():
+            for path, flag in (("dto", "0"), ("rows", "1")):
+                os.environ["FAST_SERIALIZATION"] = flag
+                get_settings.cache_clear()
+                stats = await measure(action, repeat)
+                sys.stdout.write(f"{label:<26} {path:<5} {stats['p50']:>9.2f} {stats['p95']:>9.2f}\n")
+    os.environ.pop("FAST_SERIALIZATION")
+    get_settings.cache_clear()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--prompts", type=int, default=10_000)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(main(args.prompts, args.requests, args.repeat))
@@ -0,0 +1,95 @@
+"""Reads and writes per second with concurrent readers and writers, rollback journal against WAL.
+
+Readers fetch a project tree (with the tree cache off) and the request list, writers create and
+rename projects. Both profiles run the same mix for the same duration on a fresh database.
+
+python -m benchmarks.bench_sqlite_profile [--seconds 5] [--readers 8] [--writers 2] [--requests 20]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+import httpx
+
+from benchmarks.common import concurrent_client
+from src.service.cache import project_tree_cache
+from src.settings import get_settings
+
+PROFILES = {
+    "rollback journal": {"SQLITE_JOURNAL_MODE": "DELETE", "SQLITE_SYNCHRONOUS": "FULL"},
+    "WAL": {"SQLITE_JOURNAL_MODE": "WAL", "SQLITE_SYNCHRONOUS": "NORMAL"},
+}
+
+
+async def seed(client: httpx.AsyncClient, requests: int) -> str:
+    project_id: str = (await client.post("project", json={"name": "bench"})).json()["id"]
+    for _ in range(requests):
+        res = await client.post("request/base", json={"project_id": project_id})
+        if res.status_code != 201:
+            raise RuntimeError(res.text)
+    return project_id
+
+
+async def run(seconds: float, readers: int, writers: int, requests: int) -> dict[str, float]:
+    latencies: dict[str, list[float]] = {"read": [], "write": []}
+    errors = 0
+    async with concurrent_client(metrics=False) as client:
+        project_id = await seed(client, requests)
+        deadline = time.perf_counter() + seconds
+
+        async def loop(kind: str, worker: int) -> None:
+            nonlocal errors
+            iteration = 0
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                if kind == "read":
+                    path = f"project/{project_id}" if iteration % 2 else "request"
+                    res = await client.get(path)
+                elif iteration % 2:
+                    res = await client.post("project", json={"name": f"writer {worker} {iteration}"})
+                else:
+                    res = await client.put(f"project/{project_id}", json={"name": f"bench {worker} {iteration}"})
+                if res.is_success:
+                    latencies[kind].append((time.perf_counter() - start) * 1000)
+                else:
+                    errors += 1
+                iteration += 1
+
+        await asyncio.gather(
+            *(loop("read", worker) for worker in range(readers)),
+            *(loop("write", worker) for worker in range(writers)),
+        )
+    result = {"errors": float(errors)}
+    for kind, samples in latencies.items():
+        samples.sort()
+        result[f"{kind}s/s"] = len(samples) / seconds
+        result[f"{kind} p50"] = statistics.median(samples) if samples else float("nan")
+        result[f"{kind} p95"] = samples[int(len(samples) * 0.95)] if samples else float("nan")
+    return result
+
+
+async def main(seconds: float, readers: int, writers: int, requests: int) -> None:
+    # Every project read goes to the database
+    project_tree_cache.max_bytes = 0
+    columns = ("reads/s", "read p50", "read p95", "writes/s", "write p50", "write p95", "errors")
+    sys.stdout.write(f"{readers} readers, {writers} writers, {seconds:g}s, latencies in ms\n")
+    sys.stdout.write(f"{'profile':<18}" + "".join(f"{column:>11}" for column in columns) + "\n")
+    for label, env in PROFILES.items():
+        os.environ.update(env)
+        get_settings.cache_clear()
+        result = await run(seconds, readers, writers, requests)
+        sys.stdout.write(f"{label:<18}" + "".join(f"{result[column]:>11.1f}" for column in columns) + "\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--requests", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.seconds, args.readers, args.writers, args.requests))
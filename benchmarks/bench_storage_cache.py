@@ -0,0 +1,50 @@
+"""Read and stream latency of a hot set of images, from disk and through the `CachedStorage` memory tier.
+
+Reads follow a Zipf-like popularity, a few images are requested most of the time.
+python -m benchmarks.bench_storage_cache [--repeat 2000] [--images 200] [--image-size 65536] [--cache-bytes 4194304]
+"""
+
+import argparse
+import asyncio
+import functools
+import os
+import random
+import sys
+from uuid import UUID
+
+from benchmarks.common import measure
+from src.service.storage import CachedStorage, LocalFileStorage, StorageServer
+
+
+async def access(storage: StorageServer, ids: list[UUID], weights: list[float], rng: random.Random) -> None:
+    (id,) = rng.choices(ids, weights)
+    await storage.read(id)
+    await storage.stream(id, "bytes=0-1023")
+
+
+async def main(repeat: int, images: int, image_size: int, cache_bytes: int) -> None:
+    disk = LocalFileStorage("bench", content_addressed=True)
+    try:
+        ids = [await disk.create(os.urandom(image_size)) for _ in range(images)]
+        weights = [1 / rank for rank in range(1, images + 1)]
+        cached = CachedStorage(disk, cache_bytes, image_size)
+        sys.stdout.write(f"{images} images of {image_size} bytes, {cache_bytes} bytes cached, latencies in ms\n")
+        sys.stdout.write(f"{'':>8} {'p50':>9} {'p95':>9}\n")
+        for name, storage in (("disk", disk), ("memory", cached)):
+            # Same sequence of images for both
+            rng = random.Random(0)  # noqa: S311
+            result = await measure(functools.partial(access, storage, ids, weights, rng), repeat)
+            sys.stdout.write(f"{name:>8} {result['p50']:>9.3f} {result['p95']:>9.3f}\n")
+        sys.stdout.write(f"cache {cached.stats()}\n")
+    finally:
+        await disk.delete_all()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=2000)
+    parser.add_argument("--images", type=int, default=200)
+    parser.add_argument("--image-size", type=int, default=64 * 1024)
+    parser.add_argument("--cache-bytes", type=int, default=4 * 1024 * 1024)
+    args = parser.parse_args()
+    asyncio.run(main(args.repeat, args.images, args.image_size, args.cache_bytes))
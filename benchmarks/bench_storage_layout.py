@@ -0,0 +1,80 @@
+"""Create/read/exists latency of `LocalFileStorage` against the number of stored files, flat vs sharded.
+
+Each store is filled with small files written directly, then a sample of operations is timed through
+the storage API. Run with `python -m benchmarks.bench_storage_layout [--sizes 1000 10000 100000]`.
+"""
+
+import argparse
+import asyncio
+import random
+import shutil
+import sys
+import tempfile
+import time
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+from uuid import UUID, uuid4
+
+from src.service.storage.local import LAYOUTS, LocalFileStorage, blob_path, safe_file_name
+
+PAYLOAD = b"x" * 512
+
+
+def fill(root: Path, layout: str, count: int) -> list[UUID]:
+    ids = [uuid4() for _ in range(count)]
+    for id in ids:
+        path = blob_path(root, safe_file_name(str(id)), layout)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(PAYLOAD)
+    return ids
+
+
+async def time_us(action: Callable[[UUID], Awaitable[object]], ids: list[UUID]) -> float:
+    start = time.perf_counter()
+    for id in ids:
+        await action(id)
+    return (time.perf_counter() - start) * 1_000_000 / len(ids)
+
+
+async def main(sizes: list[int], sample: int) -> None:
+    rng = random.Random(0)  # noqa: S311
+    sys.stdout.write(
+        f"{'files':>8} {'layout':>8} {'create us':>10} {'read us':>9} {'exists us':>10} {'missing us':>11} "
+        f"{'delete_all ms':>14}\n"
+    )
+    for size in sizes:
+        for layout in LAYOUTS:
+            root = Path(tempfile.mkdtemp(prefix=f"bench_{layout}_"))
+            try:
+                ids = fill(root, layout, size)
+                storage = LocalFileStorage(root, layout=layout)
+                existing = rng.sample(ids, min(sample, len(ids)))
+                missing = [uuid4() for _ in range(sample)]
+
+                async def create(_: UUID, storage: LocalFileStorage = storage) -> None:
+                    await storage.create(PAYLOAD)
+
+                async def exists(id: UUID, storage: LocalFileStorage = storage) -> bool:
+                    return await storage._exists(str(id))
+
+                create_us = await time_us(create, missing)
+                read_us = await time_us(storage.read, existing)
+                exists_us = await time_us(exists, existing)
+                missing_us = await time_us(storage.read, [uuid4() for _ in range(sample)])
+                start = time.perf_counter()
+                await storage.delete_all()
+                delete_ms = (time.perf_counter() - start) * 1000
+                sys.stdout.write(
+                    f"{size:>8} {layout:>8} {create_us:>10.1f} {read_us:>9.1f} {exists_us:>10.1f} "
+                    f"{missing_us:>11.1f} {delete_ms:>14.1f}\n"
+                )
+            finally:
+                shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--sample", type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(main(args.sizes, args.sample))
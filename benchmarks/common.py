@@ -0,0 +1,170 @@
+import functools
+import logging
+import statistics
+import time
+from collections.abc import AsyncGenerator, Awaitable, Callable
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+import httpx
+from advanced_alchemy.extensions.litestar import SQLAlchemyPlugin
+from litestar import Litestar
+from litestar.di import Provide
+from litestar.testing import AsyncTestClient
+from sqlalchemy import Engine, event
+
+from src.helpers import (
+    create_db_config,
+    provide_generation_queue,
+    provide_image_variants,
+    provide_read_session,
+    provide_transaction,
+    record_statement_metrics,
+    remove_database,
+    start_statement_timer,
+    upgrade_schema,
+)
+from src.router import (
+    ImageController,
+    JobController,
+    MetricsController,
+    ProjectController,
+    PromptController,
+    RequestController,
+    StatsController,
+)
+from src.service.database import ReadDatabase
+from src.service.image_generation.generator import preload_resources
+from src.service.jobs import GenerationQueue
+from src.service.metrics import MetricsMiddleware
+from src.service.storage.base import StorageServer
+from src.service.storage.cached import CachedStorage
+from src.service.storage.instrumented import InstrumentedStorage
+from src.service.storage.local import LocalFileStorage
+from src.service.variants import DerivativeCache, ImageVariants
+from src.service.variants.cache import DerivativePath
+from src.settings import get_settings
+
+__all__ = ("bench_app", "bench_client", "bench_storage", "concurrent_client", "latency_stats", "measure")
+
+
+BENCH_DB = Path("bench.sqlite")
+
+# The test client logs every request at INFO
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+
+@functools.lru_cache
+def bench_storage(metrics: bool = True) -> StorageServer:
+    # Shared by all requests like the storage of `src.app`, in front of the memory tier when enabled
+    settings = get_settings()
+    storage: StorageServer = LocalFileStorage("bench", content_addressed=True)
+    if metrics:
+        storage = InstrumentedStorage(storage)
+    if settings.storage_cache_bytes > 0:
+        storage = CachedStorage(storage, settings.storage_cache_bytes, settings.storage_cache_entry_bytes)
+    return storage
+
+
+@asynccontextmanager
+async def bench_app(metrics: bool = True) -> AsyncGenerator[Litestar, None]:
+    """Application wired like `src.app` against a throwaway database and storage directory.
+
+    `metrics=False` leaves out the request, SQL and storage instrumentation.
+    """
+
+    async def provide_bench_storage() -> AsyncGenerator[StorageServer, None]:
+        yield bench_storage(metrics)
+
+    remove_database(BENCH_DB)
+    read_database = ReadDatabase(str(BENCH_DB), get_settings().db_read_pool_size)
+    generation_queue = GenerationQueue(functools.partial(bench_storage, metrics), workers=2)
+    image_variants = ImageVariants(DerivativeCache(DerivativePath / "bench", 64 * 1024 * 1024), workers=2)
+    app = Litestar(
+        [
+            ProjectController,
+            RequestController,
+            PromptController,
+            ImageController,
+            JobController,
+            StatsController,
+            MetricsController,
+        ],
+        dependencies={
+            "transaction": provide_transaction,
+            "read_session": provide_read_session,
+            "storage": provide_bench_storage,
+            "generation_queue": Provide(provide_generation_queue, sync_to_thread=False),
+            "image_variants": Provide(provide_image_variants, sync_to_thread=False),
+        },
+        middleware=[MetricsMiddleware] if metrics else [],
+        plugins=[SQLAlchemyPlugin(create_db_config(str(BENCH_DB)))],
+        on_startup=[
+            upgrade_schema,
+            preload_resources,
+            generation_queue.start,
+            image_variants.start,
+            read_database.start,
+        ],
+        on_shutdown=[generation_queue.stop, image_variants.stop, read_database.stop],
+    )
+    sql_listeners = (
+        ("before_cursor_execute", start_statement_timer),
+        ("after_cursor_execute", record_statement_metrics),
+    )
+    if not metrics:
+        for identifier, listener in sql_listeners:
+            event.remove(Engine, identifier, listener)
+    try:
+        yield app
+    finally:
+        if not metrics:
+            for identifier, listener in sql_listeners:
+                event.listen(Engine, identifier, listener)
+        await bench_storage().delete_all()
+        await image_variants.cache.delete_all()
+        remove_database(BENCH_DB)
+
+
+@asynccontextmanager
+async def bench_client(metrics: bool = True) -> AsyncGenerator[AsyncTestClient[Litestar], None]:
+    """Test client of `bench_app`, requests are served one at a time on the client's own thread."""
+    async with bench_app(metrics) as app, AsyncTestClient(app=app) as client:
+        yield client
+
+
+@asynccontextmanager
+async def concurrent_client(metrics: bool = True) -> AsyncGenerator[httpx.AsyncClient, None]:
+    """Client of `bench_app` served on the running event loop, concurrent requests overlap like under uvicorn."""
+    async with (
+        bench_app(metrics) as app,
+        app.lifespan(),
+        # Litestar types its ASGI callable with narrower events than httpx
+        httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://testserver") as client,  # type: ignore[arg-type]
+    ):
+        yield client
+
+
+def latency_stats(samples: list[float]) -> dict[str, float]:
+    """Percentiles and mean of latency samples in milliseconds."""
+    samples = sorted(samples)
+
+    def percentile(fraction: float) -> float:
+        return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+    return {
+        "p50": statistics.median(samples),
+        "p95": percentile(0.95),
+        "p99": percentile(0.99),
+        "mean": statistics.fmean(samples),
+    }
+
+
+async def measure(action: Callable[[], Awaitable[object]], repeat: int) -> dict[str, float]:
+    """Run `action` `repeat` times and return latency statistics in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await action()
+        samples.append((time.perf_counter() - start) * 1000)
+    return latency_stats(samples)
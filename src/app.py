@@ -1,17 +1,84 @@
 from litestar import Litestar
 from litestar.config.cors import CORSConfig
+from litestar.di import Provide
 from litestar.plugins.sqlalchemy import SQLAlchemyPlugin
 
-from src.helpers import create_db_config, provide_storage, provide_transaction
-from src.router import ImageController, ProjectController, PromptController, RequestController
+from src.helpers import (
+    close_storage,
+    create_db_config,
+    create_storage,
+    provide_generation_queue,
+    provide_image_variants,
+    provide_read_session,
+    provide_storage,
+    provide_transaction,
+    upgrade_schema,
+    upgrade_storage,
+)
+from src.router import (
+    ImageController,
+    JobController,
+    MetricsController,
+    ProjectController,
+    PromptController,
+    RequestController,
+    StatsController,
+)
+from src.router.base import NEXT_CURSOR_HEADER
+from src.router.request import UPDATE_SUMMARY_HEADER
+from src.service.database import ReadDatabase
+from src.service.image_generation.generator import preload_resources
+from src.service.jobs import GenerationQueue
+from src.service.metrics import MetricsMiddleware
+from src.service.variants import DerivativeCache, ImageVariants
+from src.service.variants.cache import DerivativePath
+from src.settings import get_settings
+
+settings = get_settings()
 
 db_config = create_db_config("db.sqlite")
 
-cors_config = CORSConfig(allow_origins=["*"])
+read_database = ReadDatabase("db.sqlite", settings.db_read_pool_size)
+
+cors_config = CORSConfig(
+    allow_origins=["*"], expose_headers=["ETag", "Location", NEXT_CURSOR_HEADER, UPDATE_SUMMARY_HEADER]
+)
+
+generation_queue = GenerationQueue(
+    create_storage, workers=settings.generation_workers, maxsize=settings.generation_queue_size
+)
+
+image_variants = ImageVariants(
+    DerivativeCache(DerivativePath, settings.variant_cache_bytes), workers=settings.variant_workers
+)
 
 app = Litestar(
-    [ProjectController, RequestController, PromptController, ImageController],
-    dependencies={"transaction": provide_transaction, "storage": provide_storage},
+    [
+        ProjectController,
+        RequestController,
+        PromptController,
+        ImageController,
+        JobController,
+        StatsController,
+        MetricsController,
+    ],
+    dependencies={
+        "transaction": provide_transaction,
+        "read_session": provide_read_session,
+        "storage": Provide(provide_storage, sync_to_thread=False),
+        "generation_queue": Provide(provide_generation_queue, sync_to_thread=False),
+        "image_variants": Provide(provide_image_variants, sync_to_thread=False),
+    },
+    middleware=[MetricsMiddleware],
     plugins=[SQLAlchemyPlugin(db_config)],
     cors_config=cors_config,
+    on_startup=[
+        upgrade_schema,
+        upgrade_storage,
+        preload_resources,
+        generation_queue.start,
+        image_variants.start,
+        read_database.start,
+    ],
+    on_shutdown=[generation_queue.stop, image_variants.stop, read_database.stop, close_storage],
 )
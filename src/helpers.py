@@ -1,29 +1,97 @@
-from collections.abc import AsyncGenerator, Generator
+from collections.abc import AsyncGenerator
+from functools import lru_cache
+from pathlib import Path
+from typing import TYPE_CHECKING
 
 from advanced_alchemy.extensions.litestar.plugins.init.config.asyncio import (
     autocommit_before_send_handler,
 )
+from litestar import Litestar
+from litestar.concurrency import sync_to_thread
 from litestar.contrib.sqlalchemy.plugins import SQLAlchemyAsyncConfig
+from litestar.datastructures import State
 from litestar.exceptions import ClientException
 from litestar.status_codes import HTTP_404_NOT_FOUND, HTTP_409_CONFLICT
 from sqlalchemy import Engine, event
 from sqlalchemy.exc import IntegrityError, NoResultFound
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
 
 from src.model.base import Base
+from src.model.migrate import create_missing_indexes
+from src.service.cache import project_tree_cache
+from src.service.jobs import GenerationQueue
+from src.service.metrics import record_statement, start_statement
 from src.service.storage.base import StorageServer
-from src.service.storage.local import LocalFileStorage
+from src.service.storage.cached import CachedStorage
+from src.service.storage.instrumented import InstrumentedStorage
+from src.service.storage.local import FilePath, LocalFileStorage
+from src.service.storage.migrate import unwrap_once
+from src.service.storage.s3 import S3Storage
+from src.service.variants import ImageVariants
+from src.settings import Settings, get_settings
 
-__all__ = ("create_db_config", "provide_transaction", "set_sqlite_pragma", "provide_storage")
+if TYPE_CHECKING:
+    from src.service.database import ReadDatabase
+
+__all__ = (
+    "close_storage",
+    "create_db_config",
+    "create_storage",
+    "provide_generation_queue",
+    "provide_image_variants",
+    "provide_read_session",
+    "provide_transaction",
+    "record_statement_metrics",
+    "remove_database",
+    "set_sqlite_pragma",
+    "sqlite_pragmas",
+    "start_statement_timer",
+    "provide_storage",
+    "upgrade_schema",
+    "upgrade_storage",
+)
+
+
+JOURNAL_MODES = ("DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF")
+SYNCHRONOUS_LEVELS = ("OFF", "NORMAL", "FULL", "EXTRA")
+
+
+def sqlite_pragmas(settings: Settings) -> list[str]:
+    journal_mode = settings.sqlite_journal_mode.upper()
+    if journal_mode not in JOURNAL_MODES:
+        raise ValueError(f"Unknown SQLite journal mode {settings.sqlite_journal_mode!r}")
+    synchronous = settings.sqlite_synchronous.upper()
+    if synchronous not in SYNCHRONOUS_LEVELS:
+        raise ValueError(f"Unknown SQLite synchronous level {settings.sqlite_synchronous!r}")
+    return [
+        "PRAGMA foreign_keys=ON",
+        # Before switching the journal mode, which waits for the database lock
+        f"PRAGMA busy_timeout={int(settings.sqlite_busy_timeout)}",
+        f"PRAGMA journal_mode={journal_mode}",
+        f"PRAGMA synchronous={synchronous}",
+        f"PRAGMA mmap_size={int(settings.sqlite_mmap_size)}",
+        f"PRAGMA cache_size={int(settings.sqlite_cache_size)}",
+    ]
 
 
 @event.listens_for(Engine, "connect")
 def set_sqlite_pragma(dbapi_connection, connection_record):  # type: ignore[no-untyped-def]
     cursor = dbapi_connection.cursor()
-    cursor.execute("PRAGMA foreign_keys=ON")
+    for pragma in sqlite_pragmas(get_settings()):
+        cursor.execute(pragma)
     cursor.close()
 
 
+@event.listens_for(Engine, "before_cursor_execute")
+def start_statement_timer(conn, cursor, statement, parameters, context, executemany):  # type: ignore[no-untyped-def]
+    start_statement(conn.info)
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def record_statement_metrics(conn, cursor, statement, parameters, context, executemany):  # type: ignore[no-untyped-def]
+    record_statement(conn.info)
+
+
 async def provide_transaction(
     db_session: AsyncSession,
 ) -> AsyncGenerator[AsyncSession, None]:
@@ -39,18 +107,112 @@ async def provide_transaction(
         raise ClientException(status_code=HTTP_404_NOT_FOUND, detail="No database result matching query") from exc
 
 
-def provide_storage() -> Generator[StorageServer, None, None]:
-    yield LocalFileStorage()
+async def provide_read_session(state: State) -> AsyncGenerator[AsyncSession, None]:
+    read_database: ReadDatabase = state.read_database
+    async with read_database.session() as session:
+        try:
+            yield session
+        except NoResultFound as exc:
+            raise ClientException(status_code=HTTP_404_NOT_FOUND, detail="No database result matching query") from exc
+
+
+STORAGE_BACKENDS = ("local", "s3")
+
+
+@lru_cache
+def shared_s3_storage(settings: Settings) -> S3Storage:
+    # One instance per process, so every request draws on the same connection pool
+    return S3Storage(
+        settings.s3_endpoint,
+        settings.s3_bucket,
+        settings.s3_access_key,
+        settings.s3_secret_key,
+        region=settings.s3_region,
+        prefix=settings.s3_prefix,
+        max_connections=settings.s3_max_connections,
+        multipart_threshold=settings.s3_multipart_threshold,
+        part_size=settings.s3_part_size,
+        presign_expires=settings.image_redirect_ttl,
+    )
+
+
+def cached(storage: StorageServer, settings: Settings) -> StorageServer:
+    # Timing the backend below the cache, so storage metrics only count the I/O that reached it
+    storage = InstrumentedStorage(storage)
+    if settings.storage_cache_bytes > 0:
+        return CachedStorage(storage, settings.storage_cache_bytes, settings.storage_cache_entry_bytes)
+    return storage
+
+
+@lru_cache
+def shared_storage(settings: Settings) -> StorageServer:
+    # One instance per process, so every request sees the blobs cached and written by the others
+    if settings.storage_backend not in STORAGE_BACKENDS:
+        raise ValueError(f"Unknown storage backend {settings.storage_backend!r}, expected one of {STORAGE_BACKENDS}")
+    if settings.storage_backend == "s3":
+        return cached(shared_s3_storage(settings), settings)
+    return cached(LocalFileStorage(content_addressed=True, layout=settings.storage_layout), settings)
 
 
-async def provide_test_storage() -> AsyncGenerator[StorageServer, None]:
-    storage = LocalFileStorage("test")
-    yield storage
+def create_storage() -> StorageServer:
+    return shared_storage(get_settings())
+
+
+async def close_storage() -> None:
+    # The object store keeps its connection pool open, local storage the connection to its index
+    if shared_storage.cache_info().currsize:
+        await shared_storage(get_settings()).aclose()
+    shared_s3_storage.cache_clear()
+    shared_storage.cache_clear()
+
+
+@lru_cache
+def create_test_storage() -> StorageServer:
+    return cached(LocalFileStorage("test", content_addressed=True), get_settings())
+
+
+# Not generators: those are handed errors of the handler in turn, and one raising it again would keep it
+# from `provide_transaction`
+def provide_storage() -> StorageServer:
+    return create_storage()
+
+
+def provide_test_storage() -> StorageServer:
+    return create_test_storage()
+
+
+def provide_generation_queue(state: State) -> GenerationQueue:
+    queue: GenerationQueue = state.generation_queue
+    return queue
+
+
+def provide_image_variants(state: State) -> ImageVariants:
+    variants: ImageVariants = state.image_variants
+    return variants
+
+
+def remove_database(sqlite_db: str | Path) -> None:
+    # Along with the WAL and shared memory files, a stale WAL would be replayed into the next database
+    for suffix in ("", "-wal", "-shm"):
+        Path(f"{sqlite_db}{suffix}").unlink(missing_ok=True)
 
 
 async def on_test_shutdown() -> None:
-    storage = LocalFileStorage("test")
-    await storage.delete_all()
+    # Through the shared test storage, which drops its cached blobs as well
+    await create_test_storage().delete_all()
+    project_tree_cache.clear()
+
+
+async def upgrade_storage() -> None:
+    # Blobs of the FileStore format would be served with its wrapper, they are rewritten before the first request
+    if get_settings().storage_backend == "local":
+        await sync_to_thread(unwrap_once, FilePath)
+
+
+async def upgrade_schema(app: Litestar) -> None:
+    engine: AsyncEngine = app.state.db_engine
+    async with engine.begin() as connection:
+        await connection.run_sync(create_missing_indexes)
 
 
 def create_db_config(sqlite_db: str) -> SQLAlchemyAsyncConfig:
@@ -1,5 +1,7 @@
+from src.model.generation import GenerationResult
+from src.model.job import Job, JobStatus
 from src.model.project import Project
 from src.model.prompt import Prompt
 from src.model.request import Request
 
-__all__ = ["Project", "Request", "Prompt"]
+__all__ = ["Project", "Request", "Prompt", "Job", "JobStatus", "GenerationResult"]
@@ -22,5 +22,6 @@ class Base(CommonTableAttributes, DeclarativeBase):
     updated_at: Mapped[datetime] = mapped_column(
         DateTimeUTC(timezone=True),
         default=lambda: datetime.now(UTC),
+        onupdate=lambda: datetime.now(UTC),
         info=dto_field("read-only"),
     )
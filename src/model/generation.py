@@ -0,0 +1,24 @@
+from datetime import UTC, datetime
+from uuid import UUID
+
+from advanced_alchemy.types import DateTimeUTC
+from sqlalchemy.orm import Mapped, mapped_column
+
+from src.model.base import Base
+
+__all__ = ("GenerationResult",)
+
+
+class GenerationResult(Base):
+    """Output generated for a prompt set, reused by later requests with the same fingerprint.
+
+    The entry owns its own copy of the output blob, requests are given copies of it.
+    """
+
+    __tablename__ = "generation_cache_table"
+
+    fingerprint: Mapped[str] = mapped_column(unique=True)
+    output_image: Mapped[UUID] = mapped_column()
+    size: Mapped[int] = mapped_column()
+    # Least recently used entries are evicted first
+    used_at: Mapped[datetime] = mapped_column(DateTimeUTC(timezone=True), default=lambda: datetime.now(UTC), index=True)
@@ -0,0 +1,26 @@
+from enum import StrEnum
+from uuid import UUID
+
+from litestar.dto import dto_field
+from sqlalchemy import ForeignKey
+from sqlalchemy.orm import Mapped, mapped_column
+
+from src.model.base import Base
+
+__all__ = ("Job", "JobStatus")
+
+
+class JobStatus(StrEnum):
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+class Job(Base):
+    __tablename__ = "job_table"
+
+    request_id: Mapped[UUID] = mapped_column(ForeignKey("request_table.id", ondelete="CASCADE"), index=True)
+    status: Mapped[str] = mapped_column(default=JobStatus.PENDING, info=dto_field("read-only"))
+    error: Mapped[str | None] = mapped_column(nullable=True, info=dto_field("read-only"))
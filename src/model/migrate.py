@@ -0,0 +1,44 @@
+import argparse
+import sys
+
+from sqlalchemy import Connection, create_engine, inspect
+
+from src.model.base import Base
+
+__all__ = ("create_missing_indexes",)
+
+
+def create_missing_indexes(connection: Connection) -> list[str]:
+    """Create indexes declared on the models that an existing database does not have yet.
+
+    `create_all` only creates missing tables, so indexes added to a model after its table was created
+    never reach existing databases without this step. Returns the names of the created indexes.
+    """
+    inspector = inspect(connection)
+    created = []
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in sorted(table.indexes, key=lambda index: str(index.name)):
+            if index.name not in existing:
+                index.create(connection)
+                created.append(str(index.name))
+    if created:
+        # Refresh the planner statistics so the new indexes get picked up
+        connection.exec_driver_sql("ANALYZE")
+    return created
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Bring the schema of an existing SQLite database up to date.")
+    parser.add_argument("database", nargs="?", default="db.sqlite", help="path to the SQLite database")
+    args = parser.parse_args(argv)
+    engine = create_engine(f"sqlite:///{args.database}")
+    with engine.begin() as connection:
+        created = create_missing_indexes(connection)
+    sys.stdout.write(f"created {len(created)} indexes: {', '.join(created) or '-'}\n")
+
+
+if __name__ == "__main__":
+    main()
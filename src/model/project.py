@@ -1,6 +1,7 @@
 from typing import TYPE_CHECKING
 
 from litestar.dto import dto_field
+from sqlalchemy import Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from src.model.base import Base
@@ -13,9 +14,15 @@ __all__ = ("Project",)
 
 class Project(Base):
     __tablename__ = "project_table"  # type: ignore[assignment]
+    # Keyset pagination order
+    __table_args__ = (Index("ix_project_table_created_at_id", "created_at", "id"),)
 
-    name: Mapped[str] = mapped_column(nullable=False)
+    name: Mapped[str] = mapped_column(nullable=False, index=True)
 
     requests: Mapped[list["Request"]] = relationship(
-        "Request", lazy="selectin", info=dto_field("read-only"), cascade="all, delete"
+        "Request",
+        lazy="raise",
+        info=dto_field("read-only"),
+        cascade="all, delete",
+        order_by="(Request.created_at, Request.id)",
     )
@@ -1,7 +1,7 @@
 from uuid import UUID
 
 from litestar.dto import dto_field
-from sqlalchemy import ForeignKey
+from sqlalchemy import ForeignKey, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from src.model.base import Base
@@ -12,12 +12,14 @@ __all__ = ("Prompt",)
 
 class Prompt(Base):
     __tablename__ = "prompt_table"  # type: ignore[assignment]
+    # Keyset pagination order
+    __table_args__ = (Index("ix_prompt_table_created_at_id", "created_at", "id"),)
 
     text: Mapped[str] = mapped_column(nullable=False)
     image: Mapped[UUID | None] = mapped_column(nullable=True)
-    request_id: Mapped[UUID] = mapped_column(ForeignKey("request_table.id", ondelete="CASCADE"))
+    request_id: Mapped[UUID] = mapped_column(ForeignKey("request_table.id", ondelete="CASCADE"), index=True)
     request: Mapped[Request] = relationship(
-        lazy="selectin",
+        lazy="raise",
         back_populates="prompts",
         info=dto_field("read-only"),
     )
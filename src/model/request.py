@@ -2,7 +2,7 @@ from typing import TYPE_CHECKING
 from uuid import UUID
 
 from litestar.dto import dto_field
-from sqlalchemy import ForeignKey
+from sqlalchemy import ForeignKey, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from src.model.base import Base
@@ -15,12 +15,15 @@ __all__ = ("Request",)
 
 class Request(Base):
     __tablename__ = "request_table"  # type: ignore[assignment]
+    # Keyset pagination order
+    __table_args__ = (Index("ix_request_table_created_at_id", "created_at", "id"),)
 
     output_image: Mapped[UUID] = mapped_column(nullable=True)
-    project_id: Mapped[UUID] = mapped_column(ForeignKey("project_table.id", ondelete="CASCADE"))
+    project_id: Mapped[UUID] = mapped_column(ForeignKey("project_table.id", ondelete="CASCADE"), index=True)
 
     prompts: Mapped[list["Prompt"]] = relationship(
-        lazy="selectin",
+        lazy="raise",
         info=dto_field("read-only"),
         back_populates="request",
+        order_by="(Prompt.created_at, Prompt.id)",
     )
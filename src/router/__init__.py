@@ -1,6 +1,17 @@
 from src.router.image import ImageController
+from src.router.job import JobController
+from src.router.metrics import MetricsController
 from src.router.project import ProjectController
 from src.router.prompt import PromptController
 from src.router.request import RequestController
+from src.router.stats import StatsController
 
-__all__ = ["ProjectController", "RequestController", "PromptController", "ImageController"]
+__all__ = [
+    "ProjectController",
+    "RequestController",
+    "PromptController",
+    "ImageController",
+    "JobController",
+    "StatsController",
+    "MetricsController",
+]
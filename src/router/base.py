@@ -1,20 +1,41 @@
 # ruff: noqa: A002
+import base64
 import datetime
+import hashlib
+import json
 from collections.abc import Sequence
-from typing import TYPE_CHECKING, Any, Generic, TypeVar
+from typing import TYPE_CHECKING, Annotated, Any, Generic, TypeVar
 from uuid import UUID
 
-from litestar import Controller, Router, get, post, put
+from litestar import Controller, Request, Response, Router, get, post, put
 from litestar.di import Provide
-from sqlalchemy import select
+from litestar.exceptions import ClientException, HTTPException
+from litestar.params import Parameter
+from litestar.status_codes import HTTP_304_NOT_MODIFIED
+from sqlalchemy import Select, func, select, tuple_
+from sqlalchemy.exc import NoResultFound
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.sql.base import ExecutableOption
+from sqlalchemy.sql.selectable import CompoundSelect
 
 __all__ = (
+    "DEFAULT_PAGE_SIZE",
+    "MAX_PAGE_SIZE",
+    "NEXT_CURSOR_HEADER",
     "BaseController",
     "GenericController",
+    "IfNoneMatch",
+    "NotModifiedException",
+    "PageSize",
+    "check_not_modified",
     "create_item",
+    "graph_etag",
+    "graph_version",
+    "not_modified_handler",
+    "paginated",
     "read_item_by_id",
     "read_items_by_attrs",
+    "read_page",
     "update_item",
 )
 
@@ -25,11 +46,20 @@ if TYPE_CHECKING:
 
 T = TypeVar("T", bound=DeclarativeBase)
 
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
 
-async def create_item(session: "AsyncSession", table: type[Any], data: Any) -> Any:
+PageSize = Annotated[int, Parameter(ge=1, le=MAX_PAGE_SIZE)]
+IfNoneMatch = Annotated[str | None, Parameter(header="If-None-Match")]
+
+
+async def create_item(
+    session: "AsyncSession", table: type[Any], data: Any, options: Sequence[ExecutableOption] = ()
+) -> Any:
     session.add(data)
     await session.flush()
-    return await read_item_by_id(session, table, data.id)
+    return await read_item_by_id(session, table, data.id, options)
 
 
 async def read_items_by_attrs(session: "AsyncSession", table: type[Any], **kwargs: Any) -> Sequence[Any]:
@@ -41,8 +71,101 @@ async def read_items_by_attrs(session: "AsyncSession", table: type[Any], **kwarg
     return result.scalars().all()
 
 
-async def read_item_by_id(session: "AsyncSession", table: type[Any], id: "UUID") -> Any:
-    stmt = select(table).where(table.__table__.c.id == id)
+def encode_cursor(item: Any) -> str:
+    position = json.dumps([item.created_at.isoformat(), str(item.id)])
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime.datetime, UUID]:
+    try:
+        created_at, id = json.loads(base64.urlsafe_b64decode(cursor))
+        return datetime.datetime.fromisoformat(created_at), UUID(id)
+    except (ValueError, TypeError) as e:
+        raise ClientException(detail="Invalid cursor") from e
+
+
+async def read_page(
+    session: "AsyncSession",
+    table: type[Any],
+    limit: int,
+    cursor: str | None = None,
+    *,
+    columns: Sequence[Any] | None = None,
+    options: Sequence[ExecutableOption] = (),
+    **kwargs: Any,
+) -> tuple[Sequence[Any], str | None]:
+    """Keyset pagination over `(created_at, id)`.
+
+    Returns up to `limit` items after the position encoded in `cursor` and the cursor of the next page,
+    or None on the last page. Items are result rows of `columns` instead of instances when given, these
+    must include `created_at` and `id`.
+    """
+    stmt = select(*columns) if columns else select(table).options(*options)
+    for attr, value in kwargs.items():
+        if value is not None:
+            stmt = stmt.where(table.__table__.c[attr] == value)
+    if cursor is not None:
+        stmt = stmt.where(tuple_(table.created_at, table.id) > decode_cursor(cursor))
+    stmt = stmt.order_by(table.created_at, table.id).limit(limit + 1)
+    result = await session.execute(stmt)
+    items = result.all() if columns else result.scalars().all()
+    if len(items) > limit:
+        return items[:limit], encode_cursor(items[limit - 1])
+    return items, None
+
+
+def paginated(items: Sequence[Any] | bytes, next_cursor: str | None) -> Response[Any]:
+    return Response(items, headers={NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None)
+
+
+class NotModifiedException(HTTPException):
+    status_code = HTTP_304_NOT_MODIFIED
+
+
+def not_modified_handler(_: Request, exc: NotModifiedException) -> Response:
+    # A 304 carries the validator but no body
+    return Response(content=None, status_code=HTTP_304_NOT_MODIFIED, headers=exc.headers)
+
+
+async def graph_etag(session: "AsyncSession", stmt: Select | CompoundSelect) -> str:
+    """Strong validator of an entity graph from the `(id, updated_at)` rows selected by `stmt`.
+
+    Any insert, update or delete within the graph changes the value. Raises NoResultFound when no row
+    matches, i.e. the entity does not exist.
+    """
+    rows = (await session.execute(stmt)).all()
+    if not rows:
+        raise NoResultFound
+    digest = hashlib.sha256()
+    for id, updated_at in sorted(rows):
+        digest.update(f"{id}:{updated_at.isoformat()};".encode())
+    return f'"{digest.hexdigest()[:32]}"'
+
+
+async def graph_version(session: "AsyncSession", stmt: Select | CompoundSelect) -> tuple[int, datetime.datetime]:
+    """Row count and latest `updated_at` of the graph selected by `stmt` as for `graph_etag`, in one row.
+
+    Cheaper than the validator and changed as well by any insert, update or delete within the graph.
+    """
+    graph = stmt.subquery()
+    rows, updated_at = (await session.execute(select(func.count(), func.max(graph.c.updated_at)))).one()
+    return rows, updated_at
+
+
+def check_not_modified(etag: str, if_none_match: str | None) -> None:
+    if not if_none_match:
+        return
+    # If-None-Match uses the weak comparison
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    if "*" in tags or etag in tags:
+        raise NotModifiedException(headers={"ETag": etag})
+
+
+async def read_item_by_id(
+    session: "AsyncSession", table: type[Any], id: "UUID", options: Sequence[ExecutableOption] = ()
+) -> Any:
+    # Relationships are not loaded unless `options` asks for them, see `BaseController.load_options`
+    stmt = select(table).where(table.__table__.c.id == id).options(*options)
     result = await session.execute(stmt)
     return result.scalars().one()
 
@@ -52,10 +175,11 @@ async def update_item(
     id: "UUID",
     data: "CommonTableAttributes",
     table: type[Any],
+    options: Sequence[ExecutableOption] = (),
 ) -> "Any":
     data_ = {k: v for k, v in data.to_dict().items() if v}
     data_["updated_at"] = datetime.datetime.now(datetime.UTC)
-    result = await read_item_by_id(session=session, table=table, id=id)
+    result = await read_item_by_id(session=session, table=table, id=id, options=options)
     for attr, value in data_.items():
         setattr(result, attr, value)
     return result
@@ -78,13 +202,24 @@ class GenericController(Controller, Generic[T]):
 
 
 class BaseController(GenericController[T]):
+    exception_handlers = {NotModifiedException: not_modified_handler}
+    # Loader options of the items returned by the handlers below, models load no relationship by default
+    load_options: Sequence[ExecutableOption] = ()
+
     @get()
-    async def get_all_items(self, table: Any, transaction: "AsyncSession", **kwargs: Any) -> Sequence[T.__name__]:  # type: ignore[name-defined]
-        return await read_items_by_attrs(transaction, table, **kwargs)
+    async def get_all_items(
+        self,
+        table: Any,
+        read_session: "AsyncSession",
+        limit: PageSize = DEFAULT_PAGE_SIZE,
+        cursor: str | None = None,
+        **kwargs: Any,
+    ) -> Response[Sequence[T.__name__]]:  # type: ignore[name-defined]
+        return paginated(*await read_page(read_session, table, limit, cursor, **kwargs))
 
     @get("/{id:uuid}")
-    async def get_item_by_id(self, table: Any, transaction: "AsyncSession", id: UUID) -> T.__name__:  # type: ignore[name-defined]
-        return await read_item_by_id(session=transaction, table=table, id=id)
+    async def get_item_by_id(self, table: Any, read_session: "AsyncSession", id: UUID) -> T.__name__:  # type: ignore[name-defined]
+        return await read_item_by_id(session=read_session, table=table, id=id, options=self.load_options)
 
     @post()
     async def create_item(
@@ -93,7 +228,7 @@ class BaseController(GenericController[T]):
         transaction: "AsyncSession",
         data: T.__name__,  # type: ignore[name-defined]
     ) -> T.__name__:  # type: ignore[name-defined]
-        return await create_item(session=transaction, table=table, data=data)
+        return await create_item(session=transaction, table=table, data=data, options=self.load_options)
 
     @put("/{id:uuid}")
     async def update_item(
@@ -103,4 +238,4 @@ class BaseController(GenericController[T]):
         id: UUID,
         data: T.__name__,  # type: ignore[name-defined]
     ) -> T.__name__:  # type: ignore[name-defined]
-        return await update_item(session=transaction, id=id, data=data, table=table)
+        return await update_item(session=transaction, id=id, data=data, table=table, options=self.load_options)
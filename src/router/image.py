@@ -1,16 +1,82 @@
+from email.utils import format_datetime
+from typing import Annotated, Literal
 from uuid import UUID
 
-from litestar import Controller, get
-from litestar.response import Stream
+from litestar import Controller, HttpMethod, Response, get, route
+from litestar.exceptions import HTTPException
+from litestar.params import Parameter
+from litestar.response import Redirect, Stream
+from litestar.status_codes import (
+    HTTP_307_TEMPORARY_REDIRECT,
+    HTTP_404_NOT_FOUND,
+    HTTP_501_NOT_IMPLEMENTED,
+)
 
-from src.service.storage import StorageServer
+from src.service.storage import BlobMetadata, StorageServer
+from src.service.storage.streaming import stream_open_file
+from src.service.variants import DEFAULT_FORMAT, FORMATS, ImageVariants, negotiate_format
+from src.settings import get_settings
 
 __all__ = ("ImageController",)
 
 
+MAX_VARIANT_WIDTH = 4096
+MAX_LIST_LIMIT = 1000
+
+
 class ImageController(Controller):
     path: str = "image"
 
+    @get()
+    async def list_images(
+        self,
+        storage: StorageServer,
+        after: UUID | None = None,
+        limit: Annotated[int, Parameter(ge=1, le=MAX_LIST_LIMIT)] = 100,
+    ) -> list[BlobMetadata]:
+        # Pages through the stored blobs in id order, the next page starts after the last id listed
+        try:
+            return await storage.list_blobs(after, limit)
+        except NotImplementedError as e:
+            raise HTTPException(detail=str(e), status_code=HTTP_501_NOT_IMPLEMENTED) from e
+
+    # Not `head`, which rejects handlers returning anything but None or a file
+    @route("/{id:uuid}", http_method=HttpMethod.HEAD)
+    async def head_image(self, storage: StorageServer, id: UUID) -> Response[bytes]:
+        # Headers of the original, answered from the blob metadata without reading the blob
+        metadata = await storage.metadata(id)
+        if metadata is None:
+            raise HTTPException(detail="file does not exist", status_code=HTTP_404_NOT_FOUND)
+        headers = {"Content-Length": str(metadata.size), "Accept-Ranges": "bytes"}
+        if metadata.digest is not None:
+            headers["ETag"] = f'"{metadata.digest}"'
+        if metadata.updated_at is not None:
+            headers["Last-Modified"] = format_datetime(metadata.updated_at, usegmt=True)
+        return Response(b"", media_type=metadata.content_type, headers=headers)
+
     @get("/{id:uuid}")
-    async def get_image(self, storage: StorageServer, id: UUID) -> Stream:
-        return await storage.stream(id)
+    async def get_image(
+        self,
+        storage: StorageServer,
+        image_variants: ImageVariants,
+        id: UUID,
+        byte_range: Annotated[str | None, Parameter(header="Range")] = None,
+        accept: Annotated[str | None, Parameter(header="Accept")] = None,
+        width: Annotated[int | None, Parameter(ge=1, le=MAX_VARIANT_WIDTH)] = None,
+        format: Literal["webp", "jpeg"] | None = None,
+    ) -> Stream | Redirect:
+        # Only a resized variant follows Accept, a plain read serves the original bytes unchanged
+        negotiated = format is None and width is not None
+        target = negotiate_format(accept) or DEFAULT_FORMAT if negotiated else format
+        if target is not None:
+            file, size = await image_variants.open(storage, id, width, target)
+            response = await stream_open_file(file, size, byte_range, FORMATS[target])
+            if negotiated:
+                response.headers["Vary"] = "Accept"
+            return response
+        if get_settings().image_redirects:
+            # Originals are downloaded from the backend directly, the Range header follows the redirect
+            url = await storage.presigned_url(id)
+            if url is not None:
+                return Redirect(url, status_code=HTTP_307_TEMPORARY_REDIRECT)
+        return await storage.stream(id, byte_range)
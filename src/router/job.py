@@ -0,0 +1,20 @@
+from typing import TYPE_CHECKING
+from uuid import UUID
+
+from litestar import Controller, get
+
+from src.model.job import Job
+from src.router.base import read_item_by_id
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+__all__ = ("JobController",)
+
+
+class JobController(Controller):
+    path = "job"
+
+    @get("/{id:uuid}")
+    async def get_job(self, read_session: "AsyncSession", id: UUID) -> Job:
+        return await read_item_by_id(read_session, Job, id)  # type: ignore[no-any-return]
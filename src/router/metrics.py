@@ -0,0 +1,16 @@
+from litestar import Controller, get
+
+from src.service.metrics import registry
+
+__all__ = ("MetricsController",)
+
+# Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class MetricsController(Controller):
+    path = "metrics"
+
+    @get(media_type=CONTENT_TYPE)
+    async def get_metrics(self) -> str:
+        return registry.render()
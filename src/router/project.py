@@ -1,15 +1,39 @@
 from collections.abc import Sequence
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Any
 from uuid import UUID
 
-from litestar import delete, get
+from litestar import Request as HttpRequest
+from litestar import Response, delete, get, put
 from litestar.contrib.sqlalchemy.dto import SQLAlchemyDTO, SQLAlchemyDTOConfig
+from litestar.enums import MediaType
+from sqlalchemy import delete as sql_delete
+from sqlalchemy import select, union_all
+from sqlalchemy.orm import selectinload
+from sqlalchemy.sql.selectable import CompoundSelect
 
 from src.model.project import Project
-from src.router.base import BaseController, read_item_by_id, read_items_by_attrs
-from src.router.request import delete_request
+from src.model.prompt import Prompt
+from src.model.request import Request
+from src.router.base import (
+    DEFAULT_PAGE_SIZE,
+    BaseController,
+    IfNoneMatch,
+    PageSize,
+    check_not_modified,
+    graph_etag,
+    graph_version,
+    paginated,
+    read_item_by_id,
+    read_page,
+    update_item,
+)
+from src.router.request import delete_requests, remove_blobs
 from src.router.typing.types import ProjectDTO
+from src.router.utils.dto import encode_with_dto
+from src.router.utils.rows import encode_project_tree_rows
+from src.service.cache import CachedTree, invalidate_project, project_tree_cache
 from src.service.storage.base import StorageServer
+from src.settings import get_settings
 
 if TYPE_CHECKING:
     from sqlalchemy.ext.asyncio import AsyncSession
@@ -23,28 +47,76 @@ class ProjectLiteDTO(SQLAlchemyDTO[Project]):
 
 
 class ProjectReadDTO(SQLAlchemyDTO[Project]):
-    config = SQLAlchemyDTOConfig(max_nested_depth=2)
+    config = SQLAlchemyDTOConfig(max_nested_depth=2, experimental_codegen_backend=True)
+
+
+# Everything `ProjectReadDTO` serializes
+PROJECT_TREE = (selectinload(Project.requests).selectinload(Request.prompts),)
+
+
+def project_graph(id: UUID) -> CompoundSelect:
+    # `(id, updated_at)` of every row the nested read covers
+    return union_all(
+        select(Project.id, Project.updated_at).where(Project.id == id),
+        select(Request.id, Request.updated_at).where(Request.project_id == id),
+        select(Prompt.id, Prompt.updated_at).join(Request).where(Request.project_id == id),
+    )
+
+
+async def encode_project_tree(request: HttpRequest, session: "AsyncSession", id: UUID) -> bytes:
+    if get_settings().fast_serialization:
+        return await encode_project_tree_rows(session, id)
+    project: Project = await read_item_by_id(session, Project, id, PROJECT_TREE)
+    return encode_with_dto(request, ProjectReadDTO, Project, project)
 
 
 class ProjectController(BaseController[Project]):
     path = "/project"
     dto = ProjectDTO.write_dto
+    load_options = (selectinload(Project.requests),)
+
+    @get("/{id:uuid}", media_type=MediaType.JSON)
+    async def get_item_by_id(
+        self, request: HttpRequest, read_session: "AsyncSession", id: UUID, if_none_match: IfNoneMatch = None
+    ) -> Response[bytes]:
+        # Checked against the database as other processes may have written the project
+        version = await graph_version(read_session, project_graph(id))
+        tree = project_tree_cache.get(id, version)
+        if tree is None:
+            with project_tree_cache.filling(id) as fill:
+                # Validate against the rows the nested read covers before loading any of them
+                etag = await graph_etag(read_session, project_graph(id))
+                check_not_modified(etag, if_none_match)
+                tree = CachedTree(await encode_project_tree(request, read_session, id), etag, version)
+                fill.store(tree)
+        check_not_modified(tree.etag, if_none_match)
+        return Response(tree.body, headers={"ETag": tree.etag})
 
-    @get("/{id:uuid}", return_dto=ProjectReadDTO)
-    async def get_item_by_id(self, transaction: "AsyncSession", id: UUID) -> Project:
-        data: Project = await read_item_by_id(transaction, Project, id)
-        return data
+    @put("/{id:uuid}")
+    async def update_item(self, table: Any, transaction: "AsyncSession", id: UUID, data: Project) -> Project:
+        invalidate_project(transaction, id)
+        project: Project = await update_item(
+            session=transaction, id=id, data=data, table=table, options=self.load_options
+        )
+        return project
 
     @get(return_dto=ProjectLiteDTO)
     async def get_all_items(
-        self, transaction: "AsyncSession", id: UUID | None = None, name: str | None = None
-    ) -> Sequence[Project]:
-        return await read_items_by_attrs(transaction, Project, name=name, id=id)
+        self,
+        read_session: "AsyncSession",
+        id: UUID | None = None,
+        name: str | None = None,
+        limit: PageSize = DEFAULT_PAGE_SIZE,
+        cursor: str | None = None,
+    ) -> Response[Sequence[Project]]:
+        return paginated(*await read_page(read_session, Project, limit, cursor, name=name, id=id))
 
     @delete("/{id:uuid}")
-    async def delete_item(self, transaction: "AsyncSession", id: UUID, storage: StorageServer) -> None:
-        project: Project = await read_item_by_id(transaction, Project, id)
-        requests = project.requests
-        for request in requests:
-            await delete_request(transaction, storage, request.id)
-        await transaction.delete(project)
+    async def delete_item(self, transaction: "AsyncSession", id: UUID, storage: StorageServer) -> Response[None]:
+        (await transaction.execute(select(Project.id).where(Project.id == id))).scalar_one()
+        invalidate_project(transaction, id)
+        blob_ids = await delete_requests(transaction, Request.project_id == id)
+        await transaction.execute(
+            sql_delete(Project).where(Project.id == id).execution_options(synchronize_session=False)
+        )
+        return remove_blobs(storage, blob_ids)
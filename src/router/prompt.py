@@ -1,21 +1,48 @@
-from collections.abc import Sequence
+import asyncio
+import hashlib
+from collections.abc import AsyncGenerator, Sequence
 from dataclasses import dataclass
 from typing import TYPE_CHECKING, Annotated
 from uuid import UUID
 
-from litestar import Controller, delete, get, post, put
+from litestar import Controller, Response, delete, get, post, put
+from litestar import Request as HttpRequest
 from litestar.datastructures import UploadFile
-from litestar.enums import RequestEncodingType
+from litestar.enums import MediaType, RequestEncodingType
 from litestar.params import Body
+from sqlalchemy import select, union_all
+from sqlalchemy.orm import joinedload
 
 from src.model.prompt import Prompt
-from src.router.base import create_item, read_item_by_id, read_items_by_attrs
+from src.model.request import Request
+from src.router.base import (
+    DEFAULT_PAGE_SIZE,
+    IfNoneMatch,
+    NotModifiedException,
+    PageSize,
+    check_not_modified,
+    create_item,
+    graph_etag,
+    not_modified_handler,
+    paginated,
+    read_item_by_id,
+    read_page,
+)
+from src.router.typing.types import PromptDTO
+from src.router.utils.dto import encode_with_dto
+from src.router.utils.rows import encode_prompt_page
+from src.service.cache import invalidate_project
 from src.service.storage.base import StorageServer
+from src.service.storage.streaming import CHUNK_SIZE
+from src.settings import get_settings
 
 __all__ = (
     "PromptController",
     "create_prompt",
     "delete_prompt",
+    "store_images",
+    "store_upload",
+    "sync_prompt",
     "update_prompt",
 )
 
@@ -34,35 +61,89 @@ class _PromptRawDTO:
 
 PromptRawDTO = Annotated[_PromptRawDTO, Body(media_type=RequestEncodingType.MULTI_PART)]
 
+# Prompts are returned with their request
+PROMPT_WITH_REQUEST = (joinedload(Prompt.request),)
+
+
+async def store_upload(upload: UploadFile, storage: StorageServer, id: UUID | None = None) -> UUID | None:
+    """Copy an uploaded file into storage chunk by chunk, as a new blob or over blob `id`.
+
+    Empty uploads stand for prompts without an image, nothing is stored and None is returned.
+    """
+    first = await upload.read(CHUNK_SIZE)
+    if not first:
+        return None
+
+    async def chunks() -> AsyncGenerator[bytes, None]:
+        chunk = first
+        while chunk:
+            yield chunk
+            chunk = await upload.read(CHUNK_SIZE)
+
+    if id is None:
+        return await storage.create_stream(chunks())
+    await storage.update_stream(chunks(), id)
+    return id
+
 
 async def create_prompt(data: PromptRawDTO, session: "AsyncSession", storage: StorageServer) -> Prompt:
-    image = await data.image.read()
-    if image:
-        image_id = await storage.create(image)
-        prompt_data = Prompt(text=data.text, image=image_id, request_id=data.request_id)
-    else:
-        prompt_data = Prompt(text=data.text, request_id=data.request_id)
-    await create_item(session, Prompt, prompt_data)
+    image_id = await store_upload(data.image, storage)
+    prompt_data = Prompt(text=data.text, image=image_id, request_id=data.request_id)
+    await create_item(session, Prompt, prompt_data, PROMPT_WITH_REQUEST)
     return prompt_data
 
 
+async def store_images(images: Sequence[UploadFile], storage: StorageServer, limit: int) -> list[UUID | None]:
+    semaphore = asyncio.Semaphore(limit)
+
+    async def store(upload: UploadFile) -> UUID | None:
+        async with semaphore:
+            return await store_upload(upload, storage)
+
+    return list(await asyncio.gather(*(store(upload) for upload in images)))
+
+
 async def update_prompt(data: PromptRawDTO, session: "AsyncSession", id: UUID, storage: StorageServer) -> Prompt:
-    prompt: Prompt = await read_item_by_id(session, Prompt, id)
-    image = await data.image.read()
-    if image:
-        if prompt.image is not None:
-            await storage.update(image, prompt.image)
-        else:
-            image_id = await storage.create(image)
-            prompt.image = image_id
-    else:
-        if prompt.image is not None:
-            await storage.delete(prompt.image)
-        prompt.image = None
+    prompt: Prompt = await read_item_by_id(session, Prompt, id, PROMPT_WITH_REQUEST)
+    image_id = await store_upload(data.image, storage, prompt.image)
+    if image_id is None and prompt.image is not None:
+        await storage.delete(prompt.image)
+    prompt.image = image_id
     prompt.text = data.text
     return prompt
 
 
+async def upload_digest(upload: UploadFile) -> str | None:
+    """Hex sha256 of an upload, None for an empty one. The upload is rewound for a later `store_upload`."""
+    digest = hashlib.sha256()
+    size = 0
+    while chunk := await upload.read(CHUNK_SIZE):
+        digest.update(chunk)
+        size += len(chunk)
+    await upload.seek(0)
+    return digest.hexdigest() if size else None
+
+
+async def sync_prompt(prompt: Prompt, text: str, upload: UploadFile, storage: StorageServer) -> bool:
+    """Bring `prompt` to `text` and `upload`, writing the image only when its content differs.
+
+    Returns whether the prompt changed.
+    """
+    stored = await storage.digest(prompt.image) if prompt.image is not None else None
+    # A prompt whose blob went missing is rewritten
+    image_changed = await upload_digest(upload) != stored or (prompt.image is not None and stored is None)
+    if image_changed:
+        image_id = await store_upload(upload, storage, prompt.image)
+        if image_id is None and prompt.image is not None:
+            await storage.delete(prompt.image)
+        prompt.image = image_id
+    # Assigning an equal value still marks the prompt dirty and bumps its updated_at
+    text_changed = prompt.text != text
+    if text_changed:
+        prompt.text = text
+    return image_changed or text_changed
+
+
 async def delete_prompt(id: UUID, session: "AsyncSession", storage: StorageServer) -> None:
     prompt: Prompt = await read_item_by_id(session, Prompt, id)
     if prompt.image is not None:
@@ -70,28 +151,63 @@ async def delete_prompt(id: UUID, session: "AsyncSession", storage: StorageServe
     await session.delete(prompt)
 
 
-class PromptController(Controller):
-    path = "prompt"
+async def invalidate_request_project(session: "AsyncSession", request_id: UUID | None) -> None:
+    project_id = await session.scalar(select(Request.project_id).where(Request.id == request_id))
+    if project_id is not None:
+        invalidate_project(session, project_id)
 
-    @get()
-    async def get_prompts(self, transaction: "AsyncSession") -> Sequence[Prompt]:
-        data: Sequence[Prompt] = await read_items_by_attrs(transaction, Prompt)
-        return data
 
-    @get("/{id:uuid}")
-    async def get_prompt_by_id(self, transaction: "AsyncSession", id: UUID) -> Prompt:
-        return await read_item_by_id(transaction, Prompt, id)  # type: ignore[no-any-return]
+class PromptController(Controller):
+    path = "prompt"
+    exception_handlers = {NotModifiedException: not_modified_handler}
+
+    @get(media_type=MediaType.JSON)
+    async def get_prompts(
+        self,
+        request: HttpRequest,
+        read_session: "AsyncSession",
+        limit: PageSize = DEFAULT_PAGE_SIZE,
+        cursor: str | None = None,
+    ) -> Response[bytes]:
+        if get_settings().fast_serialization:
+            body, next_cursor = await encode_prompt_page(read_session, limit, cursor)
+        else:
+            items, next_cursor = await read_page(read_session, Prompt, limit, cursor, options=PROMPT_WITH_REQUEST)
+            body = encode_with_dto(request, PromptDTO.read_dto, Sequence[Prompt], items)
+        return paginated(body, next_cursor)
+
+    @get("/{id:uuid}", return_dto=PromptDTO.read_dto)
+    async def get_prompt_by_id(
+        self, read_session: "AsyncSession", id: UUID, if_none_match: IfNoneMatch = None
+    ) -> Response[Prompt]:
+        # The prompt is read with its request
+        etag = await graph_etag(
+            read_session,
+            union_all(
+                select(Prompt.id, Prompt.updated_at).where(Prompt.id == id),
+                select(Request.id, Request.updated_at).join(Prompt).where(Prompt.id == id),
+            ),
+        )
+        check_not_modified(etag, if_none_match)
+        prompt: Prompt = await read_item_by_id(read_session, Prompt, id, PROMPT_WITH_REQUEST)
+        return Response(prompt, headers={"ETag": etag})
 
     @post()
     async def create_prompt(self, data: PromptRawDTO, transaction: "AsyncSession", storage: StorageServer) -> Prompt:
+        await invalidate_request_project(transaction, data.request_id)
         return await create_prompt(data, transaction, storage)
 
     @put("/{id:uuid}")
     async def update_prompt(
         self, data: PromptRawDTO, transaction: "AsyncSession", id: UUID, storage: StorageServer
     ) -> Prompt:
-        return await update_prompt(data, transaction, id, storage)
+        prompt = await update_prompt(data, transaction, id, storage)
+        await invalidate_request_project(transaction, prompt.request_id)
+        return prompt
 
     @delete("/{id:uuid}")
     async def delete_prompt(self, id: UUID, transaction: "AsyncSession", storage: StorageServer) -> None:
+        await invalidate_request_project(
+            transaction, await transaction.scalar(select(Prompt.request_id).where(Prompt.id == id))
+        )
         return await delete_prompt(id, transaction, storage)
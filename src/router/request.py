@@ -1,26 +1,49 @@
 import json
-from typing import TYPE_CHECKING, Annotated
-from uuid import UUID
+from collections.abc import Sequence
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Annotated, Any
+from uuid import UUID, uuid4
 
-from litestar import delete, post, put
+from litestar import Request as HttpRequest
+from litestar import Response, delete, get, post, put
+from litestar.background_tasks import BackgroundTask
 from litestar.datastructures import UploadFile
-from litestar.enums import RequestEncodingType
+from litestar.enums import MediaType, RequestEncodingType
 from litestar.exceptions import HTTPException
 from litestar.params import Body
-from pydantic import BaseModel, ConfigDict, field_validator
+from litestar.status_codes import HTTP_200_OK, HTTP_202_ACCEPTED, HTTP_204_NO_CONTENT, HTTP_404_NOT_FOUND
+from pydantic import BaseModel, ConfigDict, TypeAdapter, ValidationError, field_validator
+from sqlalchemy import delete as sql_delete
+from sqlalchemy import insert, select, union_all
+from sqlalchemy.orm import selectinload
 
-from src.model.request import Request
-from src.router.base import BaseController, create_item, read_item_by_id
-from src.router.prompt import _PromptRawDTO, create_prompt, delete_prompt, update_prompt
+from src.model import Job, Project, Prompt, Request
+from src.router.base import (
+    DEFAULT_PAGE_SIZE,
+    BaseController,
+    IfNoneMatch,
+    PageSize,
+    check_not_modified,
+    create_item,
+    graph_etag,
+    paginated,
+    read_item_by_id,
+    read_page,
+)
+from src.router.prompt import _PromptRawDTO, create_prompt, delete_prompt, store_images, sync_prompt
 from src.router.typing.types import RequestDTO
-from src.service.image_generation.generator import generate_output
+from src.router.utils.dto import encode_with_dto
+from src.router.utils.rows import encode_request_page
+from src.service.cache import invalidate_project
+from src.service.jobs import GenerationQueue, create_job
 from src.service.storage.base import StorageServer
+from src.settings import get_settings
 
 if TYPE_CHECKING:
     from sqlalchemy.ext.asyncio import AsyncSession
 
 
-__all__ = ("RequestController",)
+__all__ = ("UPDATE_SUMMARY_HEADER", "RequestController")
 
 
 def parse_text(value: str) -> list[str]:
@@ -48,6 +71,17 @@ def parse_id(value: str) -> list[UUID | None]:
 
 
 # Needed for when images can be a list of upload file or a single upload file
+def parse_images(value: UploadFile | list[UploadFile]) -> list[UploadFile]:
+    if isinstance(value, UploadFile):
+        return [value]
+    if isinstance(value, list):
+        return value
+    raise HTTPException(
+        detail="Unable to parse file upload. Expect a file upload or a list of file upload. Null data must be set to empty file",
+        status_code=400,
+    )
+
+
 class CompositeRequest(BaseModel):
     project_id: UUID
     text: str
@@ -58,19 +92,53 @@ class CompositeRequest(BaseModel):
     @field_validator("images", mode="before")
     @classmethod
     def parse_images(cls, value: UploadFile | list[UploadFile]) -> list[UploadFile]:
-        if isinstance(value, UploadFile):
-            return [value]
-        if isinstance(value, list):
-            return value
-        raise HTTPException(
-            detail="Unable to parse file upload. Expect a file upload or a list of file upload. Null data must be set to empty file",
-            status_code=400,
-        )
+        return parse_images(value)
 
 
 CompositeRequestAnnotated = Annotated[CompositeRequest, Body(media_type=RequestEncodingType.MULTI_PART)]
 
 
+class BatchItem(BaseModel):
+    project_id: UUID
+    text: list[str]
+
+
+# `requests` is a json list of {"project_id", "text"} items, `images` holds the files of all of them in order
+class CompositeBatch(BaseModel):
+    requests: str
+    images: list[UploadFile] = []
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    @field_validator("images", mode="before")
+    @classmethod
+    def parse_images(cls, value: UploadFile | list[UploadFile]) -> list[UploadFile]:
+        return parse_images(value)
+
+
+CompositeBatchAnnotated = Annotated[CompositeBatch, Body(media_type=RequestEncodingType.MULTI_PART)]
+BATCH_ITEMS = TypeAdapter(list[BatchItem])
+
+
+@dataclass
+class BatchPrompt:
+    id: UUID
+    text: str
+    image: UUID | None
+
+
+@dataclass
+class BatchResult:
+    """Outcome of one item of a batch, `status_code` is that of the matching `POST /request`."""
+
+    index: int
+    status_code: int
+    project_id: UUID
+    id: UUID | None = None
+    job_id: UUID | None = None
+    prompts: list[BatchPrompt] = field(default_factory=list)
+    detail: str | None = None
+
+
 def parse(data: CompositeRequest) -> tuple[list[str], list[UUID | None]]:
     parsed_text = parse_text(data.text)
     parsed_id = parse_id(data.id)
@@ -82,51 +150,244 @@ def parse(data: CompositeRequest) -> tuple[list[str], list[UUID | None]]:
     return (parsed_text, parsed_id)
 
 
-async def delete_request(session: "AsyncSession", storage: "StorageServer", id: UUID) -> None:
-    request: Request = await read_item_by_id(session, Request, id)
-    prompts = request.prompts
-    prompts_ids = [item.id for item in prompts]
-    for prompt_id in prompts_ids:
-        await delete_prompt(id=prompt_id, session=session, storage=storage)
-    if request.output_image:
-        await storage.delete(request.output_image)
-    await session.delete(request)
+async def schedule_generation(
+    session: "AsyncSession", generation_queue: GenerationQueue, request: Request
+) -> Response[Request]:
+    # The job is handed to the workers once the response is sent, i.e. after the transaction committed
+    job = await create_job(session, request.id)
+    return Response(
+        request,
+        status_code=HTTP_202_ACCEPTED,
+        headers={"Location": f"/job/{job.id}"},
+        background=BackgroundTask(generation_queue.submit, job.id),
+    )
+
+
+UPDATE_SUMMARY_HEADER = "X-Update-Summary"
+
+
+@dataclass
+class UpdateSummary:
+    """Prompts created, updated, deleted and left as they were by `PUT /request/{id}`."""
+
+    created: int = 0
+    updated: int = 0
+    deleted: int = 0
+    unchanged: int = 0
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.created or self.updated or self.deleted)
+
+    def header(self) -> str:
+        return f"created={self.created}, updated={self.updated}, deleted={self.deleted}, unchanged={self.unchanged}"
+
+
+def parse_batch(data: CompositeBatch) -> list[BatchItem]:
+    try:
+        items = BATCH_ITEMS.validate_json(data.requests)
+    except ValidationError as e:
+        raise HTTPException(
+            detail=f"Unable to parse requests, expect a json list of project_id and text list: {e}", status_code=400
+        ) from e
+    if len(items) > get_settings().max_batch_requests:
+        raise HTTPException(f"At most {get_settings().max_batch_requests} requests per batch", status_code=400)
+    if sum(len(item.text) for item in items) != len(data.images):
+        raise HTTPException("Size of all texts and files must be equal", status_code=400)
+    return items
+
+
+async def insert_batch(
+    session: "AsyncSession", storage: StorageServer, data: CompositeBatch
+) -> tuple[list[BatchResult], list[UUID]]:
+    """Insert the requests of a batch with their prompts and jobs, a statement per table.
+
+    Items for unknown projects are left out and reported with a 404 result, their images are not stored.
+    Returns the result of every item and the ids of the jobs to submit once the transaction committed.
+    """
+    items = parse_batch(data)
+    known = set(await session.scalars(select(Project.id).where(Project.id.in_({item.project_id for item in items}))))
+    results: list[BatchResult] = []
+    uploads: list[UploadFile] = []
+    offset = 0
+    for index, item in enumerate(items):
+        files = data.images[offset : offset + len(item.text)]
+        offset += len(item.text)
+        if item.project_id not in known:
+            results.append(BatchResult(index, HTTP_404_NOT_FOUND, item.project_id, detail="Unknown project"))
+            continue
+        uploads.extend(files)
+        results.append(
+            BatchResult(
+                index,
+                HTTP_202_ACCEPTED,
+                item.project_id,
+                id=uuid4(),
+                job_id=uuid4(),
+                prompts=[BatchPrompt(uuid4(), text, None) for text in item.text],
+            )
+        )
+    accepted = [result for result in results if result.status_code == HTTP_202_ACCEPTED]
+    if not accepted:
+        return results, []
+
+    # One bounded pipeline for the images of every item, before the inserts take the write lock
+    image_ids = iter(await store_images(uploads, storage, get_settings().prompt_ingest_concurrency))
+    for result in accepted:
+        for prompt in result.prompts:
+            prompt.image = next(image_ids)
+    for project_id in {result.project_id for result in accepted}:
+        invalidate_project(session, project_id)
+    await session.execute(insert(Request), [{"id": result.id, "project_id": result.project_id} for result in accepted])
+    prompts = [
+        {"id": prompt.id, "text": prompt.text, "image": prompt.image, "request_id": result.id}
+        for result in accepted
+        for prompt in result.prompts
+    ]
+    if prompts:
+        await session.execute(insert(Prompt), prompts)
+    await session.execute(insert(Job), [{"id": result.job_id, "request_id": result.id} for result in accepted])
+    return results, [result.job_id for result in accepted if result.job_id is not None]
+
+
+async def delete_requests(session: "AsyncSession", *criteria: Any) -> list[UUID]:
+    """Delete the requests matching `criteria` together with their prompts and jobs.
+
+    Returns the ids of the images they referenced, to be removed from storage once the transaction
+    committed (see `remove_blobs`).
+    """
+    request_ids = select(Request.id).where(*criteria)
+    blob_ids = await session.scalars(
+        union_all(
+            select(Prompt.image).where(Prompt.request_id.in_(request_ids), Prompt.image.is_not(None)),
+            select(Request.output_image).where(*criteria, Request.output_image.is_not(None)),
+        )
+    )
+    images = list(blob_ids)
+    for stmt in (
+        sql_delete(Prompt).where(Prompt.request_id.in_(request_ids)),
+        sql_delete(Job).where(Job.request_id.in_(request_ids)),
+        sql_delete(Request).where(*criteria),
+    ):
+        await session.execute(stmt.execution_options(synchronize_session=False))
+    return images
+
+
+def remove_blobs(storage: StorageServer, blob_ids: Sequence[UUID]) -> Response[None]:
+    # Storage is only touched after the commit, a rolled back deletion keeps its images
+    return Response(
+        None,
+        status_code=HTTP_204_NO_CONTENT,
+        background=BackgroundTask(storage.delete_many, blob_ids, get_settings().blob_delete_batch_size),
+    )
+
+
+async def delete_request(session: "AsyncSession", storage: StorageServer, id: UUID) -> Response[None]:
+    # Unknown ids raise NoResultFound, as loading the request did before
+    project_id = (await session.execute(select(Request.project_id).where(Request.id == id))).scalar_one()
+    invalidate_project(session, project_id)
+    return remove_blobs(storage, await delete_requests(session, Request.id == id))
 
 
 class RequestController(BaseController[Request]):
     path = "/request"
     return_dto = RequestDTO.read_dto
+    load_options = (selectinload(Request.prompts),)
+
+    @get(return_dto=None, media_type=MediaType.JSON)
+    async def get_all_items(
+        self,
+        request: HttpRequest,
+        read_session: "AsyncSession",
+        limit: PageSize = DEFAULT_PAGE_SIZE,
+        cursor: str | None = None,
+    ) -> Response[bytes]:
+        if get_settings().fast_serialization:
+            body, next_cursor = await encode_request_page(read_session, limit, cursor)
+        else:
+            items, next_cursor = await read_page(read_session, Request, limit, cursor, options=self.load_options)
+            body = encode_with_dto(request, RequestDTO.read_dto, Sequence[Request], items)
+        return paginated(body, next_cursor)
+
+    @get("/{id:uuid}")
+    async def get_item_by_id(
+        self, read_session: "AsyncSession", id: UUID, if_none_match: IfNoneMatch = None
+    ) -> Response[Request]:
+        etag = await graph_etag(
+            read_session,
+            union_all(
+                select(Request.id, Request.updated_at).where(Request.id == id),
+                select(Prompt.id, Prompt.updated_at).where(Prompt.request_id == id),
+            ),
+        )
+        check_not_modified(etag, if_none_match)
+        request: Request = await read_item_by_id(read_session, Request, id, self.load_options)
+        return Response(request, headers={"ETag": etag})
 
     @post("/base")
     async def create_base_request(self, transaction: "AsyncSession", data: Request) -> Request:
-        request: Request = await create_item(session=transaction, table=Request, data=data)
+        invalidate_project(transaction, data.project_id)
+        request: Request = await create_item(session=transaction, table=Request, data=data, options=self.load_options)
         return request
 
-    @post()
+    @post(status_code=HTTP_202_ACCEPTED)
     async def create_item(
-        self, transaction: "AsyncSession", data: CompositeRequestAnnotated, storage: StorageServer
-    ) -> Request:
+        self,
+        transaction: "AsyncSession",
+        data: CompositeRequestAnnotated,
+        storage: StorageServer,
+        generation_queue: GenerationQueue,
+    ) -> Response[Request]:
         [texts, _] = parse(data)
-        files = data.images
+        invalidate_project(transaction, data.project_id)
 
-        request: Request = await create_item(
-            session=transaction, table=Request, data=Request(project_id=data.project_id)
+        # An unknown project fails before any image is written, and the images are written before the first
+        # insert: the database write lock is only held for the inserts, not for the uploads
+        if await transaction.scalar(select(Project.id).where(Project.id == data.project_id)) is None:
+            raise HTTPException(detail=f"Unknown project {data.project_id}", status_code=HTTP_404_NOT_FOUND)
+        image_ids = await store_images(data.images, storage, get_settings().prompt_ingest_concurrency)
+        request_id = uuid4()
+        request = Request(
+            id=request_id,
+            project_id=data.project_id,
+            prompts=[
+                Prompt(text=text, image=image_id, request_id=request_id)
+                for text, image_id in zip(texts, image_ids, strict=True)
+            ],
+        )
+        transaction.add(request)
+        try:
+            await transaction.flush()
+        except Exception:
+            # Nothing references the stored images, e.g. the project was deleted since the check
+            await storage.delete_many([id for id in image_ids if id is not None], get_settings().blob_delete_batch_size)
+            raise
+        return await schedule_generation(transaction, generation_queue, request)
+
+    @post("/batch", status_code=HTTP_202_ACCEPTED, return_dto=None)
+    async def create_batch(
+        self,
+        transaction: "AsyncSession",
+        data: CompositeBatchAnnotated,
+        storage: StorageServer,
+        generation_queue: GenerationQueue,
+    ) -> Response[list[BatchResult]]:
+        results, job_ids = await insert_batch(transaction, storage, data)
+        return Response(
+            results,
+            status_code=HTTP_202_ACCEPTED,
+            background=BackgroundTask(generation_queue.submit_many, job_ids),
         )
-        request.prompts = []
-        for i in range(len(texts)):
-            init_prompt = _PromptRawDTO(text=texts[i], request_id=request.id, image=files[i])
-            prompt_data = await create_prompt(data=init_prompt, session=transaction, storage=storage)
-            prompt_data.request = request
-            request.prompts.append(prompt_data)
-        await transaction.flush()
-        output = await generate_output(request, storage)
-        request.output_image = output
-        return request
 
-    @put("/{id:uuid}")
+    @put("/{id:uuid}", status_code=HTTP_202_ACCEPTED)
     async def update_item(
-        self, transaction: "AsyncSession", id: UUID, data: CompositeRequestAnnotated, storage: StorageServer
-    ) -> Request:
+        self,
+        transaction: "AsyncSession",
+        id: UUID,
+        data: CompositeRequestAnnotated,
+        storage: StorageServer,
+        generation_queue: GenerationQueue,
+    ) -> Response[Request]:
         [texts, prompt_ids] = parse(data)
         files = data.images
 
@@ -135,31 +396,39 @@ class RequestController(BaseController[Request]):
         if len(prompt_ids) != len(texts):
             raise ValueError("Length of text list must match length of prompt ids")
 
-        request: Request = await read_item_by_id(transaction, Request, id)
-        initial_prompts = request.prompts
-        initial_prompts_id = [item.id for item in initial_prompts]
-        for i in range(len(texts)):
-            text = texts[i]
-            image = files[i]
-            prompt_id = prompt_ids[i]
+        request: Request = await read_item_by_id(transaction, Request, id, self.load_options)
+        summary = UpdateSummary()
+        remaining = {prompt.id: prompt for prompt in request.prompts}
+        for text, image, prompt_id in zip(texts, files, prompt_ids, strict=True):
             # New prompt -> Create
             if prompt_id is None:
                 init_prompt = _PromptRawDTO(text=text, request_id=request.id, image=image)
                 await create_prompt(data=init_prompt, session=transaction, storage=storage)
-            else:
-                # Old prompt -> Update
-                if prompt_id in initial_prompts_id:
-                    prompt = _PromptRawDTO(text=text, request_id=id, image=image, id=prompt_id)
-                    await update_prompt(data=prompt, session=transaction, id=prompt_id, storage=storage)
-                    initial_prompts_id.remove(prompt_id)
+                summary.created += 1
+            # Old prompt -> Update what differs
+            elif prompt_id in remaining:
+                if await sync_prompt(remaining.pop(prompt_id), text, image, storage):
+                    summary.updated += 1
+                else:
+                    summary.unchanged += 1
 
         # Remaining prompts -> has been deleted -> Delete
-        for prompt_id in initial_prompts_id:
+        for prompt_id in remaining:
             await delete_prompt(id=prompt_id, session=transaction, storage=storage)
-        output = await generate_output(request, storage)
-        request.output_image = output
-        return request
+            summary.deleted += 1
+        # The prompts were loaded before the changes, the response lists them as they are now
+        await transaction.flush()
+        await transaction.refresh(request, ["prompts"])
+
+        headers = {UPDATE_SUMMARY_HEADER: summary.header()}
+        if not summary.changed:
+            # Same prompt set, the current output stands
+            return Response(request, status_code=HTTP_200_OK, headers=headers)
+        invalidate_project(transaction, request.project_id)
+        response = await schedule_generation(transaction, generation_queue, request)
+        response.headers.update(headers)
+        return response
 
     @delete("/{id:uuid}")
-    async def delete_item(self, transaction: "AsyncSession", id: UUID, storage: StorageServer) -> None:
-        await delete_request(transaction, storage, id)
+    async def delete_item(self, transaction: "AsyncSession", id: UUID, storage: StorageServer) -> Response[None]:
+        return await delete_request(transaction, storage, id)
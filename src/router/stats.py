@@ -0,0 +1,20 @@
+from typing import Any
+
+from litestar import Controller, get
+
+from src.service.cache import generation_cache, project_tree_cache
+from src.service.storage import CachedStorage, StorageServer
+
+__all__ = ("StatsController",)
+
+
+class StatsController(Controller):
+    path = "stats"
+
+    @get("/cache")
+    async def get_cache_stats(self, storage: StorageServer) -> dict[str, Any]:
+        return {
+            "project_tree": project_tree_cache.stats(),
+            "generation": generation_cache.stats(),
+            "storage": storage.stats() if isinstance(storage, CachedStorage) else None,
+        }
@@ -6,13 +6,14 @@ from litestar.datastructures import UploadFile
 from litestar.enums import RequestEncodingType
 from litestar.params import Body
 
-from src.model import Project, Request
+from src.model import Project, Prompt, Request
 from src.router.utils.dto import DTOGenerator
 
-__all__ = ["RequestDTO", "RequestWithRawFile"]
+__all__ = ["ProjectDTO", "PromptDTO", "RequestDTO", "RequestWithRawFile"]
 
 RequestDTO = DTOGenerator[Request](read_kwargs={"max_nested_depth": 1}, write_kwargs={"max_nested_depth": 0})
 ProjectDTO = DTOGenerator[Project](read_kwargs={"max_nested_depth": 1}, write_kwargs={"max_nested_depth": 0})
+PromptDTO = DTOGenerator[Prompt](read_kwargs={"max_nested_depth": 1}, write_kwargs={"max_nested_depth": 0})
 
 
 @dataclass
@@ -1,18 +1,43 @@
 from typing import Any, Generic, TypeVar
 
+from litestar import Request
 from litestar.contrib.sqlalchemy.dto import SQLAlchemyDTO, SQLAlchemyDTOConfig
+from litestar.dto import AbstractDTO
 from litestar.exceptions import InvalidAnnotationException
+from litestar.serialization import encode_json
 from litestar.typing import FieldDefinition
 from sqlalchemy.orm import DeclarativeBase
 
-__all__ = ("DTOGenerator",)
+__all__ = ("DTOGenerator", "build_dto", "encode_with_dto")
 
 T = TypeVar("T", bound=DeclarativeBase)
 
+_dto_cache: dict[tuple[type, str, str], type[SQLAlchemyDTO]] = {}
+
+
+def build_dto(model_type: type, name: str, kwargs: dict[str, Any]) -> type[SQLAlchemyDTO]:
+    """`SQLAlchemyDTO` subclass of `model_type` configured with `kwargs`, built once per model and config.
+
+    Litestar keeps the transfer backends it compiles on the DTO class, so sharing the class also shares them.
+    """
+    key = (model_type, name, repr(sorted(kwargs.items())))
+    dto = _dto_cache.get(key)
+    if dto is None:
+        dto = type(name, (SQLAlchemyDTO[model_type],), {"config": SQLAlchemyDTOConfig(**kwargs)})  # type: ignore[valid-type]
+        _dto_cache[key] = dto
+    return dto
+
+
+def encode_with_dto(request: Request, dto: type[AbstractDTO], annotation: Any, data: Any) -> bytes:
+    """JSON of `data` as returned by a `return_dto=dto` handler annotated with `annotation`."""
+    dto.create_for_field_definition(FieldDefinition.from_annotation(annotation), request.route_handler.handler_id)
+    return encode_json(dto(request).data_to_encodable_type(data))
+
 
 class DTOGenerator(Generic[T]):
     model_type: type[T]
-    base_read_kwargs: dict[str, Any] = {"max_nested_depth": 0}
+    # Read DTOs compile their transfer functions, write DTOs keep the default backend
+    base_read_kwargs: dict[str, Any] = {"max_nested_depth": 0, "experimental_codegen_backend": True}
     base_write_kwargs: dict[str, Any] = {"max_nested_depth": 0, "partial": True}
 
     def __class_getitem__(cls, model_type: type[T]) -> type:
@@ -51,15 +76,9 @@ class DTOGenerator(Generic[T]):
         return base_kwargs
 
     @property
-    def read_dto(self) -> type:
-        class ReadDTO(SQLAlchemyDTO[self.model_type]):  # type: ignore[name-defined]
-            config = SQLAlchemyDTOConfig(**self.read_kwargs)
-
-        return ReadDTO
+    def read_dto(self) -> type[SQLAlchemyDTO]:
+        return build_dto(self.model_type, "ReadDTO", self.read_kwargs)
 
     @property
-    def write_dto(self) -> type:
-        class WriteDTO(SQLAlchemyDTO[self.model_type]):  # type: ignore[name-defined]
-            config = SQLAlchemyDTOConfig(**self.write_kwargs)
-
-        return WriteDTO
+    def write_dto(self) -> type[SQLAlchemyDTO]:
+        return build_dto(self.model_type, "WriteDTO", self.write_kwargs)
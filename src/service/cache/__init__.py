@@ -0,0 +1,12 @@
+from src.service.cache.generation import GenerationCache, generation_cache, generation_fingerprint
+from src.service.cache.project_tree import CachedTree, ProjectTreeCache, invalidate_project, project_tree_cache
+
+__all__ = [
+    "CachedTree",
+    "GenerationCache",
+    "ProjectTreeCache",
+    "generation_cache",
+    "generation_fingerprint",
+    "invalidate_project",
+    "project_tree_cache",
+]
@@ -0,0 +1,109 @@
+import hashlib
+import json
+from collections.abc import Sequence
+from datetime import UTC, datetime, timedelta
+from typing import TYPE_CHECKING, Any
+from uuid import UUID
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects.sqlite import insert
+
+from src.model.generation import GenerationResult
+from src.settings import get_settings
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+__all__ = ("GenerationCache", "generation_cache", "generation_fingerprint")
+
+
+def generation_fingerprint(prompts: Sequence[tuple[str, str | None]], rules_version: str) -> str:
+    """Key of the prompt texts and image digests, in prompt order, generated under the rules `rules_version`."""
+    payload = json.dumps([rules_version, [[text, digest] for text, digest in prompts]], separators=(",", ":"))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class GenerationCache:
+    """Generated outputs persisted in `generation_cache_table`, keyed by `generation_fingerprint`.
+
+    Entries expire `ttl` seconds after they were generated, and the least recently used ones are evicted
+    once their outputs add up to more than `max_bytes`. Methods return the blobs of dropped entries, to be
+    deleted from storage once the transaction committed.
+    """
+
+    def __init__(self, max_bytes: int, ttl: float) -> None:
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _expiry(self) -> datetime:
+        return datetime.now(UTC) - timedelta(seconds=self.ttl)
+
+    async def lookup(self, session: "AsyncSession", fingerprint: str) -> UUID | None:
+        output: UUID | None = await session.scalar(
+            update(GenerationResult)
+            .where(GenerationResult.fingerprint == fingerprint, GenerationResult.created_at >= self._expiry())
+            .values(used_at=datetime.now(UTC))
+            .returning(GenerationResult.output_image)
+        )
+        if output is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return output
+
+    async def store(self, session: "AsyncSession", fingerprint: str, output_image: UUID, size: int) -> list[UUID]:
+        """Add the entry unless the fingerprint is already cached or `size` exceeds the whole budget."""
+        released = await self._drop(session, GenerationResult.created_at < self._expiry())
+        if size > self.max_bytes:
+            return [*released, output_image]
+        inserted = await session.scalar(
+            insert(GenerationResult)
+            .values(fingerprint=fingerprint, output_image=output_image, size=size)
+            .on_conflict_do_nothing(index_elements=["fingerprint"])
+            .returning(GenerationResult.id)
+        )
+        if inserted is None:
+            released.append(output_image)
+        total = await session.scalar(select(func.coalesce(func.sum(GenerationResult.size), 0)))
+        if total is not None and total > self.max_bytes:
+            entries = await session.execute(
+                select(GenerationResult.id, GenerationResult.size).order_by(GenerationResult.used_at)
+            )
+            evicted = []
+            for id, entry_size in entries:
+                if total <= self.max_bytes:
+                    break
+                evicted.append(id)
+                total -= entry_size
+            released += await self._drop(session, GenerationResult.id.in_(evicted))
+        return released
+
+    async def discard(self, session: "AsyncSession", fingerprint: str) -> list[UUID]:
+        # An entry whose output went missing from storage
+        return await self._drop(session, GenerationResult.fingerprint == fingerprint)
+
+    async def _drop(self, session: "AsyncSession", criterion: Any) -> list[UUID]:
+        dropped = list(
+            await session.scalars(delete(GenerationResult).where(criterion).returning(GenerationResult.output_image))
+        )
+        self.evictions += len(dropped)
+        return dropped
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+        }
+
+
+generation_cache = GenerationCache(get_settings().generation_cache_bytes, get_settings().generation_cache_ttl)
@@ -0,0 +1,136 @@
+from collections import OrderedDict
+from collections.abc import Iterator
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, NamedTuple
+from uuid import UUID
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from src.settings import get_settings
+
+__all__ = ("CachedTree", "ProjectTreeCache", "invalidate_project", "project_tree_cache")
+
+
+class CachedTree(NamedTuple):
+    body: bytes
+    etag: str
+    # Row count and latest `updated_at` of the project graph it was read from
+    version: tuple[int, datetime]
+
+
+class ProjectTreeCache:
+    """Serialized `GET /project/{id}` bodies, bounded to `max_bytes` and evicted least recently used first.
+
+    Entries are dropped by the write paths through `invalidate_project`, once their transaction committed.
+    A fill racing with such an invalidation is discarded, as it may have read the state before the write.
+    Writes of other processes are not seen that way, entries are only served at the `version` of the
+    graph currently in the database.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries: OrderedDict[UUID, CachedTree] = OrderedDict()
+        # Number of fills in progress per project, and the projects invalidated while being filled
+        self._filling: dict[UUID, int] = {}
+        self._stale: set[UUID] = set()
+
+    def get(self, id: UUID, version: tuple[int, datetime]) -> CachedTree | None:
+        tree = self._entries.get(id)
+        if tree is not None and tree.version != version:
+            # Written since by another process
+            self.invalidate(id)
+            tree = None
+        if tree is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(id)
+        return tree
+
+    @contextmanager
+    def filling(self, id: UUID) -> Iterator["TreeFill"]:
+        """Context in which the tree of project `id` is read from the database and stored."""
+        self._filling[id] = self._filling.get(id, 0) + 1
+        try:
+            yield TreeFill(self, id)
+        finally:
+            self._filling[id] -= 1
+            if not self._filling[id]:
+                del self._filling[id]
+                self._stale.discard(id)
+
+    def _store(self, id: UUID, tree: CachedTree) -> None:
+        if id in self._stale or len(tree.body) > self.max_bytes:
+            return
+        self._drop(id)
+        self._entries[id] = tree
+        self.size += len(tree.body)
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted.body)
+            self.evictions += 1
+
+    def _drop(self, id: UUID) -> None:
+        tree = self._entries.pop(id, None)
+        if tree is not None:
+            self.size -= len(tree.body)
+
+    def invalidate(self, id: UUID) -> None:
+        self.invalidations += 1
+        self._drop(id)
+        if id in self._filling:
+            self._stale.add(id)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.size = 0
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+class TreeFill:
+    def __init__(self, cache: ProjectTreeCache, id: UUID) -> None:
+        self.cache = cache
+        self.id = id
+
+    def store(self, tree: CachedTree) -> None:
+        self.cache._store(self.id, tree)
+
+
+project_tree_cache = ProjectTreeCache(get_settings().project_cache_bytes)
+
+INFO_KEY = "invalidate_projects"
+
+
+def invalidate_project(session: AsyncSession | Session, project_id: UUID) -> None:
+    """Drop the cached tree of `project_id` once the transaction of `session` commits."""
+    sync_session = session.sync_session if isinstance(session, AsyncSession) else session
+    sync_session.info.setdefault(INFO_KEY, set()).add(project_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session: Session) -> None:
+    for project_id in session.info.pop(INFO_KEY, ()):
+        project_tree_cache.invalidate(project_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_after_rollback(session: Session, *_: Any) -> None:
+    session.info.pop(INFO_KEY, None)
@@ -0,0 +1,50 @@
+from typing import TYPE_CHECKING
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+if TYPE_CHECKING:
+    from litestar import Litestar
+
+__all__ = ("ReadDatabase",)
+
+
+def set_query_only(dbapi_connection, connection_record):  # type: ignore[no-untyped-def]
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA query_only=ON")
+    cursor.close()
+
+
+class ReadDatabase:
+    """Engine and sessions of the GET endpoints, separate from the ones of the writing transactions.
+
+    Its connections are query-only, so a reader never takes the write lock: in WAL mode reads proceed
+    while a write transaction is open, each on the last snapshot committed when it started.
+    """
+
+    def __init__(self, sqlite_db: str, pool_size: int) -> None:
+        self.sqlite_db = sqlite_db
+        self.pool_size = pool_size
+        self.engine: AsyncEngine | None = None
+        self.session_maker: async_sessionmaker[AsyncSession] | None = None
+
+    async def start(self, app: "Litestar") -> None:
+        # aiosqlite engines do not pool file connections by default
+        self.engine = create_async_engine(
+            f"sqlite+aiosqlite:///{self.sqlite_db}", poolclass=AsyncAdaptedQueuePool, pool_size=self.pool_size
+        )
+        event.listen(self.engine.sync_engine, "connect", set_query_only)
+        self.session_maker = async_sessionmaker(self.engine, expire_on_commit=False)
+        app.state.read_database = self
+
+    async def stop(self, app: "Litestar") -> None:
+        if self.engine is not None:
+            await self.engine.dispose()
+            self.engine = None
+            self.session_maker = None
+
+    def session(self) -> AsyncSession:
+        if self.session_maker is None:
+            raise RuntimeError("Read database has not been started")
+        return self.session_maker()
@@ -1,45 +1,40 @@
 import random
+from collections.abc import Sequence
 from pathlib import Path
 from uuid import UUID
 
-from src.model import Request
+from src.service.image_generation.resources import ResourceCache
+from src.service.image_generation.rules import RuleEngine
 from src.service.storage import StorageServer
+from src.settings import get_settings
 
-__all__ = ("generate_output",)
+__all__ = ("generate_output", "get_output", "preload_resources", "resource_cache", "rule_engine")
 
 
 ParentPath = Path(__file__).parents[0]
 ResourcePath = ParentPath / "resource"
+RulesPath = ParentPath / "rules.json"
 
-PROP_MAPPING = {
-    ("dark",): ["dark_grey.jpg"],
-    ("jacket",): ["jacket.png"],
-    ("shoe",): ["model_outfit_hat_bag_shoe_v1.png", "model_outfit_hat_bag_shoe_v2.png"],
-    ("sketch",): ["sketch_trees.jpg"],
-    ("sunglasses",): ["sunglasses_face.png"],
-    ("triangular",): ["triangular_windows.jpg"],
-    ("chair",): ["white_flower.jpg"],
-    ("skirt",): ["white_top_black_skirt_v1.png"],
-    ("dog",): ["dog_v1.jpeg", "dog_v2.jpeg"],
-    ("golden",): ["golden-retriever.jpg"],
-}
-
-
-def get_output(text: str) -> str:
-    for kwds, v in PROP_MAPPING.items():
-        matching = True
-        for kw in kwds:
-            if kw not in text:
-                matching = False
-                break
-        if matching:
-            return random.choice(v)  # noqa: S311
-    return "dog_v1.jpeg"
-
-
-async def generate_output(request: Request, storage: StorageServer) -> UUID:
-    if request.output_image is not None:
-        await storage.delete(request.output_image)
-    requests_texts = " ".join([prompt.text for prompt in request.prompts])
-    with Path(ResourcePath / get_output(requests_texts)).open("rb") as file:
-        return await storage.create(file.read())
+DEFAULT_OUTPUT = "dog_v1.jpeg"
+
+resource_cache = ResourceCache(ResourcePath, get_settings().resource_cache_bytes)
+rule_engine = RuleEngine(Path(get_settings().generation_rules or RulesPath))
+
+
+async def get_output(text: str) -> str:
+    rule = (await rule_engine.current()).match(text)
+    if rule is None:
+        return DEFAULT_OUTPUT
+    return random.choice(rule.outputs)  # noqa: S311
+
+
+async def preload_resources() -> None:
+    # Resources listed in the rules but missing on disk are skipped here and fail the job when picked
+    await resource_cache.preload(dict.fromkeys([DEFAULT_OUTPUT, *(await rule_engine.current()).outputs()]))
+
+
+async def generate_output(
+    texts: Sequence[str], storage: StorageServer, resources: ResourceCache = resource_cache
+) -> UUID:
+    requests_texts = " ".join(texts)
+    return await storage.create(await resources.get(await get_output(requests_texts)))
@@ -0,0 +1,57 @@
+import asyncio
+from collections import OrderedDict
+from collections.abc import Iterable
+from pathlib import Path
+
+import anyio
+
+__all__ = ("ResourceCache",)
+
+
+class ResourceCache:
+    """In-memory copy of the generator resource files, bounded to `max_bytes`.
+
+    Files are read in a worker thread on first use (or by `preload`) and evicted least recently used first.
+    Files larger than the whole budget are read every time instead of being cached.
+    """
+
+    def __init__(self, root: Path, max_bytes: int) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._payloads: OrderedDict[str, bytes] = OrderedDict()
+        # Concurrent misses on the same file share a single read
+        self._loading: dict[str, asyncio.Task[bytes]] = {}
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._payloads
+
+    async def get(self, name: str) -> bytes:
+        payload = self._payloads.get(name)
+        if payload is not None:
+            self._payloads.move_to_end(name)
+            return payload
+        task = self._loading.get(name)
+        if task is None:
+            task = asyncio.ensure_future(anyio.Path(self.root / name).read_bytes())
+            self._loading[name] = task
+            task.add_done_callback(lambda _: self._loading.pop(name, None))
+        payload = await asyncio.shield(task)
+        self._store(name, payload)
+        return payload
+
+    async def preload(self, names: Iterable[str]) -> None:
+        for name in names:
+            try:
+                await self.get(name)
+            except FileNotFoundError:
+                continue
+
+    def _store(self, name: str, payload: bytes) -> None:
+        if name in self._payloads or len(payload) > self.max_bytes:
+            return
+        self._payloads[name] = payload
+        self.size += len(payload)
+        while self.size > self.max_bytes:
+            _, evicted = self._payloads.popitem(last=False)
+            self.size -= len(evicted)
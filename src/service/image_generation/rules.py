@@ -0,0 +1,153 @@
+import hashlib
+import json
+import logging
+import time
+from collections import deque
+from collections.abc import Iterable, Sequence
+from dataclasses import dataclass
+from pathlib import Path
+
+from litestar.concurrency import sync_to_thread
+
+__all__ = ("KeywordMatcher", "Rule", "RuleEngine", "RuleSet", "load_rules")
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Rule:
+    keywords: tuple[str, ...]
+    outputs: tuple[str, ...]
+    priority: int = 0
+
+
+class KeywordMatcher:
+    """Aho-Corasick automaton reporting which of `keywords` occur as substrings of a text.
+
+    A scan walks the text once, whatever the number of keywords.
+    """
+
+    def __init__(self, keywords: Sequence[str]) -> None:
+        self.transitions: list[dict[str, int]] = [{}]
+        self.outputs: list[set[int]] = [set()]
+        for index, keyword in enumerate(keywords):
+            state = 0
+            for char in keyword:
+                next_state = self.transitions[state].get(char)
+                if next_state is None:
+                    next_state = len(self.transitions)
+                    self.transitions[state][char] = next_state
+                    self.transitions.append({})
+                    self.outputs.append(set())
+                state = next_state
+            self.outputs[state].add(index)
+
+        # Breadth first so the fallback of a state is complete before its children are linked
+        self.fallback = [0] * len(self.transitions)
+        queue = deque(self.transitions[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self.transitions[state].items():
+                queue.append(child)
+                fallback = self.fallback[state]
+                while fallback and char not in self.transitions[fallback]:
+                    fallback = self.fallback[fallback]
+                self.fallback[child] = self.transitions[fallback].get(char, 0)
+                self.outputs[child] |= self.outputs[self.fallback[child]]
+
+    def scan(self, text: str) -> set[int]:
+        found: set[int] = set()
+        state = 0
+        for char in text:
+            while state and char not in self.transitions[state]:
+                state = self.fallback[state]
+            state = self.transitions[state].get(char, 0)
+            found |= self.outputs[state]
+        return found
+
+
+class RuleSet:
+    """Rules compiled for matching, a rule applies when all of its keywords occur in the text.
+
+    The applicable rule with the highest priority wins, ties go to the rule listed first.
+    """
+
+    def __init__(self, rules: Iterable[Rule]) -> None:
+        # Highest priority first, sorted() is stable so file order breaks ties
+        self.rules = sorted(rules, key=lambda rule: -rule.priority)
+        # Identifies the rules, outputs generated under other rules are not reused (see GenerationCache)
+        self.version = hashlib.sha256(repr(self.rules).encode()).hexdigest()
+        keywords = list(dict.fromkeys(keyword for rule in self.rules for keyword in rule.keywords))
+        keyword_index = {keyword: index for index, keyword in enumerate(keywords)}
+        self.matcher = KeywordMatcher(keywords)
+        # Rules by keyword, so a match only visits the rules sharing a keyword with the text
+        self.rules_by_keyword: list[list[int]] = [[] for _ in keywords]
+        self.required: list[int] = []
+        for rule_index, rule in enumerate(self.rules):
+            distinct = {keyword_index[keyword] for keyword in rule.keywords}
+            for keyword in distinct:
+                self.rules_by_keyword[keyword].append(rule_index)
+            self.required.append(len(distinct))
+
+    def match(self, text: str) -> Rule | None:
+        hits: dict[int, int] = {}
+        for keyword in self.matcher.scan(text):
+            for rule_index in self.rules_by_keyword[keyword]:
+                hits[rule_index] = hits.get(rule_index, 0) + 1
+        matched = [rule_index for rule_index, count in hits.items() if count == self.required[rule_index]]
+        return self.rules[min(matched)] if matched else None
+
+    def outputs(self) -> list[str]:
+        return list(dict.fromkeys(output for rule in self.rules for output in rule.outputs))
+
+
+def load_rules(path: Path) -> RuleSet:
+    """Compile a JSON rule file: a list of `{"keywords": [...], "outputs": [...], "priority": int}`."""
+    with path.open("rb") as file:
+        entries = json.load(file)
+    if not isinstance(entries, list):
+        raise ValueError(f"{path}: expected a list of rules")
+    rules = []
+    for position, entry in enumerate(entries):
+        keywords, outputs = entry.get("keywords"), entry.get("outputs")
+        if not keywords or not outputs or not all(keywords) or not all(outputs):
+            raise ValueError(f"{path}: rule {position} needs non-empty keywords and outputs")
+        rules.append(Rule(tuple(keywords), tuple(outputs), int(entry.get("priority", 0))))
+    return RuleSet(rules)
+
+
+class RuleEngine:
+    """Rule set loaded from a file and recompiled when the file changes.
+
+    The modification time is checked at most every `reload_interval` seconds, and the file recompiled in a
+    worker thread. A file that fails to load is logged and the previous rules stay in effect.
+    """
+
+    def __init__(self, path: Path, reload_interval: float = 1.0) -> None:
+        self.path = path
+        self.reload_interval = reload_interval
+        self.mtime = path.stat().st_mtime_ns
+        self.rules = load_rules(path)
+        self.checked_at = time.monotonic()
+
+    async def current(self) -> RuleSet:
+        now = time.monotonic()
+        if now - self.checked_at >= self.reload_interval:
+            # Lookups in the meantime keep the previous rules, the new set is swapped in once compiled
+            self.checked_at = now
+            await sync_to_thread(self.reload)
+        return self.rules
+
+    def reload(self) -> None:
+        # Blocking, runs in a worker thread
+        try:
+            mtime = self.path.stat().st_mtime_ns
+            if mtime == self.mtime:
+                return
+            # Recorded first so a broken file is reported once, not on every check
+            self.mtime = mtime
+            self.rules = load_rules(self.path)
+            logger.info("Reloaded %d generation rules from %s", len(self.rules.rules), self.path)
+        except (OSError, ValueError, TypeError, AttributeError):
+            logger.exception("Unable to reload generation rules from %s, keeping the previous rules", self.path)
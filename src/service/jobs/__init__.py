@@ -0,0 +1,3 @@
+from src.service.jobs.queue import GenerationQueue, create_job
+
+__all__ = ["GenerationQueue", "create_job"]
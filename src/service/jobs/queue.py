@@ -0,0 +1,195 @@
+import asyncio
+import datetime as dt
+import logging
+import time
+from collections.abc import Callable, Sequence
+from typing import TYPE_CHECKING
+from uuid import UUID
+
+from sqlalchemy import select, update
+
+from src.model import Job, JobStatus, Prompt, Request
+from src.service.cache import generation_cache, generation_fingerprint, invalidate_project
+from src.service.image_generation.generator import generate_output, rule_engine
+from src.service.metrics import generation_duration
+from src.service.storage.base import StorageServer
+
+if TYPE_CHECKING:
+    from litestar import Litestar
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+__all__ = ("GenerationQueue", "create_job")
+
+
+logger = logging.getLogger(__name__)
+
+
+async def create_job(session: "AsyncSession", request_id: UUID) -> Job:
+    # Only the newest job of a request may publish its output
+    await session.execute(
+        update(Job)
+        .where(Job.request_id == request_id, Job.status.in_([JobStatus.PENDING, JobStatus.RUNNING]))
+        .values(status=JobStatus.CANCELLED, updated_at=dt.datetime.now(dt.UTC))
+    )
+    job = Job(request_id=request_id)
+    session.add(job)
+    await session.flush()
+    return job
+
+
+class GenerationQueue:
+    """Runs output generation for submitted jobs on a fixed number of background workers.
+
+    Jobs are persisted in `job_table` by the request handlers and submitted once their transaction has
+    committed. Each job reads its prompts, generates without holding a transaction, then publishes the
+    output to `Request.output_image` in a separate short transaction. Prompts already generated are
+    served from `generation_cache` instead: the request gets its own copy of the cached output.
+    """
+
+    def __init__(
+        self,
+        storage_factory: Callable[[], StorageServer],
+        workers: int,
+        maxsize: int = 0,
+        session_maker_key: str = "session_maker_class",
+    ) -> None:
+        self.storage_factory = storage_factory
+        self.workers = workers
+        self.session_maker_key = session_maker_key
+        self.queue: asyncio.Queue[UUID] = asyncio.Queue(maxsize)
+        self.tasks: list[asyncio.Task[None]] = []
+        self.session_maker: Callable[[], AsyncSession] | None = None
+
+    async def start(self, app: "Litestar") -> None:
+        self.session_maker = app.state[self.session_maker_key]
+        app.state.generation_queue = self
+        self.tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        self.tasks.append(asyncio.create_task(self._recover()))
+
+    async def stop(self, app: "Litestar") -> None:
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    async def submit(self, job_id: UUID) -> None:
+        await self.queue.put(job_id)
+
+    async def submit_many(self, job_ids: Sequence[UUID]) -> None:
+        # In order, each waiting for room when the queue is bounded
+        for job_id in job_ids:
+            await self.queue.put(job_id)
+
+    def _session(self) -> "AsyncSession":
+        if self.session_maker is None:
+            raise RuntimeError("Generation queue has not been started")
+        return self.session_maker()
+
+    async def _recover(self) -> None:
+        # Resubmit work interrupted by a shutdown
+        async with self._session() as session, session.begin():
+            await session.execute(update(Job).where(Job.status == JobStatus.RUNNING).values(status=JobStatus.PENDING))
+            job_ids = (
+                await session.scalars(select(Job.id).where(Job.status == JobStatus.PENDING).order_by(Job.created_at))
+            ).all()
+        for job_id in job_ids:
+            await self.submit(job_id)
+
+    async def _work(self) -> None:
+        while True:
+            job_id = await self.queue.get()
+            try:
+                await self.run(job_id)
+            except Exception:
+                logger.exception("Generation job %s failed", job_id)
+            finally:
+                self.queue.task_done()
+
+    async def run(self, job_id: UUID) -> None:
+        storage = self.storage_factory()
+        async with self._session() as session, session.begin():
+            claimed = await session.execute(
+                update(Job)
+                .where(Job.id == job_id, Job.status == JobStatus.PENDING)
+                .values(status=JobStatus.RUNNING, updated_at=dt.datetime.now(dt.UTC))
+                .returning(Job.request_id)
+            )
+            request_id = claimed.scalar_one_or_none()
+            if request_id is None:
+                return
+            prompts = (
+                await session.execute(
+                    select(Prompt.text, Prompt.image)
+                    .where(Prompt.request_id == request_id)
+                    .order_by(Prompt.created_at, Prompt.id)
+                )
+            ).all()
+        texts = [text for text, _ in prompts]
+
+        fingerprint = None
+        output = None
+        released: list[UUID] = []
+        start = time.perf_counter()
+        if generation_cache.enabled:
+            digests = [None if image is None else await storage.digest(image) for _, image in prompts]
+            fingerprint = generation_fingerprint(
+                list(zip(texts, digests, strict=True)), (await rule_engine.current()).version
+            )
+            async with self._session() as session, session.begin():
+                cached = await generation_cache.lookup(session, fingerprint)
+            if cached is not None:
+                output = await storage.copy(cached)
+                if output is None:
+                    # The cached output went missing from storage
+                    async with self._session() as session, session.begin():
+                        released = await generation_cache.discard(session, fingerprint)
+
+        if output is not None:
+            generation_duration.observe(time.perf_counter() - start, "cached")
+            fingerprint = None
+        else:
+            try:
+                output = await generate_output(texts, storage)
+            except Exception as e:
+                generation_duration.observe(time.perf_counter() - start, JobStatus.FAILED)
+                async with self._session() as session, session.begin():
+                    await session.execute(
+                        update(Job)
+                        .where(Job.id == job_id, Job.status == JobStatus.RUNNING)
+                        .values(status=JobStatus.FAILED, error=str(e), updated_at=dt.datetime.now(dt.UTC))
+                    )
+                raise
+            generation_duration.observe(time.perf_counter() - start, JobStatus.DONE)
+
+        # The cache keeps its own copy, outliving the output of this request
+        entry = None if fingerprint is None else await storage.copy(output)
+        entry_info = None if entry is None else await storage.info(entry)
+        entry_size = 0 if entry_info is None else entry_info.size
+
+        now = dt.datetime.now(dt.UTC)
+        stale: UUID | None
+        async with self._session() as session, session.begin():
+            if fingerprint is not None and entry is not None:
+                released += await generation_cache.store(session, fingerprint, entry, entry_size)
+            finished = await session.execute(
+                update(Job)
+                .where(Job.id == job_id, Job.status == JobStatus.RUNNING)
+                .values(status=JobStatus.DONE, updated_at=now)
+            )
+            # Cancelled by a newer job, or the request is gone: the output is not wanted anymore
+            if finished.rowcount == 0:
+                stale = output
+            else:
+                stale = await session.scalar(select(Request.output_image).where(Request.id == request_id))
+                project_id = await session.scalar(
+                    update(Request)
+                    .where(Request.id == request_id)
+                    .values(output_image=output, updated_at=now)
+                    .returning(Request.project_id)
+                )
+                if project_id is not None:
+                    invalidate_project(session, project_id)
+        if stale is not None:
+            released.append(stale)
+        if released:
+            await storage.delete_many(released)
@@ -0,0 +1,35 @@
+from src.service.metrics.instruments import (
+    SqlStats,
+    generation_duration,
+    http_request_duration,
+    http_request_sql_duration,
+    http_request_sql_statements,
+    record_statement,
+    registry,
+    request_sql,
+    sql_statement_duration,
+    start_statement,
+    storage_bytes,
+    storage_operation_duration,
+)
+from src.service.metrics.middleware import MetricsMiddleware
+from src.service.metrics.registry import Counter, Histogram, Registry
+
+__all__ = [
+    "Counter",
+    "Histogram",
+    "MetricsMiddleware",
+    "Registry",
+    "SqlStats",
+    "generation_duration",
+    "http_request_duration",
+    "http_request_sql_duration",
+    "http_request_sql_statements",
+    "record_statement",
+    "registry",
+    "request_sql",
+    "sql_statement_duration",
+    "start_statement",
+    "storage_bytes",
+    "storage_operation_duration",
+]
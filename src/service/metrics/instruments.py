@@ -0,0 +1,76 @@
+import time
+from contextvars import ContextVar
+from typing import Any
+
+from src.service.metrics.registry import Registry
+
+__all__ = (
+    "SqlStats",
+    "generation_duration",
+    "http_request_duration",
+    "http_request_sql_duration",
+    "http_request_sql_statements",
+    "record_statement",
+    "registry",
+    "request_sql",
+    "sql_statement_duration",
+    "start_statement",
+    "storage_bytes",
+    "storage_operation_duration",
+)
+
+registry = Registry()
+
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds", "Time until the response was sent", ("method", "route", "status")
+)
+http_request_sql_statements = registry.histogram(
+    "http_request_sql_statements",
+    "SQL statements executed per request",
+    ("method", "route"),
+    (0, 1, 2, 3, 4, 5, 8, 13, 21, 34, 55, 100),
+)
+http_request_sql_duration = registry.histogram(
+    "http_request_sql_duration_seconds", "Time spent executing SQL statements per request", ("method", "route")
+)
+sql_statement_duration = registry.histogram(
+    "sql_statement_duration_seconds",
+    "Execution time of every SQL statement, requests and background work alike",
+    buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0),
+)
+storage_operation_duration = registry.histogram(
+    "storage_operation_duration_seconds", "Duration of storage operations", ("operation",)
+)
+storage_bytes = registry.counter("storage_bytes_total", "Bytes read from and written to storage", ("operation",))
+generation_duration = registry.histogram("generation_duration_seconds", "Duration of output generations", ("status",))
+
+
+class SqlStats:
+    __slots__ = ("seconds", "statements")
+
+    def __init__(self) -> None:
+        self.statements = 0
+        self.seconds = 0.0
+
+
+# Statements of the request being handled, set by `MetricsMiddleware`
+request_sql: ContextVar[SqlStats | None] = ContextVar("request_sql", default=None)
+
+STARTED_AT = "metrics_statement_started_at"
+
+
+def start_statement(connection_info: dict[str, Any]) -> None:
+    # Statements run one at a time on a connection
+    connection_info[STARTED_AT] = time.perf_counter()
+
+
+def record_statement(connection_info: dict[str, Any]) -> None:
+    started_at = connection_info.pop(STARTED_AT, None)
+    if started_at is None:
+        return
+    elapsed = time.perf_counter() - started_at
+    sql_statement_duration.observe(elapsed)
+    stats = request_sql.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.seconds += elapsed
@@ -0,0 +1,75 @@
+import time
+from typing import TYPE_CHECKING
+
+from litestar.enums import ScopeType
+from litestar.exceptions import HTTPException
+from litestar.middleware import MiddlewareProtocol
+from litestar.status_codes import HTTP_500_INTERNAL_SERVER_ERROR
+
+from src.service.metrics.instruments import (
+    SqlStats,
+    http_request_duration,
+    http_request_sql_duration,
+    http_request_sql_statements,
+    request_sql,
+)
+
+if TYPE_CHECKING:
+    from litestar import Litestar
+    from litestar.types import ASGIApp, Message, Receive, Scope, Send
+
+__all__ = ("MetricsMiddleware",)
+
+
+class MetricsMiddleware(MiddlewareProtocol):
+    """Records the latency and SQL statements of every HTTP request, labelled by route template."""
+
+    def __init__(self, app: "ASGIApp") -> None:
+        self.app = app
+        # Route template of each handler, e.g. /project/{id:uuid}
+        self.routes: dict[str, str] = {}
+
+    def route(self, scope: "Scope") -> str:
+        handler_id = scope["route_handler"].handler_id
+        route = self.routes.get(handler_id)
+        if route is None:
+            app: Litestar = scope["app"]
+            for app_route in app.routes:
+                for handler in getattr(app_route, "route_handlers", ()):
+                    self.routes[handler.handler_id] = app_route.path
+            route = self.routes.setdefault(handler_id, scope["path"])
+        return route
+
+    async def __call__(self, scope: "Scope", receive: "Receive", send: "Send") -> None:
+        if scope["type"] != ScopeType.HTTP:
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = HTTP_500_INTERNAL_SERVER_ERROR
+        elapsed: float | None = None
+
+        async def send_wrapper(message: "Message") -> None:
+            nonlocal status, elapsed
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                elapsed = time.perf_counter() - start
+            await send(message)
+
+        stats = SqlStats()
+        token = request_sql.set(stats)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except HTTPException as exc:
+            # Turned into a response by the exception handlers around this middleware
+            status = exc.status_code
+            raise
+        finally:
+            request_sql.reset(token)
+            method, route = scope["method"], self.route(scope)
+            if elapsed is None:
+                elapsed = time.perf_counter() - start
+            http_request_duration.observe(elapsed, method, route, str(status))
+            http_request_sql_statements.observe(stats.statements, method, route)
+            http_request_sql_duration.observe(stats.seconds, method, route)
@@ -1,4 +1,15 @@
-from src.service.storage.base import StorageServer
+from src.service.storage.base import BlobInfo, BlobMetadata, StorageServer
+from src.service.storage.cached import CachedStorage
+from src.service.storage.instrumented import InstrumentedStorage
 from src.service.storage.local import LocalFileStorage
+from src.service.storage.s3 import S3Storage
 
-__all__ = ["LocalFileStorage", "StorageServer"]
+__all__ = [
+    "BlobInfo",
+    "BlobMetadata",
+    "CachedStorage",
+    "InstrumentedStorage",
+    "LocalFileStorage",
+    "S3Storage",
+    "StorageServer",
+]
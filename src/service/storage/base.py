@@ -1,12 +1,38 @@
 # ruff: noqa: A002
 import abc
+import asyncio
+import hashlib
 import uuid
 from abc import ABC
+from collections.abc import AsyncIterable, Sequence
+from dataclasses import dataclass
+from datetime import datetime
+from typing import NamedTuple
 from uuid import UUID
 
 from litestar.response import Stream
 
-__all__ = ("StorageServer",)
+from src.service.storage.sniff import sniff_content_type
+
+__all__ = ("BlobInfo", "BlobMetadata", "StorageServer")
+
+
+class BlobInfo(NamedTuple):
+    size: int
+    # Changes whenever the content stored under the id changes
+    version: str
+
+
+@dataclass(frozen=True)
+class BlobMetadata:
+    id: UUID
+    size: int
+    content_type: str
+    # Hex sha256 of the content, None when the backend would have to read the blob to know it
+    digest: str | None
+    # None when the backend does not record them
+    created_at: datetime | None = None
+    updated_at: datetime | None = None
 
 
 class StorageServer(ABC):
@@ -18,18 +44,73 @@ class StorageServer(ABC):
     async def update(self, image: bytes, id: UUID) -> None:
         return
 
+    async def create_stream(self, chunks: AsyncIterable[bytes]) -> UUID:
+        # Backends that can write incrementally override this, the fallback buffers the payload
+        return await self.create(b"".join([chunk async for chunk in chunks]))
+
+    async def update_stream(self, chunks: AsyncIterable[bytes], id: UUID) -> None:
+        await self.update(b"".join([chunk async for chunk in chunks]), id)
+
     @abc.abstractmethod
     async def delete(self, id: UUID) -> None:
         return
 
+    async def delete_many(self, ids: Sequence[UUID], batch_size: int = 64) -> None:
+        # Removes `batch_size` blobs at a time concurrently, backends with a bulk delete override this
+        for start in range(0, len(ids), batch_size):
+            await asyncio.gather(*(self.delete(id) for id in ids[start : start + batch_size]))
+
     @abc.abstractmethod
     async def read(self, id: UUID) -> bytes | None:
         return None
 
+    async def info(self, id: UUID) -> BlobInfo | None:
+        # Backends with cheap metadata lookups override this, the fallback reads the blob
+        data = await self.read(id)
+        if data is None:
+            return None
+        return BlobInfo(len(data), hashlib.sha256(data).hexdigest())
+
+    async def copy(self, id: UUID) -> UUID | None:
+        """Store the content of `id` under a new id, None when there is none."""
+        # Backends that can share or copy blobs server side override this, the fallback reads the blob
+        data = await self.read(id)
+        if data is None:
+            return None
+        return await self.create(data)
+
+    async def digest(self, id: UUID) -> str | None:
+        """Hex sha256 of the content stored under `id`, None when there is none."""
+        # Backends that already know the hash of their blobs override this, the fallback reads the blob
+        data = await self.read(id)
+        if data is None:
+            return None
+        return hashlib.sha256(data).hexdigest()
+
+    async def metadata(self, id: UUID) -> BlobMetadata | None:
+        """Size, MIME type and digest of the blob `id`, None when there is none."""
+        # Backends with a metadata catalog override this, the fallback reads the blob
+        data = await self.read(id)
+        if data is None:
+            return None
+        return BlobMetadata(id, len(data), sniff_content_type(data), hashlib.sha256(data).hexdigest())
+
+    async def list_blobs(self, after: UUID | None = None, limit: int = 100) -> list[BlobMetadata]:
+        """Metadata of at most `limit` blobs in id order, starting after the id `after`."""
+        raise NotImplementedError(f"{type(self).__name__} cannot list its blobs")
+
+    async def presigned_url(self, id: UUID) -> str | None:
+        """URL serving the blob `id` without going through this process, None when the backend has none."""
+        return None
+
     @abc.abstractmethod
     async def delete_all(self) -> None:
         return
 
+    async def aclose(self) -> None:
+        """Release the connections held by the backend, once it is no longer used."""
+        return
+
     @abc.abstractmethod
-    async def stream(self, id: UUID) -> Stream:
+    async def stream(self, id: UUID, range: str | None = None) -> Stream:
         pass
@@ -0,0 +1,264 @@
+from collections import OrderedDict
+from collections.abc import AsyncGenerator, AsyncIterable, Iterator, Sequence
+from contextlib import contextmanager
+from typing import Any
+from uuid import UUID
+
+from litestar.response import Stream
+
+from src.service.storage.base import BlobInfo, BlobMetadata, StorageServer
+from src.service.storage.sniff import SNIFF_BYTES, sniff_content_type
+from src.service.storage.streaming import body_chunks, stream_bytes
+
+__all__ = ("CachedStorage",)
+
+
+# Ids of blobs too large to cache remembered at most, their streams skip the cache
+MAX_OVERSIZED_IDS = 10_000
+
+
+class CachedStorage(StorageServer):
+    """Storage forwarding to `inner` with the content of recently used blobs kept in memory.
+
+    Blobs of at most `max_entry_bytes` are kept up to `max_bytes` in total, the least recently used
+    evicted first, and the ids of larger ones seen are remembered. Writes go through to `inner` and replace
+    the cached content, deletes drop it. A read overlapping a write or delete of the same blob is not
+    cached, it may have returned the old content. Only writes made through this instance are seen, share
+    one per process (see `create_storage`).
+    """
+
+    def __init__(self, inner: StorageServer, max_bytes: int, max_entry_bytes: int) -> None:
+        self.inner = inner
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = min(max_entry_bytes, max_bytes)
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Keyed by the text of the id, backends also accept ids given as strings
+        self._entries: OrderedDict[str, bytes] = OrderedDict()
+        self._oversized: OrderedDict[str, None] = OrderedDict()
+        # Invalidations are numbered, the last one of each blob with operations in flight is kept so a read
+        # can tell whether a write or delete overlapped it
+        self._clock = 0
+        self._active: dict[str, int] = {}
+        self._invalidated: dict[str, int] = {}
+
+    def __getattr__(self, name: str) -> Any:
+        if name == "inner":
+            raise AttributeError(name)
+        return getattr(self.inner, name)
+
+    def _get(self, id: UUID) -> bytes | None:
+        data = self._entries.get(str(id))
+        if data is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(str(id))
+        self.hits += 1
+        return data
+
+    def _put(self, id: UUID, data: bytes) -> None:
+        if len(data) > self.max_entry_bytes:
+            self._remember_oversized(id)
+            return
+        self._drop(id)
+        self._entries[str(id)] = data
+        self.size += len(data)
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted)
+            self.evictions += 1
+
+    def _remember_oversized(self, id: UUID) -> None:
+        self._oversized[str(id)] = None
+        self._oversized.move_to_end(str(id))
+        if len(self._oversized) > MAX_OVERSIZED_IDS:
+            self._oversized.popitem(last=False)
+
+    def _drop(self, id: UUID) -> None:
+        self._oversized.pop(str(id), None)
+        data = self._entries.pop(str(id), None)
+        if data is not None:
+            self.size -= len(data)
+
+    @contextmanager
+    def _tracking(self, id: UUID) -> Iterator[int]:
+        # Yields the clock when the operation started
+        key = str(id)
+        self._active[key] = self._active.get(key, 0) + 1
+        try:
+            yield self._clock
+        finally:
+            self._active[key] -= 1
+            if not self._active[key]:
+                del self._active[key]
+                self._invalidated.pop(key, None)
+
+    def _invalidate(self, id: UUID) -> int:
+        self._clock += 1
+        self._drop(id)
+        if str(id) in self._active:
+            self._invalidated[str(id)] = self._clock
+        return self._clock
+
+    def _stale(self, id: UUID, since: int) -> bool:
+        return self._invalidated.get(str(id), -1) >= since
+
+    async def _fill(self, id: UUID) -> bytes | None:
+        with self._tracking(id) as started:
+            data = await self.inner.read(id)
+            if data is not None and not self._stale(id, started):
+                self._put(id, data)
+        return data
+
+    async def _buffered(self, chunks: AsyncIterable[bytes], buffer: list[bytes]) -> AsyncGenerator[bytes, None]:
+        # Keeps a copy of the chunks passed on, until they outgrow a cache entry
+        size = 0
+        async for chunk in chunks:
+            size += len(chunk)
+            if size > self.max_entry_bytes:
+                buffer.clear()
+            else:
+                buffer.append(chunk)
+            yield chunk
+
+    async def create(self, image: bytes) -> UUID:
+        id = await self.inner.create(image)
+        self._put(id, image)
+        return id
+
+    async def update(self, image: bytes, id: UUID) -> None:
+        with self._tracking(id):
+            invalidated = self._invalidate(id)
+            await self.inner.update(image, id)
+            # Another write or delete of the blob overlapped, which one landed last is unknown
+            if self._invalidated[str(id)] != invalidated:
+                self._invalidate(id)
+            else:
+                self._put(id, image)
+
+    async def create_stream(self, chunks: AsyncIterable[bytes]) -> UUID:
+        buffer: list[bytes] = []
+        id = await self.inner.create_stream(self._buffered(chunks, buffer))
+        if buffer:
+            self._put(id, b"".join(buffer))
+        return id
+
+    async def update_stream(self, chunks: AsyncIterable[bytes], id: UUID) -> None:
+        buffer: list[bytes] = []
+        with self._tracking(id):
+            invalidated = self._invalidate(id)
+            await self.inner.update_stream(self._buffered(chunks, buffer), id)
+            if self._invalidated[str(id)] != invalidated or not buffer:
+                self._invalidate(id)
+            else:
+                self._put(id, b"".join(buffer))
+
+    async def delete(self, id: UUID) -> None:
+        self._invalidate(id)
+        try:
+            await self.inner.delete(id)
+        finally:
+            self._invalidate(id)
+
+    async def delete_many(self, ids: Sequence[UUID], batch_size: int = 64) -> None:
+        for id in ids:
+            self._invalidate(id)
+        try:
+            await self.inner.delete_many(ids, batch_size)
+        finally:
+            for id in ids:
+                self._invalidate(id)
+
+    async def read(self, id: UUID) -> bytes | None:
+        data = self._get(id)
+        if data is not None:
+            return data
+        return await self._fill(id)
+
+    async def info(self, id: UUID) -> BlobInfo | None:
+        return await self.inner.info(id)
+
+    async def copy(self, id: UUID) -> UUID | None:
+        copy = await self.inner.copy(id)
+        data = self._entries.get(str(id))
+        if copy is not None and data is not None:
+            self._put(copy, data)
+        return copy
+
+    async def digest(self, id: UUID) -> str | None:
+        return await self.inner.digest(id)
+
+    async def metadata(self, id: UUID) -> BlobMetadata | None:
+        return await self.inner.metadata(id)
+
+    async def list_blobs(self, after: UUID | None = None, limit: int = 100) -> list[BlobMetadata]:
+        return await self.inner.list_blobs(after, limit)
+
+    async def presigned_url(self, id: UUID) -> str | None:
+        return await self.inner.presigned_url(id)
+
+    async def aclose(self) -> None:
+        await self.inner.aclose()
+
+    async def delete_all(self) -> None:
+        self.clear()
+        try:
+            await self.inner.delete_all()
+        finally:
+            self.clear()
+
+    async def _caching(self, id: UUID, chunks: AsyncIterable[bytes], since: int) -> AsyncGenerator[bytes, None]:
+        # Passes the body on as it comes with a copy kept aside, cached once complete if it fits an entry
+        with self._tracking(id):
+            # Invalidations are only recorded for blobs tracked, any one since the backend call may be of this blob
+            cacheable = self._clock == since
+            buffer: list[bytes] | None = []
+            size = 0
+            async for chunk in chunks:
+                size += len(chunk)
+                if buffer is not None and size > self.max_entry_bytes:
+                    buffer = None
+                elif buffer is not None:
+                    buffer.append(chunk)
+                yield chunk
+            if not cacheable or self._stale(id, since):
+                return
+            if buffer is None:
+                self._remember_oversized(id)
+            else:
+                self._put(id, b"".join(buffer))
+
+    async def stream(self, id: UUID, range: str | None = None) -> Stream:
+        data = self._get(id)
+        if data is not None:
+            return stream_bytes(data, range, sniff_content_type(data[:SNIFF_BYTES]))
+        if range is not None or str(id) in self._oversized:
+            # Blobs too large to cache are streamed by the backend, as are ranges of blobs not cached yet
+            return await self.inner.stream(id, range)
+        since = self._clock
+        response = await self.inner.stream(id)
+        response.iterator = self._caching(id, body_chunks(response), since)
+        return response
+
+    def clear(self) -> None:
+        # Every operation in flight is stale, as after invalidating each blob
+        self._clock += 1
+        for key in self._active:
+            self._invalidated[key] = self._clock
+        self._entries.clear()
+        self._oversized.clear()
+        self.size = 0
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+        }
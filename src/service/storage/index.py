@@ -0,0 +1,220 @@
+from collections.abc import AsyncGenerator
+from contextlib import asynccontextmanager
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import NamedTuple
+from uuid import UUID
+
+import aiosqlite
+from anyio import Path as AsyncPath
+
+__all__ = ("BlobIndex", "IndexEntry", "IndexTransaction")
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blob (
+    digest TEXT PRIMARY KEY,
+    refcount INTEGER NOT NULL,
+    size INTEGER,
+    content_type TEXT
+);
+CREATE TABLE IF NOT EXISTS blob_ref (
+    id TEXT PRIMARY KEY,
+    digest TEXT NOT NULL REFERENCES blob (digest),
+    created_at TEXT,
+    updated_at TEXT
+);
+"""
+# Added to indexes created before blob metadata was recorded, NULL for the blobs written back then
+CATALOG_COLUMNS = (
+    ("blob", "size", "INTEGER"),
+    ("blob", "content_type", "TEXT"),
+    ("blob_ref", "created_at", "TEXT"),
+    ("blob_ref", "updated_at", "TEXT"),
+)
+ENTRY_QUERY = (
+    "SELECT blob_ref.id, blob.digest, size, content_type, created_at, updated_at "
+    "FROM blob_ref JOIN blob ON blob.digest = blob_ref.digest"
+)
+
+
+class IndexEntry(NamedTuple):
+    id: UUID
+    digest: str
+    size: int | None
+    content_type: str | None
+    created_at: datetime | None
+    updated_at: datetime | None
+
+    @classmethod
+    def from_row(cls, row: aiosqlite.Row) -> "IndexEntry":
+        id, digest, size, content_type, created_at, updated_at = row
+        return cls(
+            UUID(id),
+            digest,
+            size,
+            content_type,
+            datetime.fromisoformat(created_at) if created_at else None,
+            datetime.fromisoformat(updated_at) if updated_at else None,
+        )
+
+
+class IndexTransaction:
+    def __init__(self, conn: aiosqlite.Connection) -> None:
+        self.conn = conn
+
+    async def digest(self, id: UUID) -> str | None:
+        async with self.conn.execute("SELECT digest FROM blob_ref WHERE id = ?", (str(id),)) as cursor:
+            row = await cursor.fetchone()
+        return row[0] if row else None
+
+    async def entry(self, id: UUID) -> IndexEntry | None:
+        async with self.conn.execute(f"{ENTRY_QUERY} WHERE blob_ref.id = ?", (str(id),)) as cursor:
+            row = await cursor.fetchone()
+        return IndexEntry.from_row(row) if row else None
+
+    async def entries(self, after: UUID | None, limit: int) -> list[IndexEntry]:
+        async with self.conn.execute(
+            f"{ENTRY_QUERY} WHERE blob_ref.id > ? ORDER BY blob_ref.id LIMIT ?", (str(after or ""), limit)
+        ) as cursor:
+            return [IndexEntry.from_row(row) for row in await cursor.fetchall()]
+
+    async def link(
+        self, id: UUID, digest: str, size: int | None = None, content_type: str | None = None
+    ) -> tuple[bool, str | None]:
+        """Point `id` at `digest`, of `size` bytes of `content_type` when the digest is new to the index.
+
+        Returns whether `digest` was not referenced before (its bytes must be written) and the digest
+        previously referenced by `id` if that blob has no references left (its bytes can be removed).
+        """
+        now = datetime.now(UTC).isoformat()
+        previous = await self.digest(id)
+        if previous == digest:
+            await self.conn.execute("UPDATE blob_ref SET updated_at = ? WHERE id = ?", (now, str(id)))
+            return False, None
+        orphan = await self._release(previous) if previous else None
+        await self.conn.execute(
+            "INSERT INTO blob (digest, refcount, size, content_type) VALUES (?, 1, ?, ?) "
+            "ON CONFLICT (digest) DO UPDATE SET refcount = refcount + 1, "
+            "size = coalesce(size, excluded.size), content_type = coalesce(content_type, excluded.content_type)",
+            (digest, size, content_type),
+        )
+        await self.conn.execute(
+            "INSERT INTO blob_ref (id, digest, created_at, updated_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (id) DO UPDATE SET digest = excluded.digest, updated_at = excluded.updated_at",
+            (str(id), digest, now, now),
+        )
+        async with self.conn.execute("SELECT refcount FROM blob WHERE digest = ?", (digest,)) as cursor:
+            row = await cursor.fetchone()
+        return bool(row and row[0] == 1), orphan
+
+    async def unlink(self, id: UUID) -> str | None:
+        """Drop `id` and return its digest if that blob has no references left."""
+        digest = await self.digest(id)
+        if digest is None:
+            return None
+        await self.conn.execute("DELETE FROM blob_ref WHERE id = ?", (str(id),))
+        return await self._release(digest)
+
+    async def _release(self, digest: str) -> str | None:
+        await self.conn.execute("UPDATE blob SET refcount = refcount - 1 WHERE digest = ?", (digest,))
+        async with self.conn.execute("DELETE FROM blob WHERE digest = ? AND refcount <= 0", (digest,)) as cursor:
+            return digest if cursor.rowcount else None
+
+
+class BlobIndex:
+    """SQLite backed mapping of blob ids to content digests with per-digest reference counts.
+
+    Also the catalog of the blobs: size and MIME type of each digest, creation and last write time of each id,
+    updated in the same transaction as the references.
+
+    Lookups share one connection, opened on first use and kept until `close`. Each write transaction has
+    its own, a connection holds one transaction at a time.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._conn: aiosqlite.Connection | None = None
+        # Inode of the file `_conn` has open, the file is replaced when the storage is cleared
+        self._inode: int | None = None
+
+    def _current_inode(self) -> int | None:
+        try:
+            return self.path.stat().st_ino
+        except FileNotFoundError:
+            return None
+
+    async def _connection(self, create: bool) -> aiosqlite.Connection | None:
+        # None when nothing was indexed yet and `create` is False
+        inode = self._current_inode()
+        if self._conn is not None and inode == self._inode:
+            return self._conn
+        if inode is None and not create:
+            return None
+        await AsyncPath(self.path.parent).mkdir(parents=True, exist_ok=True)
+        conn = await aiosqlite.connect(self.path, isolation_level=None)
+        try:
+            # Once per file: the open connection keeps its inode from being reused
+            await self._prepare(conn)
+        except BaseException:
+            await conn.close()
+            raise
+        inode = self._current_inode()
+        if self._conn is not None and inode == self._inode:
+            # Opened concurrently by another lookup
+            await conn.close()
+            return self._conn
+        stale, self._conn, self._inode = self._conn, conn, inode
+        if stale is not None:
+            await stale.close()
+        return conn
+
+    async def close(self) -> None:
+        conn, self._conn, self._inode = self._conn, None, None
+        if conn is not None:
+            await conn.close()
+
+    async def _prepare(self, conn: aiosqlite.Connection) -> None:
+        await conn.executescript(SCHEMA)
+        for table, column, type in CATALOG_COLUMNS:
+            async with conn.execute(f"SELECT name FROM pragma_table_info('{table}')") as cursor:  # noqa: S608
+                if column in {row[0] for row in await cursor.fetchall()}:
+                    continue
+            try:
+                await conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {type}")
+            except aiosqlite.OperationalError as e:
+                # Added by another connection in the meantime
+                if "duplicate column" not in str(e):
+                    raise
+
+    @asynccontextmanager
+    async def begin(self) -> AsyncGenerator[IndexTransaction, None]:
+        # Creates the index and brings its schema up to date
+        await self._connection(create=True)
+        async with aiosqlite.connect(self.path, isolation_level=None) as conn:
+            # Take the write lock up front so concurrent writers (including other processes) serialise
+            await conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield IndexTransaction(conn)
+            except BaseException:
+                await conn.rollback()
+                raise
+            await conn.commit()
+
+    @asynccontextmanager
+    async def read(self) -> AsyncGenerator[IndexTransaction | None, None]:
+        # None when nothing was indexed yet
+        conn = await self._connection(create=False)
+        yield IndexTransaction(conn) if conn is not None else None
+
+    async def digest(self, id: UUID) -> str | None:
+        async with self.read() as index:
+            return await index.digest(id) if index else None
+
+    async def entry(self, id: UUID) -> IndexEntry | None:
+        async with self.read() as index:
+            return await index.entry(id) if index else None
+
+    async def entries(self, after: UUID | None = None, limit: int = 100) -> list[IndexEntry]:
+        async with self.read() as index:
+            return await index.entries(after, limit) if index else []
@@ -0,0 +1,123 @@
+import functools
+import time
+from collections.abc import AsyncGenerator, AsyncIterable, Callable, Coroutine, Sequence
+from typing import Any, ParamSpec, TypeVar
+from uuid import UUID
+
+from litestar.response import Stream
+
+from src.service.metrics import storage_bytes, storage_operation_duration
+from src.service.storage.base import BlobInfo, BlobMetadata, StorageServer
+from src.service.storage.streaming import body_chunks
+
+__all__ = ("InstrumentedStorage", "timed")
+
+P = ParamSpec("P")
+R = TypeVar("R")
+
+
+def timed(operation: str) -> Callable[[Callable[P, Coroutine[Any, Any, R]]], Callable[P, Coroutine[Any, Any, R]]]:
+    """Record the duration of every call of the decorated coroutine as a storage `operation`."""
+
+    def decorate(method: Callable[P, Coroutine[Any, Any, R]]) -> Callable[P, Coroutine[Any, Any, R]]:
+        @functools.wraps(method)
+        async def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+            start = time.perf_counter()
+            try:
+                return await method(*args, **kwargs)
+            finally:
+                storage_operation_duration.observe(time.perf_counter() - start, operation)
+
+        return wrapper
+
+    return decorate
+
+
+async def _counted(chunks: AsyncIterable[bytes], operation: str) -> AsyncGenerator[bytes, None]:
+    async for chunk in chunks:
+        storage_bytes.inc(operation, amount=len(chunk))
+        yield chunk
+
+
+class InstrumentedStorage(StorageServer):
+    """Storage forwarding to `inner` while recording operation counts, durations and bytes transferred."""
+
+    def __init__(self, inner: StorageServer) -> None:
+        self.inner = inner
+
+    def __getattr__(self, name: str) -> Any:
+        # Backend specific attributes, e.g. the root of a LocalFileStorage
+        if name == "inner":
+            raise AttributeError(name)
+        return getattr(self.inner, name)
+
+    @timed("create")
+    async def create(self, image: bytes) -> UUID:
+        storage_bytes.inc("create", amount=len(image))
+        return await self.inner.create(image)
+
+    @timed("update")
+    async def update(self, image: bytes, id: UUID) -> None:
+        storage_bytes.inc("update", amount=len(image))
+        await self.inner.update(image, id)
+
+    @timed("create")
+    async def create_stream(self, chunks: AsyncIterable[bytes]) -> UUID:
+        return await self.inner.create_stream(_counted(chunks, "create"))
+
+    @timed("update")
+    async def update_stream(self, chunks: AsyncIterable[bytes], id: UUID) -> None:
+        await self.inner.update_stream(_counted(chunks, "update"), id)
+
+    @timed("delete")
+    async def delete(self, id: UUID) -> None:
+        await self.inner.delete(id)
+
+    @timed("delete_many")
+    async def delete_many(self, ids: Sequence[UUID], batch_size: int = 64) -> None:
+        await self.inner.delete_many(ids, batch_size)
+
+    @timed("read")
+    async def read(self, id: UUID) -> bytes | None:
+        data = await self.inner.read(id)
+        if data is not None:
+            storage_bytes.inc("read", amount=len(data))
+        return data
+
+    @timed("info")
+    async def info(self, id: UUID) -> BlobInfo | None:
+        return await self.inner.info(id)
+
+    @timed("copy")
+    async def copy(self, id: UUID) -> UUID | None:
+        return await self.inner.copy(id)
+
+    @timed("digest")
+    async def digest(self, id: UUID) -> str | None:
+        return await self.inner.digest(id)
+
+    @timed("metadata")
+    async def metadata(self, id: UUID) -> BlobMetadata | None:
+        return await self.inner.metadata(id)
+
+    @timed("list")
+    async def list_blobs(self, after: UUID | None = None, limit: int = 100) -> list[BlobMetadata]:
+        return await self.inner.list_blobs(after, limit)
+
+    @timed("presign")
+    async def presigned_url(self, id: UUID) -> str | None:
+        return await self.inner.presigned_url(id)
+
+    async def aclose(self) -> None:
+        await self.inner.aclose()
+
+    @timed("delete_all")
+    async def delete_all(self) -> None:
+        await self.inner.delete_all()
+
+    @timed("stream")
+    async def stream(self, id: UUID, range: str | None = None) -> Stream:
+        # Only opening the stream is timed, the body is sent after this returns and counted as it goes
+        response = await self.inner.stream(id, range)
+        response.iterator = _counted(body_chunks(response), "stream")
+        return response
@@ -1,54 +1,294 @@
 # ruff: noqa: A002
-from collections.abc import AsyncGenerator
+import asyncio
+import hashlib
+import os
+import shutil
+import unicodedata
+from collections.abc import AsyncIterable, Sequence
+from datetime import UTC, datetime
 from pathlib import Path
+from tempfile import mkstemp
 from uuid import UUID, uuid4
 
+import anyio
+from litestar.concurrency import sync_to_thread
 from litestar.exceptions import HTTPException
 from litestar.response import Stream
-from litestar.stores.file import FileStore
 
-from src.service.storage.base import StorageServer
+from src.service.storage.base import BlobInfo, BlobMetadata, StorageServer
+from src.service.storage.index import BlobIndex, IndexEntry
+from src.service.storage.sniff import SNIFF_BYTES, sniff_content_type
+from src.service.storage.streaming import CHUNK_SIZE, stream_file
 
-__all__ = ("LocalFileStorage",)
+__all__ = ("LAYOUTS", "LocalFileStorage", "blob_path")
 
 
+LAYOUTS = ("flat", "sharded")
+
 ParentPath = Path(__file__).parents[3]
 FilePath = ParentPath / "storage"
-Metadata = FilePath / "metadata.json"
+
+
+def safe_file_name(name: str) -> str:
+    # Same naming scheme as litestar's FileStore, which earlier versions of this storage were built on
+    name = unicodedata.normalize("NFKD", name)
+    return "".join(c if c.isalnum() else str(ord(c)) for c in name)
+
+
+def blob_path(root: Path, name: str, layout: str) -> Path:
+    if layout == "sharded":
+        # Names are sha256 digests or random uuids, so their leading hex digits spread blobs evenly
+        # over 256 * 256 directories
+        return root / name[:2] / name[2:4] / name
+    return root / name
 
 
 class LocalFileStorage(StorageServer):
-    def __init__(self, path: str | Path = FilePath) -> None:
+    """Blob storage on the local filesystem, one raw file per blob.
+
+    With `content_addressed` set, blobs are keyed by the sha256 digest of their content so identical
+    payloads are stored once. Ids are mapped to digests in a reference counted index, and the bytes of
+    a digest are only removed once no id refers to them anymore. The index also records the size, MIME
+    type and write times of the blobs, so their metadata and listing are answered without the files.
+
+    The `sharded` layout fans blobs out over two levels of directories named after the leading hex digits
+    of their file name, keeping directories small for large stores. Existing flat stores are converted
+    offline with `python -m src.service.storage.migrate --layout sharded`.
+    """
+
+    def __init__(self, path: str | Path = FilePath, content_addressed: bool = False, layout: str = "flat") -> None:
+        if layout not in LAYOUTS:
+            raise ValueError(f"Unknown storage layout {layout!r}, expected one of {LAYOUTS}")
         self.path = path
-        self.store = FileStore(FilePath / path)
+        self.root = FilePath / path
+        self.content_addressed = content_addressed
+        self.layout = layout
+        self.index = BlobIndex(self.root / "index.sqlite")
+
+    def _path(self, key: str) -> Path:
+        return blob_path(self.root, safe_file_name(key), self.layout)
+
+    async def _make_parent(self, path: Path) -> None:
+        if self.layout == "sharded":
+            await anyio.Path(path.parent).mkdir(parents=True, exist_ok=True)
+
+    def _write_sync(self, key: str, data: bytes) -> None:
+        target = self._path(key)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = mkstemp(dir=target.parent, prefix=f"{target.name}.tmp")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(data)
+            Path(tmp_name).replace(target)
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+
+    async def _write(self, key: str, data: bytes) -> None:
+        await sync_to_thread(self._write_sync, key, data)
+
+    async def _exists(self, key: str) -> bool:
+        return await anyio.Path(self._path(key)).exists()
+
+    async def _remove(self, key: str) -> None:
+        await anyio.Path(self._path(key)).unlink(missing_ok=True)
+
+    async def _entry(self, id: UUID) -> IndexEntry | None:
+        return await self.index.entry(id) if self.content_addressed else None
+
+    async def _key(self, id: UUID) -> str:
+        # Ids written before content addressing was enabled are not indexed and still live under their own name
+        if self.content_addressed:
+            return await self.index.digest(id) or str(id)
+        return str(id)
+
+    async def _put(self, id: UUID, image: bytes) -> None:
+        if not self.content_addressed:
+            await self._write(str(id), image)
+            return
+        digest = hashlib.sha256(image).hexdigest()
+        # Write before taking the index lock so concurrent writers only serialise on the index update.
+        # A concurrent delete may still remove the file in between, hence the check under the lock.
+        if not await self._exists(digest):
+            await self._write(digest, image)
+        async with self.index.begin() as index:
+            created, orphan = await index.link(id, digest, len(image), sniff_content_type(image[:SNIFF_BYTES]))
+            # Bytes of a digest already referenced are only removed with its last reference
+            if created and not await self._exists(digest):
+                await self._write(digest, image)
+            if orphan is not None:
+                await self._remove(orphan)
+
+    async def _spool(self, chunks: AsyncIterable[bytes]) -> tuple[anyio.Path, str, int, bytes]:
+        # Copy the payload to a temporary file next to the blobs, hashing it on the way.
+        # Returns the file with the digest, size and leading bytes of the payload
+        await anyio.Path(self.root).mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = mkstemp(dir=self.root, prefix="upload.tmp")
+        tmp = anyio.Path(tmp_name)
+        digest = hashlib.sha256()
+        size = 0
+        head = b""
+        try:
+            async with await anyio.open_file(fd, "wb") as file:
+                async for chunk in chunks:
+                    if len(head) < SNIFF_BYTES:
+                        head += chunk[: SNIFF_BYTES - len(head)]
+                    size += len(chunk)
+                    digest.update(chunk)
+                    await file.write(chunk)
+        except BaseException:
+            await tmp.unlink(missing_ok=True)
+            raise
+        return tmp, digest.hexdigest(), size, head
+
+    async def _put_stream(self, id: UUID, chunks: AsyncIterable[bytes]) -> None:
+        tmp, digest, size, head = await self._spool(chunks)
+        try:
+            if not self.content_addressed:
+                await self._make_parent(self._path(str(id)))
+                await tmp.replace(self._path(str(id)))
+                return
+            async with self.index.begin() as index:
+                created, orphan = await index.link(id, digest, size, sniff_content_type(head))
+                if created and not await self._exists(digest):
+                    await self._make_parent(self._path(digest))
+                    await tmp.replace(self._path(digest))
+                if orphan is not None:
+                    await self._remove(orphan)
+        finally:
+            await tmp.unlink(missing_ok=True)
 
     async def create(self, image: bytes) -> UUID:
         image_id = uuid4()
-        await self.store.set(str(image_id), image)
+        await self._put(image_id, image)
         return image_id
 
     async def update(self, image: bytes, id: UUID) -> None:
-        await self.store.set(str(id), image)
+        await self._put(id, image)
+        if self.content_addressed:
+            await self._remove(str(id))
         return
 
+    async def create_stream(self, chunks: AsyncIterable[bytes]) -> UUID:
+        image_id = uuid4()
+        await self._put_stream(image_id, chunks)
+        return image_id
+
+    async def update_stream(self, chunks: AsyncIterable[bytes], id: UUID) -> None:
+        await self._put_stream(id, chunks)
+        if self.content_addressed:
+            await self._remove(str(id))
+
     async def delete(self, id: UUID) -> None:
-        if await self.store.exists(str(id)):
-            await self.store.delete(str(id))
+        if not self.content_addressed:
+            await self._remove(str(id))
+            return
+        async with self.index.begin() as index:
+            orphan = await index.unlink(id)
+            await self._remove(orphan if orphan is not None else str(id))
+
+    async def delete_many(self, ids: Sequence[UUID], batch_size: int = 64) -> None:
+        if not self.content_addressed:
+            await super().delete_many(ids, batch_size)
+            return
+        # One index transaction per batch instead of one per id
+        for start in range(0, len(ids), batch_size):
+            async with self.index.begin() as index:
+                keys = [await index.unlink(id) or str(id) for id in ids[start : start + batch_size]]
+                await asyncio.gather(*(self._remove(key) for key in keys))
 
     async def read(self, id: UUID) -> bytes | None:
-        if await self.store.exists(str(id)):
-            return await self.store.get(str(id))
-        return None
+        try:
+            return await anyio.Path(self._path(await self._key(id))).read_bytes()
+        except FileNotFoundError:
+            return None
 
-    async def delete_all(self) -> None:
-        await self.store.delete_all()
+    async def info(self, id: UUID) -> BlobInfo | None:
+        entry = await self._entry(id)
+        if entry is not None and entry.size is not None:
+            return BlobInfo(entry.size, entry.digest)
+        key = entry.digest if entry is not None else str(id)
+        try:
+            stat = await anyio.Path(self._path(key)).stat()
+        except FileNotFoundError:
+            return None
+        # Digests already identify the content, legacy blobs are rewritten in place
+        return BlobInfo(stat.st_size, key if entry is not None else f"{key}:{stat.st_mtime_ns}")
+
+    async def _describe(self, id: UUID, entry: IndexEntry | None) -> BlobMetadata | None:
+        if entry is not None and entry.size is not None and entry.content_type is not None:
+            return BlobMetadata(id, entry.size, entry.content_type, entry.digest, entry.created_at, entry.updated_at)
+        # Blobs written before the index recorded metadata, or without an index at all
+        path = anyio.Path(self._path(entry.digest if entry is not None else str(id)))
+        try:
+            stat = await path.stat()
+            async with await anyio.open_file(path, "rb") as file:
+                head = await file.read(SNIFF_BYTES)
+        except FileNotFoundError:
+            return None
+        modified = datetime.fromtimestamp(stat.st_mtime, UTC)
+        if entry is None:
+            return BlobMetadata(id, stat.st_size, sniff_content_type(head), None, None, modified)
+        return BlobMetadata(
+            id, stat.st_size, sniff_content_type(head), entry.digest, entry.created_at, entry.updated_at or modified
+        )
+
+    async def metadata(self, id: UUID) -> BlobMetadata | None:
+        return await self._describe(id, await self._entry(id))
+
+    async def list_blobs(self, after: UUID | None = None, limit: int = 100) -> list[BlobMetadata]:
+        if not self.content_addressed:
+            return await super().list_blobs(after, limit)
+        # Ids written before content addressing was enabled are not indexed and not listed
+        listed = [await self._describe(entry.id, entry) for entry in await self.index.entries(after, limit)]
+        return [metadata for metadata in listed if metadata is not None]
 
-    async def stream(self, id: UUID) -> Stream:
-        if await self.store.exists(str(id)):
+    async def copy(self, id: UUID) -> UUID | None:
+        if not self.content_addressed:
+            return await super().copy(id)
+        # The copy is one more reference to the same digest, no bytes are written
+        copy_id = uuid4()
+        async with self.index.begin() as index:
+            digest = await index.digest(id)
+            if digest is not None:
+                await index.link(copy_id, digest)
+                return copy_id
+        # Unindexed blobs are copied into the index
+        return await super().copy(id)
 
-            async def stream_image() -> AsyncGenerator[bytes, None]:
-                data = await self.read(id)
-                yield data  # type: ignore[misc]
+    async def digest(self, id: UUID) -> str | None:
+        # Content addressed blobs are named after their digest, legacy and plain blobs are hashed
+        key = await self._key(id)
+        if self.content_addressed and key != str(id):
+            # Indexed digests keep their bytes until their last reference is dropped
+            return key
+        digest = hashlib.sha256()
+        try:
+            async with await anyio.open_file(self._path(key), "rb") as file:
+                while chunk := await file.read(CHUNK_SIZE):
+                    digest.update(chunk)
+        except FileNotFoundError:
+            return None
+        return digest.hexdigest()
+
+    async def aclose(self) -> None:
+        await self.index.close()
+
+    async def delete_all(self) -> None:
+        await self.index.close()
+        await sync_to_thread(shutil.rmtree, self.root, ignore_errors=True)
+        await anyio.Path(self.root).mkdir(parents=True, exist_ok=True)
 
-            return Stream(stream_image, headers={"Content-Type": "image/*"})
-        raise HTTPException(detail="file does not exist", status_code=404)
+    async def stream(self, id: UUID, range: str | None = None) -> Stream:
+        entry = await self._entry(id)
+        path = self._path(entry.digest if entry is not None else str(id))
+        if entry is not None and entry.size is not None and entry.content_type is not None:
+            return stream_file(path, entry.size, range, entry.content_type)
+        # Unindexed blob, or indexed before its size and type were recorded
+        try:
+            async with await anyio.open_file(path, "rb") as file:
+                size = os.fstat(file.wrapped.fileno()).st_size
+                head = await file.read(SNIFF_BYTES)
+        except FileNotFoundError as e:
+            raise HTTPException(detail="file does not exist", status_code=404) from e
+        return stream_file(path, size, range, sniff_content_type(head))
@@ -0,0 +1,141 @@
+import argparse
+import sqlite3
+import sys
+from collections.abc import Iterator
+from pathlib import Path
+
+from litestar.stores.base import StorageObject
+
+from src.service.storage.local import LAYOUTS, FilePath, blob_path
+
+__all__ = (
+    "LEGACY_PREFIX",
+    "UNWRAPPED_MARKER",
+    "iter_blobs",
+    "migrate_layout",
+    "unwrap_legacy_blobs",
+    "unwrap_once",
+    "verify_layout",
+)
+
+
+# msgpack header of the `StorageObject` wrapper litestar's FileStore put around every payload
+LEGACY_PREFIX = b"\x82\xaaexpires_at"
+# Left in a store once it holds no legacy blob, later writes are raw files
+UNWRAPPED_MARKER = ".unwrapped"
+
+
+def unwrap_legacy_blobs(root: Path) -> int:
+    """Rewrite FileStore wrapped blobs under `root` as raw files. Returns the number of converted blobs."""
+    converted = 0
+    for path in root.rglob("*"):
+        if not path.is_file() or path.name.startswith("index"):
+            continue
+        with path.open("rb") as file:
+            if file.read(len(LEGACY_PREFIX)) != LEGACY_PREFIX:
+                continue
+        data = StorageObject.from_bytes(path.read_bytes()).data
+        tmp = path.with_name(f"{path.name}.tmp")
+        tmp.write_bytes(data)
+        tmp.replace(path)
+        converted += 1
+    return converted
+
+
+def unwrap_once(root: Path) -> int:
+    """`unwrap_legacy_blobs` for a store not unwrapped before, as recorded by a marker file in `root`."""
+    marker = root / UNWRAPPED_MARKER
+    if not root.is_dir() or marker.exists():
+        return 0
+    converted = unwrap_legacy_blobs(root)
+    marker.touch()
+    return converted
+
+
+def iter_blobs(root: Path) -> Iterator[Path]:
+    """Blob files stored under `root` in either layout.
+
+    Blob names are alphanumeric, which leaves out the index, temporary files and anything else kept
+    next to the blobs. Files below other directories are not blobs.
+    """
+    if not root.is_dir():
+        return
+    for entry in root.iterdir():
+        if entry.is_file() and entry.name.isalnum():
+            yield entry
+        elif entry.is_dir() and len(entry.name) == 2:
+            for shard in entry.iterdir():
+                if not shard.is_dir() or len(shard.name) != 2:
+                    continue
+                for path in shard.iterdir():
+                    if path.is_file() and path.name.isalnum() and path.name[:2] == entry.name:
+                        yield path
+
+
+def migrate_layout(root: Path, layout: str) -> int:
+    """Move every blob under `root` to its place in `layout`. Returns the number of moved blobs.
+
+    Moves are renames within the same filesystem, so an interrupted run can simply be started again.
+    """
+    moved = 0
+    for path in list(iter_blobs(root)):
+        target = blob_path(root, path.name, layout)
+        if target == path:
+            continue
+        target.parent.mkdir(parents=True, exist_ok=True)
+        path.replace(target)
+        moved += 1
+    if layout == "flat":
+        # Drop the emptied shard directories
+        for shard in sorted(root.glob("??/??"), reverse=True):
+            if shard.is_dir() and not any(shard.iterdir()):
+                shard.rmdir()
+        for shard in root.glob("??"):
+            if shard.is_dir() and not any(shard.iterdir()):
+                shard.rmdir()
+    return moved
+
+
+def verify_layout(root: Path, layout: str) -> list[str]:
+    """Check that every blob under `root` sits where `layout` expects it and that every digest in the
+    content addressed index has its blob. Returns the problems found.
+    """
+    problems = [
+        f"{path.relative_to(root)} is not in the {layout} layout"
+        for path in iter_blobs(root)
+        if blob_path(root, path.name, layout) != path
+    ]
+    index = root / "index.sqlite"
+    if index.exists():
+        with sqlite3.connect(index) as conn:
+            digests = [row[0] for row in conn.execute("SELECT digest FROM blob")]
+        problems += [
+            f"indexed blob {digest} is missing" for digest in digests if not blob_path(root, digest, layout).is_file()
+        ]
+    return problems
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Upgrade a local blob store in place.")
+    parser.add_argument("root", nargs="?", type=Path, default=FilePath, help="storage directory")
+    parser.add_argument("--layout", choices=LAYOUTS, help="move blobs to this directory layout")
+    parser.add_argument("--verify", choices=LAYOUTS, help="only check the store against this layout")
+    args = parser.parse_args(argv)
+    if args.verify is None:
+        converted = unwrap_legacy_blobs(args.root)
+        sys.stdout.write(f"unwrapped {converted} legacy blobs under {args.root}\n")
+        if args.layout is None:
+            return
+        moved = migrate_layout(args.root, args.layout)
+        sys.stdout.write(f"moved {moved} blobs to the {args.layout} layout\n")
+    layout = args.verify or args.layout
+    problems = verify_layout(args.root, layout)
+    for problem in problems:
+        sys.stdout.write(f"{problem}\n")
+    sys.stdout.write(f"verified {args.root} against the {layout} layout: {len(problems)} problems\n")
+    if problems:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
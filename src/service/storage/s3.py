@@ -0,0 +1,455 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import urllib.parse
+import xml.etree.ElementTree as ET
+from collections.abc import AsyncGenerator, AsyncIterable, Iterable, Mapping, Sequence
+from datetime import UTC, datetime
+from email.utils import parsedate_to_datetime
+from uuid import UUID, uuid4
+from xml.sax.saxutils import escape
+
+import httpx
+from litestar.exceptions import HTTPException
+from litestar.response import Stream
+from litestar.status_codes import HTTP_404_NOT_FOUND, HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE
+
+from src.service.storage.base import BlobInfo, BlobMetadata, StorageServer
+from src.service.storage.sniff import DEFAULT_CONTENT_TYPE, SNIFF_BYTES, sniff_content_type
+from src.service.storage.streaming import CHUNK_SIZE
+
+__all__ = ("S3Error", "S3Storage", "SigV4Signer")
+
+
+ALGORITHM = "AWS4-HMAC-SHA256"
+UNSIGNED_PAYLOAD = "UNSIGNED-PAYLOAD"
+# Object metadata holding the sha256 of the content, see `S3Storage.digest`
+DIGEST_HEADER = "x-amz-meta-sha256"
+# Largest number of keys S3 accepts in one DeleteObjects request
+MAX_DELETE_KEYS = 1000
+
+
+def _quote(value: str, safe: str = "-_.~") -> str:
+    return urllib.parse.quote(value, safe=safe)
+
+
+def _canonical_query(params: Iterable[tuple[str, str]]) -> str:
+    return "&".join(f"{_quote(key)}={_quote(value)}" for key, value in sorted(params))
+
+
+def _parse(content: bytes) -> ET.Element:
+    # Only responses of the configured object store are parsed
+    return ET.fromstring(content)  # noqa: S314
+
+
+def _signed(header: str) -> bool:
+    # Headers httpx adds on its own (user-agent, accept-encoding, ...) are left out
+    return header.startswith("x-amz-") or header in ("host", "range", "content-md5", "content-type")
+
+
+class S3Error(Exception):
+    """Unexpected response of the object store."""
+
+    def __init__(self, response: httpx.Response) -> None:
+        super().__init__(
+            f"{response.request.method} {response.request.url.path}: {response.status_code} {response.text}"
+        )
+        self.status_code = response.status_code
+
+
+class SigV4Signer:
+    """AWS Signature Version 4 for S3, as headers or as presigned URL query parameters.
+
+    See https://docs.aws.amazon.com/AmazonS3/latest/API/sig-v4-authenticating-requests.html
+    """
+
+    def __init__(self, access_key: str, secret_key: str, region: str, service: str = "s3") -> None:
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self.service = service
+
+    def scope(self, amz_date: str) -> str:
+        return f"{amz_date[:8]}/{self.region}/{self.service}/aws4_request"
+
+    @staticmethod
+    def canonical_request(
+        method: str, path: str, query: Iterable[tuple[str, str]], headers: Mapping[str, str], payload_hash: str
+    ) -> tuple[str, str]:
+        """The canonical request and its signed header list, `headers` are lowercase names to values."""
+        names = sorted(headers)
+        signed_headers = ";".join(names)
+        canonical = "\n".join(
+            [
+                method,
+                _quote(path, safe="/-_.~"),
+                _canonical_query(query),
+                *(f"{name}:{' '.join(headers[name].split())}" for name in names),
+                "",
+                signed_headers,
+                payload_hash,
+            ]
+        )
+        return canonical, signed_headers
+
+    def signature(self, amz_date: str, canonical_request: str) -> str:
+        string_to_sign = "\n".join(
+            [ALGORITHM, amz_date, self.scope(amz_date), hashlib.sha256(canonical_request.encode()).hexdigest()]
+        )
+        key = f"AWS4{self.secret_key}".encode()
+        for part in (amz_date[:8], self.region, self.service, "aws4_request"):
+            key = hmac.digest(key, part.encode(), "sha256")
+        return hmac.new(key, string_to_sign.encode(), "sha256").hexdigest()
+
+    def sign(self, request: httpx.Request, payload_hash: str, now: datetime | None = None) -> None:
+        """Add the `Authorization` header, along with the date and payload hash it covers."""
+        amz_date = (now or datetime.now(UTC)).strftime("%Y%m%dT%H%M%SZ")
+        request.headers["x-amz-date"] = amz_date
+        request.headers["x-amz-content-sha256"] = payload_hash
+        headers = {name.lower(): value for name, value in request.headers.items() if _signed(name.lower())}
+        headers["host"] = request.url.netloc.decode()
+        canonical, signed_headers = self.canonical_request(
+            request.method, request.url.path, request.url.params.multi_items(), headers, payload_hash
+        )
+        request.headers["Authorization"] = (
+            f"{ALGORITHM} Credential={self.access_key}/{self.scope(amz_date)}, "
+            f"SignedHeaders={signed_headers}, Signature={self.signature(amz_date, canonical)}"
+        )
+
+    def presign(self, method: str, url: httpx.URL, expires: int, now: datetime | None = None) -> str:
+        """`url` with query parameters granting `method` on it to anyone for `expires` seconds."""
+        amz_date = (now or datetime.now(UTC)).strftime("%Y%m%dT%H%M%SZ")
+        query = [
+            *url.params.multi_items(),
+            ("X-Amz-Algorithm", ALGORITHM),
+            ("X-Amz-Credential", f"{self.access_key}/{self.scope(amz_date)}"),
+            ("X-Amz-Date", amz_date),
+            ("X-Amz-Expires", str(expires)),
+            ("X-Amz-SignedHeaders", "host"),
+        ]
+        canonical, _ = self.canonical_request(method, url.path, query, {"host": url.netloc.decode()}, UNSIGNED_PAYLOAD)
+        signed_query = f"{_canonical_query(query)}&X-Amz-Signature={self.signature(amz_date, canonical)}"
+        return str(url.copy_with(query=signed_query.encode()))
+
+
+class S3Storage(StorageServer):
+    """Blob storage in an S3 compatible object store, one object per blob named `prefix` + id.
+
+    Requests are signed with `SigV4Signer` and share the connection pool of one HTTP client, so an
+    instance is meant to be shared by the whole process and closed with `aclose` on shutdown. Payloads
+    larger than `multipart_threshold` are uploaded as a multipart upload of `part_size` parts, at most
+    `part_concurrency` of them at a time. Objects keep the sha256 of their content in their metadata so
+    `digest` does not download them, and their sniffed MIME type as Content-Type. Copies are made server side.
+    """
+
+    def __init__(
+        self,
+        endpoint: str,
+        bucket: str,
+        access_key: str,
+        secret_key: str,
+        region: str = "us-east-1",
+        prefix: str = "",
+        max_connections: int = 32,
+        multipart_threshold: int = 8 * 1024 * 1024,
+        part_size: int = 8 * 1024 * 1024,
+        part_concurrency: int = 4,
+        presign_expires: int = 900,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ) -> None:
+        if part_size > multipart_threshold:
+            raise ValueError("part_size cannot be larger than multipart_threshold")
+        self.bucket = bucket
+        self.prefix = prefix
+        self.multipart_threshold = multipart_threshold
+        self.part_size = part_size
+        self.part_concurrency = part_concurrency
+        self.presign_expires = presign_expires
+        self.signer = SigV4Signer(access_key, secret_key, region)
+        self.client = httpx.AsyncClient(
+            base_url=endpoint.rstrip("/"),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            transport=transport,
+        )
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+    def _key(self, id: UUID) -> str:
+        return f"{self.prefix}{id}"
+
+    def _path(self, key: str = "") -> str:
+        return f"/{self.bucket}/{_quote(key, safe='/-_.~')}" if key else f"/{self.bucket}"
+
+    async def _send(
+        self,
+        method: str,
+        key: str = "",
+        params: Mapping[str, str] | None = None,
+        headers: Mapping[str, str] | None = None,
+        content: bytes = b"",
+        payload_hash: str | None = None,
+        stream: bool = False,
+    ) -> httpx.Response:
+        request = self.client.build_request(method, self._path(key), params=params, headers=headers, content=content)
+        self.signer.sign(request, payload_hash or hashlib.sha256(content).hexdigest())
+        return await self.client.send(request, stream=stream)
+
+    async def _expect(self, response: httpx.Response, *statuses: int) -> httpx.Response:
+        if response.status_code not in statuses:
+            await response.aread()
+            raise S3Error(response)
+        return response
+
+    async def _put(self, key: str, image: bytes) -> None:
+        metadata = {
+            DIGEST_HEADER: hashlib.sha256(image).hexdigest(),
+            "content-type": sniff_content_type(image[:SNIFF_BYTES]),
+        }
+        if len(image) <= self.multipart_threshold:
+            await self._expect(await self._send("PUT", key, headers=metadata, content=image), 200)
+            return
+
+        async def parts() -> AsyncGenerator[bytes, None]:
+            for start in range(0, len(image), self.part_size):
+                yield image[start : start + self.part_size]
+
+        await self._multipart(key, parts(), metadata)
+
+    async def _multipart(self, key: str, parts: AsyncIterable[bytes], metadata: Mapping[str, str]) -> None:
+        response = await self._expect(await self._send("POST", key, params={"uploads": ""}, headers=metadata), 200)
+        upload_id = _parse(response.content).findtext("{*}UploadId") or ""
+        etags: dict[int, str] = {}
+        slots = asyncio.Semaphore(self.part_concurrency)
+
+        async def upload(number: int, part: bytes) -> None:
+            try:
+                # Parts are not hashed, the upload as a whole is checked by the store
+                response = await self._send(
+                    "PUT",
+                    key,
+                    params={"partNumber": str(number), "uploadId": upload_id},
+                    content=part,
+                    payload_hash=UNSIGNED_PAYLOAD,
+                )
+                etags[number] = (await self._expect(response, 200)).headers["etag"]
+            finally:
+                slots.release()
+
+        tasks: list[asyncio.Task[None]] = []
+        try:
+            async for part in parts:
+                await slots.acquire()
+                # Stop reading the payload once a part failed
+                for task in tasks:
+                    if task.done():
+                        task.result()
+                tasks.append(asyncio.create_task(upload(len(tasks) + 1, part)))
+            await asyncio.gather(*tasks)
+            body = "".join(
+                f"<Part><PartNumber>{number}</PartNumber><ETag>{escape(etag)}</ETag></Part>"
+                for number, etag in sorted(etags.items())
+            )
+            response = await self._send(
+                "POST",
+                key,
+                params={"uploadId": upload_id},
+                content=f"<CompleteMultipartUpload>{body}</CompleteMultipartUpload>".encode(),
+            )
+            await self._expect(response, 200)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await self._send("DELETE", key, params={"uploadId": upload_id})
+            raise
+
+    async def _put_stream(self, key: str, chunks: AsyncIterable[bytes]) -> None:
+        # Payloads up to the threshold are buffered and sent in one request
+        buffer = bytearray()
+        iterator = aiter(chunks)
+        async for chunk in iterator:
+            buffer += chunk
+            if len(buffer) > self.multipart_threshold:
+                break
+        else:
+            await self._put(key, bytes(buffer))
+            return
+
+        async def parts() -> AsyncGenerator[bytes, None]:
+            pending = buffer
+            async for chunk in iterator:
+                pending += chunk
+                while len(pending) >= self.part_size:
+                    yield bytes(pending[: self.part_size])
+                    del pending[: self.part_size]
+            while pending:
+                yield bytes(pending[: self.part_size])
+                del pending[: self.part_size]
+
+        # The digest is only known once the upload is over, `digest` hashes such objects on demand
+        metadata = {"content-type": sniff_content_type(bytes(buffer[:SNIFF_BYTES]))}
+        await self._multipart(key, parts(), metadata)
+
+    async def create(self, image: bytes) -> UUID:
+        image_id = uuid4()
+        await self._put(self._key(image_id), image)
+        return image_id
+
+    async def update(self, image: bytes, id: UUID) -> None:
+        await self._put(self._key(id), image)
+
+    async def create_stream(self, chunks: AsyncIterable[bytes]) -> UUID:
+        image_id = uuid4()
+        await self._put_stream(self._key(image_id), chunks)
+        return image_id
+
+    async def update_stream(self, chunks: AsyncIterable[bytes], id: UUID) -> None:
+        await self._put_stream(self._key(id), chunks)
+
+    async def delete(self, id: UUID) -> None:
+        await self._expect(await self._send("DELETE", self._key(id)), 200, 204)
+
+    async def _delete_keys(self, keys: Sequence[str]) -> None:
+        objects = "".join(f"<Object><Key>{escape(key)}</Key></Object>" for key in keys)
+        body = f"<Delete><Quiet>true</Quiet>{objects}</Delete>".encode()
+        headers = {"content-md5": base64.b64encode(hashlib.md5(body).digest()).decode()}  # noqa: S324
+        response = await self._send("POST", params={"delete": ""}, headers=headers, content=body)
+        await self._expect(response, 200)
+        errors = _parse(response.content).findall("{*}Error")
+        if errors:
+            raise S3Error(response)
+
+    async def delete_many(self, ids: Sequence[UUID], batch_size: int = 64) -> None:
+        # One DeleteObjects request per batch, the batches are sent concurrently
+        size = min(batch_size, MAX_DELETE_KEYS)
+        keys = [self._key(id) for id in ids]
+        await asyncio.gather(*(self._delete_keys(keys[start : start + size]) for start in range(0, len(keys), size)))
+
+    async def read(self, id: UUID) -> bytes | None:
+        response = await self._send("GET", self._key(id))
+        if response.status_code == HTTP_404_NOT_FOUND:
+            return None
+        return (await self._expect(response, 200)).content
+
+    async def _head(self, id: UUID) -> httpx.Response | None:
+        response = await self._send("HEAD", self._key(id))
+        if response.status_code == HTTP_404_NOT_FOUND:
+            return None
+        return await self._expect(response, 200)
+
+    async def info(self, id: UUID) -> BlobInfo | None:
+        response = await self._head(id)
+        if response is None:
+            return None
+        return BlobInfo(int(response.headers["content-length"]), response.headers["etag"].strip('"'))
+
+    def _describe(self, id: UUID, headers: httpx.Headers) -> BlobMetadata:
+        # Objects only have a last modified time
+        modified = headers.get("last-modified")
+        return BlobMetadata(
+            id,
+            int(headers["content-length"]),
+            headers.get("content-type", DEFAULT_CONTENT_TYPE),
+            headers.get(DIGEST_HEADER),
+            updated_at=parsedate_to_datetime(modified) if modified else None,
+        )
+
+    async def metadata(self, id: UUID) -> BlobMetadata | None:
+        response = await self._head(id)
+        if response is None:
+            return None
+        return self._describe(id, response.headers)
+
+    async def list_blobs(self, after: UUID | None = None, limit: int = 100) -> list[BlobMetadata]:
+        # Keys are listed in binary order, which is the order of the ids behind the prefix
+        params = {"list-type": "2", "prefix": self.prefix, "max-keys": str(limit)}
+        if after is not None:
+            params["start-after"] = self._key(after)
+        response = await self._expect(await self._send("GET", params=params), 200)
+        ids = []
+        for key in _parse(response.content).findall("{*}Contents/{*}Key"):
+            try:
+                ids.append(UUID((key.text or "").removeprefix(self.prefix)))
+            except ValueError:
+                # Not a blob of this storage
+                continue
+        listed = await asyncio.gather(*(self.metadata(id) for id in ids))
+        return [metadata for metadata in listed if metadata is not None]
+
+    async def copy(self, id: UUID) -> UUID | None:
+        copy_id = uuid4()
+        source = {"x-amz-copy-source": self._path(self._key(id))}
+        response = await self._send("PUT", self._key(copy_id), headers=source)
+        if response.status_code == HTTP_404_NOT_FOUND:
+            return None
+        await self._expect(response, 200)
+        return copy_id
+
+    async def digest(self, id: UUID) -> str | None:
+        response = await self._head(id)
+        if response is None:
+            return None
+        if DIGEST_HEADER in response.headers:
+            return response.headers[DIGEST_HEADER]
+        digest = hashlib.sha256()
+        body = await self._open(id)
+        try:
+            async for chunk in body.aiter_bytes(CHUNK_SIZE):
+                digest.update(chunk)
+        finally:
+            await body.aclose()
+        return digest.hexdigest()
+
+    async def _open(self, id: UUID, range: str | None = None) -> httpx.Response:
+        response = await self._send("GET", self._key(id), headers={"range": range} if range else None, stream=True)
+        if response.status_code in (200, 206):
+            return response
+        await response.aclose()
+        if response.status_code == HTTP_404_NOT_FOUND:
+            raise HTTPException(detail="file does not exist", status_code=HTTP_404_NOT_FOUND)
+        if response.status_code == HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE:
+            raise HTTPException(
+                detail="Requested range not satisfiable",
+                status_code=HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                headers={"Content-Range": response.headers.get("content-range", "")},
+            )
+        raise S3Error(response)
+
+    async def _list(self) -> AsyncGenerator[list[str], None]:
+        params = {"list-type": "2", "prefix": self.prefix}
+        while True:
+            response = await self._expect(await self._send("GET", params=params), 200)
+            page = _parse(response.content)
+            yield [key.text or "" for key in page.findall("{*}Contents/{*}Key")]
+            token = page.findtext("{*}NextContinuationToken")
+            if page.findtext("{*}IsTruncated") != "true" or not token:
+                return
+            params = params | {"continuation-token": token}
+
+    async def delete_all(self) -> None:
+        async for keys in self._list():
+            for start in range(0, len(keys), MAX_DELETE_KEYS):
+                await self._delete_keys(keys[start : start + MAX_DELETE_KEYS])
+
+    async def stream(self, id: UUID, range: str | None = None) -> Stream:
+        # Ranges are resolved by the store
+        response = await self._open(id, range)
+        headers = {"Content-Type": response.headers.get("content-type", DEFAULT_CONTENT_TYPE), "Accept-Ranges": "bytes"}
+        for name in ("Content-Length", "Content-Range"):
+            if name in response.headers:
+                headers[name] = response.headers[name]
+
+        async def read_chunks() -> AsyncGenerator[bytes, None]:
+            try:
+                async for chunk in response.aiter_bytes(CHUNK_SIZE):
+                    yield chunk
+            finally:
+                await response.aclose()
+
+        return Stream(read_chunks, headers=headers, status_code=response.status_code)
+
+    async def presigned_url(self, id: UUID) -> str | None:
+        url = self.client.build_request("GET", self._path(self._key(id))).url
+        return self.signer.presign("GET", url, self.presign_expires)
@@ -0,0 +1,36 @@
+__all__ = ("DEFAULT_CONTENT_TYPE", "SNIFF_BYTES", "sniff_content_type")
+
+
+DEFAULT_CONTENT_TYPE = "application/octet-stream"
+# Leading bytes needed to recognise every signature below
+SNIFF_BYTES = 16
+
+# Image signatures of https://mimesniff.spec.whatwg.org/#matching-an-image-type-pattern, "?" matches any byte
+SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"RIFF????WEBPVP", "image/webp"),
+    (b"BM", "image/bmp"),
+    (b"\x00\x00\x01\x00", "image/x-icon"),
+    (b"\x00\x00\x02\x00", "image/x-icon"),
+    (b"II*\x00", "image/tiff"),
+    (b"MM\x00*", "image/tiff"),
+    (b"????ftypavif", "image/avif"),
+    (b"????ftypheic", "image/heic"),
+)
+
+
+def _matches(head: bytes, pattern: bytes) -> bool:
+    return len(head) >= len(pattern) and all(
+        expected == ord("?") or byte == expected for byte, expected in zip(head, pattern, strict=False)
+    )
+
+
+def sniff_content_type(head: bytes) -> str:
+    """MIME type of a payload starting with `head`, recognising the image formats browsers display.
+
+    Anything else, text included, is reported as `DEFAULT_CONTENT_TYPE` so it is never rendered inline.
+    """
+    return next((content_type for pattern, content_type in SIGNATURES if _matches(head, pattern)), DEFAULT_CONTENT_TYPE)
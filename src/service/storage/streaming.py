@@ -0,0 +1,135 @@
+from collections.abc import AsyncGenerator, AsyncIterable
+from pathlib import Path
+from typing import NamedTuple, cast
+
+import anyio
+from anyio import AsyncFile
+from litestar.exceptions import HTTPException
+from litestar.response import Stream
+from litestar.status_codes import HTTP_200_OK, HTTP_206_PARTIAL_CONTENT, HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE
+
+from src.service.storage.sniff import DEFAULT_CONTENT_TYPE
+
+__all__ = (
+    "CHUNK_SIZE",
+    "ByteRange",
+    "body_chunks",
+    "parse_range",
+    "stream_bytes",
+    "stream_file",
+    "stream_open_file",
+)
+
+
+CHUNK_SIZE = 64 * 1024
+
+
+class ByteRange(NamedTuple):
+    start: int
+    end: int  # inclusive
+
+    @property
+    def length(self) -> int:
+        return self.end - self.start + 1
+
+
+def parse_range(header: str | None, size: int) -> ByteRange | None:
+    """Parse a single `Range: bytes=...` header against a payload of `size` bytes.
+
+    Returns None when the whole payload should be sent: no header, another unit, multiple ranges, which
+    servers are free to ignore, or a range that is not valid syntax, which they must ignore (RFC 7233 3.1).
+    """
+    if not header:
+        return None
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, sep, last = (part.strip() for part in spec.strip().partition("-"))
+    if not sep or not (first or last) or not all(part.isdigit() for part in (first, last) if part):
+        return None
+    if not first:
+        # Suffix range: the final `last` bytes
+        start, end = max(size - int(last), 0), size - 1
+    elif last and int(last) < int(first):
+        return None
+    else:
+        start, end = int(first), min(int(last), size - 1) if last else size - 1
+    if start > end:
+        raise HTTPException(
+            detail="Requested range not satisfiable",
+            status_code=HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            headers={"Content-Range": f"bytes */{size}"},
+        )
+    return ByteRange(start, end)
+
+
+def _ranged(size: int, range_header: str | None, media_type: str) -> tuple[int, int, dict[str, str], int]:
+    # Offset and length to send, with the response headers and status
+    byte_range = parse_range(range_header, size) if size else None
+    start, length = (byte_range.start, byte_range.length) if byte_range else (0, size)
+    headers = {"Content-Type": media_type, "Content-Length": str(length), "Accept-Ranges": "bytes"}
+    if byte_range:
+        headers["Content-Range"] = f"bytes {byte_range.start}-{byte_range.end}/{size}"
+    return start, length, headers, HTTP_206_PARTIAL_CONTENT if byte_range else HTTP_200_OK
+
+
+def stream_file(
+    path: Path, size: int, range_header: str | None = None, media_type: str = DEFAULT_CONTENT_TYPE
+) -> Stream:
+    """Stream the file at `path`, of `size` bytes, in `CHUNK_SIZE` pieces, honouring a `Range` header.
+
+    The range is checked first and the file only opened once the body is sent, so a rejected range or a
+    response never sent leaves no file open.
+    """
+    start, length, headers, status_code = _ranged(size, range_header, media_type)
+
+    async def read_chunks() -> AsyncGenerator[bytes, None]:
+        async for chunk in _file_chunks(await anyio.open_file(path, "rb"), start, length):
+            yield chunk
+
+    return Stream(read_chunks, headers=headers, status_code=status_code)
+
+
+async def stream_open_file(
+    file: AsyncFile[bytes], size: int, range_header: str | None = None, media_type: str = DEFAULT_CONTENT_TYPE
+) -> Stream:
+    """Stream a `file` already open, like `stream_file`, for files that may be removed in the meantime.
+
+    The file is closed once the body is sent, or right away when the range is rejected.
+    """
+    try:
+        start, length, headers, status_code = _ranged(size, range_header, media_type)
+    except HTTPException:
+        await file.aclose()
+        raise
+    return Stream(_file_chunks(file, start, length), headers=headers, status_code=status_code)
+
+
+async def _file_chunks(file: AsyncFile[bytes], start: int, length: int) -> AsyncGenerator[bytes, None]:
+    async with file:
+        await file.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = await file.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def stream_bytes(data: bytes, range_header: str | None = None, media_type: str = DEFAULT_CONTENT_TYPE) -> Stream:
+    """Stream a payload held in memory, honouring a `Range` header like `stream_file`."""
+    start, length, headers, status_code = _ranged(len(data), range_header, media_type)
+    view = memoryview(data)[start : start + length]
+
+    async def read_chunks() -> AsyncGenerator[bytes, None]:
+        for offset in range(0, length, CHUNK_SIZE):
+            yield bytes(view[offset : offset + CHUNK_SIZE])
+
+    return Stream(read_chunks, headers=headers, status_code=status_code)
+
+
+def body_chunks(response: Stream) -> AsyncIterable[bytes]:
+    """Body of a `Stream` built by a storage backend, whose bodies are all asynchronous byte chunks."""
+    iterator = response.iterator
+    return cast("AsyncIterable[bytes]", iterator() if callable(iterator) else iterator)
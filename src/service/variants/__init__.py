@@ -0,0 +1,6 @@
+from src.service.variants.cache import DerivativeCache
+from src.service.variants.negotiation import negotiate_format
+from src.service.variants.render import DEFAULT_FORMAT, FORMATS, render_variant
+from src.service.variants.service import ImageVariants
+
+__all__ = ["DEFAULT_FORMAT", "FORMATS", "DerivativeCache", "ImageVariants", "negotiate_format", "render_variant"]
@@ -0,0 +1,94 @@
+import asyncio
+import os
+import shutil
+from collections import OrderedDict
+from pathlib import Path
+from tempfile import mkstemp
+
+from litestar.concurrency import sync_to_thread
+
+__all__ = ("DerivativeCache",)
+
+
+# Kept apart from the blob storage directory, whose cleanup and migrations walk every file below it
+DerivativePath = Path(__file__).parents[3] / "derivatives"
+
+
+class DerivativeCache:
+    """Directory of rendered image variants, bounded to `max_bytes` and evicted least recently used first.
+
+    Entries found on disk at first use are adopted in modification time order, so the budget also holds
+    across restarts.
+    """
+
+    def __init__(self, root: Path, max_bytes: int) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: OrderedDict[str, int] | None = None
+        self._lock = asyncio.Lock()
+
+    def path(self, key: str) -> Path:
+        return self.root / key
+
+    def _scan(self) -> OrderedDict[str, int]:
+        self.root.mkdir(parents=True, exist_ok=True)
+        files = [(path.stat(), path.name) for path in self.root.iterdir() if ".tmp" not in path.name]
+        files.sort(key=lambda item: item[0].st_mtime_ns)
+        return OrderedDict((name, stat.st_size) for stat, name in files)
+
+    async def _load(self) -> OrderedDict[str, int]:
+        async with self._lock:
+            if self._entries is None:
+                self._entries = await sync_to_thread(self._scan)
+                self.size = sum(self._entries.values())
+        return self._entries
+
+    async def get(self, key: str) -> Path | None:
+        entries = await self._load()
+        if key not in entries:
+            return None
+        entries.move_to_end(key)
+        return self.path(key)
+
+    def _write(self, key: str, data: bytes) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = mkstemp(dir=self.root, prefix=f"{key}.tmp")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(data)
+            Path(tmp_name).replace(self.path(key))
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+
+    def _remove(self, names: list[str]) -> None:
+        for name in names:
+            self.path(name).unlink(missing_ok=True)
+
+    async def put(self, key: str, data: bytes) -> Path:
+        entries = await self._load()
+        # Registered once the file is in place, `get` never returns a path still being written
+        await sync_to_thread(self._write, key, data)
+        self.size += len(data) - entries.pop(key, 0)
+        entries[key] = len(data)
+        evicted = []
+        # The new entry is kept even alone over budget, it is about to be served
+        while self.size > self.max_bytes and len(entries) > 1:
+            name, size = entries.popitem(last=False)
+            self.size -= size
+            evicted.append(name)
+        if evicted:
+            await sync_to_thread(self._remove, evicted)
+        return self.path(key)
+
+    async def delete_all(self) -> None:
+        async with self._lock:
+            await sync_to_thread(shutil.rmtree, self.root, ignore_errors=True)
+            self._entries = None
+            self.size = 0
+
+    def discard(self, key: str) -> None:
+        # For entries removed behind the cache's back
+        if self._entries is not None and key in self._entries:
+            self.size -= self._entries.pop(key)
@@ -0,0 +1,29 @@
+from src.service.variants.render import FORMATS
+
+__all__ = ("negotiate_format",)
+
+
+def negotiate_format(accept: str | None) -> str | None:
+    """Variant format preferred by an `Accept` header, None unless it names one of `FORMATS` explicitly.
+
+    Wildcards such as `image/*` do not pick a format, the caller's default applies to those.
+    """
+    if not accept:
+        return None
+    preferences: dict[str, float] = {}
+    for media_range in accept.split(","):
+        media_type, *params = (part.strip() for part in media_range.split(";"))
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        preferences[media_type.lower()] = quality
+    candidates = [(preferences[media], name) for name, media in FORMATS.items() if preferences.get(media, 0) > 0]
+    if not candidates:
+        return None
+    # Highest quality wins, ties go to the first format in FORMATS
+    return max(candidates, key=lambda candidate: candidate[0])[1]
@@ -0,0 +1,28 @@
+import io
+
+from PIL import Image
+
+__all__ = ("DEFAULT_FORMAT", "FORMATS", "render_variant")
+
+
+# Variant formats and their media type
+FORMATS = {"webp": "image/webp", "jpeg": "image/jpeg"}
+# Used when only a width is asked for and the client states no preference
+DEFAULT_FORMAT = "jpeg"
+
+
+def render_variant(data: bytes, width: int | None, format: str) -> bytes:
+    """Re-encode an image as `format`, scaled down to `width` pixels wide keeping its aspect ratio.
+
+    Runs in a worker process, images are never scaled up.
+    """
+    with Image.open(io.BytesIO(data)) as original:
+        image: Image.Image = original
+        if width is not None and width < image.width:
+            height = max(1, round(image.height * width / image.width))
+            image = image.resize((width, height), Image.Resampling.LANCZOS)
+        if format == "jpeg" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        output = io.BytesIO()
+        image.save(output, format=format.upper(), quality=80)
+        return output.getvalue()
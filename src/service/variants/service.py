@@ -0,0 +1,95 @@
+import asyncio
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING
+from uuid import UUID
+
+import anyio
+from anyio import AsyncFile
+from litestar.exceptions import HTTPException, NotFoundException
+from litestar.status_codes import HTTP_415_UNSUPPORTED_MEDIA_TYPE, HTTP_422_UNPROCESSABLE_ENTITY
+from PIL import Image, UnidentifiedImageError
+
+from src.service.storage.base import StorageServer
+from src.service.variants.cache import DerivativeCache
+from src.service.variants.render import render_variant
+
+if TYPE_CHECKING:
+    from litestar import Litestar
+
+__all__ = ("ImageVariants",)
+
+
+class ImageVariants:
+    """Resized and re-encoded copies of stored images, rendered in a process pool and cached on disk.
+
+    Variants are keyed by blob id, blob version, width and format, so updating a blob never serves a
+    stale variant.
+    """
+
+    def __init__(self, cache: DerivativeCache, workers: int) -> None:
+        self.cache = cache
+        self.workers = workers
+        self.pool: ProcessPoolExecutor | None = None
+        # Concurrent requests for the same missing variant share a single rendering
+        self._rendering: dict[str, asyncio.Task[None]] = {}
+
+    async def start(self, app: "Litestar") -> None:
+        app.state.image_variants = self
+
+    async def stop(self, app: "Litestar") -> None:
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+            self.pool = None
+
+    async def open(
+        self, storage: StorageServer, id: UUID, width: int | None, format: str
+    ) -> tuple[AsyncFile[bytes], int]:
+        """Open the variant of blob `id` and tell its size, rendering it first if it is not cached.
+
+        The open file stays readable when the cache evicts the variant before it is sent.
+        """
+        info = await storage.info(id)
+        if info is None:
+            raise NotFoundException(detail="file does not exist")
+        key = hashlib.sha256(f"{id}:{info.version}:{width}:{format}".encode()).hexdigest()
+        for _ in range(2):
+            path = await self.cache.get(key)
+            if path is None:
+                await self._render(storage, id, width, format, key)
+                path = self.cache.path(key)
+            try:
+                file = await anyio.open_file(path, "rb")
+            except FileNotFoundError:
+                # Evicted in between, render again
+                self.cache.discard(key)
+                continue
+            return file, os.fstat(file.wrapped.fileno()).st_size
+        raise NotFoundException(detail="file does not exist")
+
+    async def _render(self, storage: StorageServer, id: UUID, width: int | None, format: str, key: str) -> None:
+        task = self._rendering.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._render_once(storage, id, width, format, key))
+            self._rendering[key] = task
+            task.add_done_callback(lambda _: self._rendering.pop(key, None))
+        await asyncio.shield(task)
+
+    async def _render_once(self, storage: StorageServer, id: UUID, width: int | None, format: str, key: str) -> None:
+        data = await storage.read(id)
+        if data is None:
+            raise NotFoundException(detail="file does not exist")
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(self.workers)
+        try:
+            rendered = await asyncio.get_running_loop().run_in_executor(self.pool, render_variant, data, width, format)
+        except Image.DecompressionBombError as e:
+            raise HTTPException(
+                detail="Stored image is too large to convert", status_code=HTTP_422_UNPROCESSABLE_ENTITY
+            ) from e
+        except (UnidentifiedImageError, OSError) as e:
+            raise HTTPException(
+                detail="Stored file is not an image that can be converted", status_code=HTTP_415_UNSUPPORTED_MEDIA_TYPE
+            ) from e
+        await self.cache.put(key, rendered)
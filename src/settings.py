@@ -0,0 +1,77 @@
+import os
+from dataclasses import dataclass, field
+from functools import lru_cache
+
+__all__ = ("Settings", "get_settings")
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.environ.get(name, default))
+
+
+def _env_flag(name: str, default: bool) -> bool:
+    value = os.environ.get(name)
+    return default if value is None else value.lower() in ("1", "true", "yes", "on")
+
+
+@dataclass(frozen=True)
+class Settings:
+    # Number of concurrent output generations and how many submitted jobs may wait for a worker
+    generation_workers: int = field(default_factory=lambda: _env_int("GENERATION_WORKERS", 2))
+    generation_queue_size: int = field(default_factory=lambda: _env_int("GENERATION_QUEUE_SIZE", 1024))
+    # Upper bound on prompt images read and written to storage at the same time within one request
+    prompt_ingest_concurrency: int = field(default_factory=lambda: _env_int("PROMPT_INGEST_CONCURRENCY", 8))
+    # Largest number of requests accepted by one POST /request/batch
+    max_batch_requests: int = field(default_factory=lambda: _env_int("MAX_BATCH_REQUESTS", 100))
+    # Number of blobs removed from storage at the same time once a project or request deletion committed
+    blob_delete_batch_size: int = field(default_factory=lambda: _env_int("BLOB_DELETE_BATCH_SIZE", 64))
+    # Memory kept for generator resource files, all of them are loaded at startup when they fit
+    resource_cache_bytes: int = field(default_factory=lambda: _env_int("RESOURCE_CACHE_BYTES", 32 * 1024 * 1024))
+    # Keyword rules picking the generator output, the bundled rules.json when unset
+    generation_rules: str | None = field(default_factory=lambda: os.environ.get("GENERATION_RULES"))
+    # Outputs kept for reuse by requests with the same prompts, for at most `generation_cache_ttl` seconds
+    generation_cache_bytes: int = field(default_factory=lambda: _env_int("GENERATION_CACHE_BYTES", 256 * 1024 * 1024))
+    generation_cache_ttl: int = field(default_factory=lambda: _env_int("GENERATION_CACHE_TTL", 7 * 24 * 3600))
+    # Disk kept for resized/re-encoded images and the number of processes rendering them
+    variant_cache_bytes: int = field(default_factory=lambda: _env_int("VARIANT_CACHE_BYTES", 512 * 1024 * 1024))
+    variant_workers: int = field(default_factory=lambda: _env_int("VARIANT_WORKERS", 2))
+    # Blob storage, "local" files or "s3" for an S3 compatible object store
+    storage_backend: str = field(default_factory=lambda: os.environ.get("STORAGE_BACKEND", "local"))
+    # Memory kept for the content of recently used blobs of at most `storage_cache_entry_bytes`, 0 disables it
+    storage_cache_bytes: int = field(default_factory=lambda: _env_int("STORAGE_CACHE_BYTES", 64 * 1024 * 1024))
+    storage_cache_entry_bytes: int = field(default_factory=lambda: _env_int("STORAGE_CACHE_ENTRY_BYTES", 1024 * 1024))
+    # Blob directory layout of the local storage, "flat" or "sharded" (see src.service.storage.migrate)
+    storage_layout: str = field(default_factory=lambda: os.environ.get("STORAGE_LAYOUT", "flat"))
+    # Object store of the "s3" backend, objects are named `s3_prefix` + blob id
+    s3_endpoint: str = field(default_factory=lambda: os.environ.get("S3_ENDPOINT", "http://localhost:9000"))
+    s3_bucket: str = field(default_factory=lambda: os.environ.get("S3_BUCKET", "ailiyah"))
+    s3_prefix: str = field(default_factory=lambda: os.environ.get("S3_PREFIX", ""))
+    s3_region: str = field(default_factory=lambda: os.environ.get("S3_REGION", "us-east-1"))
+    s3_access_key: str = field(default_factory=lambda: os.environ.get("S3_ACCESS_KEY", ""), repr=False)
+    s3_secret_key: str = field(default_factory=lambda: os.environ.get("S3_SECRET_KEY", ""), repr=False)
+    # Pooled connections to the object store, shared by all requests
+    s3_max_connections: int = field(default_factory=lambda: _env_int("S3_MAX_CONNECTIONS", 32))
+    # Blobs above the threshold are uploaded in parts, S3 requires parts of at least 5 MiB
+    s3_multipart_threshold: int = field(default_factory=lambda: _env_int("S3_MULTIPART_THRESHOLD", 8 * 1024 * 1024))
+    s3_part_size: int = field(default_factory=lambda: _env_int("S3_PART_SIZE", 8 * 1024 * 1024))
+    # Answer GET /image/{id} for originals with a redirect to a presigned URL of the blob, when the backend has one
+    image_redirects: bool = field(default_factory=lambda: _env_flag("IMAGE_REDIRECTS", False))
+    image_redirect_ttl: int = field(default_factory=lambda: _env_int("IMAGE_REDIRECT_TTL", 900))
+    # Memory kept for serialized project trees served by GET /project/{id}
+    project_cache_bytes: int = field(default_factory=lambda: _env_int("PROJECT_CACHE_BYTES", 64 * 1024 * 1024))
+    # SQLite connection profile applied to every connection, see https://www.sqlite.org/pragma.html
+    sqlite_journal_mode: str = field(default_factory=lambda: os.environ.get("SQLITE_JOURNAL_MODE", "WAL"))
+    sqlite_synchronous: str = field(default_factory=lambda: os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL"))
+    sqlite_mmap_size: int = field(default_factory=lambda: _env_int("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))
+    # Pages when positive, KiB when negative
+    sqlite_cache_size: int = field(default_factory=lambda: _env_int("SQLITE_CACHE_SIZE", -64 * 1024))
+    sqlite_busy_timeout: int = field(default_factory=lambda: _env_int("SQLITE_BUSY_TIMEOUT", 5000))
+    # Connections of the query-only engine serving GET endpoints
+    db_read_pool_size: int = field(default_factory=lambda: _env_int("DB_READ_POOL_SIZE", 8))
+    # Encode the prompt/request lists and project trees straight from result rows instead of through the DTOs
+    fast_serialization: bool = field(default_factory=lambda: _env_flag("FAST_SERIALIZATION", False))
+
+
+@lru_cache
+def get_settings() -> Settings:
+    return Settings()
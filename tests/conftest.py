@@ -1,32 +1,112 @@
-from collections.abc import AsyncGenerator
-from pathlib import Path
+from collections.abc import AsyncGenerator, Generator
+from contextlib import contextmanager
 
 import pytest
 from advanced_alchemy.extensions.litestar import SQLAlchemyPlugin
 from litestar import Litestar
+from litestar.di import Provide
 from litestar.testing import AsyncTestClient
 
-from src.helpers import create_db_config, on_test_shutdown, provide_test_storage, provide_transaction
-from src.router import ImageController, ProjectController, PromptController, RequestController
+from src.helpers import (
+    create_db_config,
+    create_test_storage,
+    on_test_shutdown,
+    provide_generation_queue,
+    provide_image_variants,
+    provide_read_session,
+    provide_test_storage,
+    provide_transaction,
+    remove_database,
+    upgrade_schema,
+)
+from src.router import (
+    ImageController,
+    JobController,
+    MetricsController,
+    ProjectController,
+    PromptController,
+    RequestController,
+    StatsController,
+)
+from src.service.database import ReadDatabase
+from src.service.image_generation.generator import preload_resources
+from src.service.jobs import GenerationQueue
+from src.service.metrics import MetricsMiddleware
 from src.service.storage.base import StorageServer
+from src.service.variants import DerivativeCache, ImageVariants
+from src.service.variants.cache import DerivativePath
+from src.settings import get_settings
+from tests.helpers import AssertQueries, recorded_statements
 
 
 @pytest.fixture(scope="function", autouse=True)
 async def test_client() -> AsyncGenerator[AsyncTestClient[Litestar], None]:
-    p = Path("test.sqlite")
     db_config = create_db_config("test.sqlite")
+    read_database = ReadDatabase("test.sqlite", pool_size=2)
+    generation_queue = GenerationQueue(create_test_storage, workers=2)
+    image_variants = ImageVariants(DerivativeCache(DerivativePath / "test", 64 * 1024 * 1024), workers=2)
     app = Litestar(
-        [ProjectController, RequestController, PromptController, ImageController],
-        dependencies={"transaction": provide_transaction, "storage": provide_test_storage},
+        [
+            ProjectController,
+            RequestController,
+            PromptController,
+            ImageController,
+            JobController,
+            StatsController,
+            MetricsController,
+        ],
+        dependencies={
+            "transaction": provide_transaction,
+            "read_session": provide_read_session,
+            "storage": Provide(provide_test_storage, sync_to_thread=False),
+            "generation_queue": Provide(provide_generation_queue, sync_to_thread=False),
+            "image_variants": Provide(provide_image_variants, sync_to_thread=False),
+        },
+        middleware=[MetricsMiddleware],
         plugins=[SQLAlchemyPlugin(db_config)],
-        on_shutdown=[on_test_shutdown],
+        on_startup=[
+            upgrade_schema,
+            preload_resources,
+            generation_queue.start,
+            image_variants.start,
+            read_database.start,
+        ],
+        on_shutdown=[
+            generation_queue.stop,
+            image_variants.stop,
+            read_database.stop,
+            on_test_shutdown,
+            image_variants.cache.delete_all,
+        ],
     )
     async with AsyncTestClient(app=app) as client:
         yield client
-    p.unlink(missing_ok=True)
+    remove_database("test.sqlite")
+
+
+@pytest.fixture(scope="function")
+def assert_queries() -> AssertQueries:
+    """`with assert_queries(n):` fails unless the block executes exactly `n` SQL statements."""
+
+    @contextmanager
+    def check(expected: int) -> Generator[list[str], None, None]:
+        with recorded_statements() as statements:
+            yield statements
+        assert len(statements) == expected, "\n".join(statements)
+
+    return check
+
+
+@pytest.fixture(scope="function")
+def dto_serialization(monkeypatch: pytest.MonkeyPatch) -> Generator[None, None, None]:
+    """Serialize through the DTOs, where SQL statement counts do not depend on `FAST_SERIALIZATION`."""
+    monkeypatch.setenv("FAST_SERIALIZATION", "0")
+    get_settings.cache_clear()
+    yield
+    get_settings.cache_clear()
 
 
 @pytest.fixture(scope="function")
 async def storage() -> AsyncGenerator[StorageServer, None]:
-    storage = await provide_test_storage().__anext__()
+    storage = provide_test_storage()
     yield storage
@@ -0,0 +1,212 @@
+import base64
+import hashlib
+import re
+import urllib.parse
+import xml.etree.ElementTree as ET
+from collections.abc import Awaitable, Callable, MutableMapping
+from dataclasses import dataclass, field
+from datetime import UTC, datetime
+from email.utils import format_datetime
+from typing import Any
+from uuid import uuid4
+from xml.sax.saxutils import escape
+
+from src.service.storage.s3 import UNSIGNED_PAYLOAD, SigV4Signer
+
+__all__ = ("ACCESS_KEY", "BUCKET", "ENDPOINT", "SECRET_KEY", "FakeS3")
+
+
+ENDPOINT = "http://s3.test"
+BUCKET = "bucket"
+ACCESS_KEY = "test-access-key"
+SECRET_KEY = "test-secret-key"
+
+Scope = MutableMapping[str, Any]
+Receive = Callable[[], Awaitable[MutableMapping[str, Any]]]
+Send = Callable[[MutableMapping[str, Any]], Awaitable[None]]
+
+
+@dataclass
+class StoredObject:
+    body: bytes
+    metadata: dict[str, str]
+    modified: datetime = field(default_factory=lambda: datetime.now(UTC))
+
+    @property
+    def etag(self) -> str:
+        return f'"{hashlib.md5(self.body).hexdigest()}"'
+
+
+@dataclass
+class Reply:
+    status: int
+    body: bytes = b""
+    headers: dict[str, str] = field(default_factory=dict)
+
+
+def error(status: int, code: str) -> Reply:
+    return Reply(status, f"<Error><Code>{code}</Code></Error>".encode())
+
+
+class FakeS3:
+    """ASGI stand-in for an S3 bucket, serving path style requests to `ENDPOINT`/`BUCKET`.
+
+    Checks the SigV4 signature of every request, headers or presigned, and records the operations it
+    served in `calls`. `page_size` bounds the keys of a ListObjectsV2 page.
+    """
+
+    def __init__(self, page_size: int = 1000) -> None:
+        self.objects: dict[str, StoredObject] = {}
+        self.uploads: dict[str, tuple[str, dict[str, str], dict[int, bytes]]] = {}
+        self.calls: list[str] = []
+        self.page_size = page_size
+        self.signer = SigV4Signer(ACCESS_KEY, SECRET_KEY, "us-east-1")
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        headers = {name.decode().lower(): value.decode() for name, value in scope["headers"]}
+        query = urllib.parse.parse_qsl(scope["query_string"].decode(), keep_blank_values=True)
+        reply = (
+            self.handle(scope["method"], scope["path"], dict(query), headers, body)
+            if self.authorized(scope["method"], scope["path"], query, headers, body)
+            else error(403, "SignatureDoesNotMatch")
+        )
+        reply.headers.setdefault("content-length", str(len(reply.body)))
+        await send(
+            {
+                "type": "http.response.start",
+                "status": reply.status,
+                "headers": [(name.encode(), value.encode()) for name, value in reply.headers.items()],
+            }
+        )
+        await send({"type": "http.response.body", "body": b"" if scope["method"] == "HEAD" else reply.body})
+
+    def authorized(
+        self, method: str, path: str, query: list[tuple[str, str]], headers: dict[str, str], body: bytes
+    ) -> bool:
+        params = dict(query)
+        if "X-Amz-Signature" in params:
+            signed_query = [(key, value) for key, value in query if key != "X-Amz-Signature"]
+            canonical, _ = self.signer.canonical_request(
+                method, path, signed_query, {"host": headers["host"]}, UNSIGNED_PAYLOAD
+            )
+            return params["X-Amz-Signature"] == self.signer.signature(params["X-Amz-Date"], canonical)
+        match = re.fullmatch(
+            r"AWS4-HMAC-SHA256 Credential=([^/]+)/[^,]+, SignedHeaders=([^,]+), Signature=(\w+)",
+            headers.get("authorization", ""),
+        )
+        if match is None or match[1] != ACCESS_KEY:
+            return False
+        payload_hash = headers["x-amz-content-sha256"]
+        if payload_hash != UNSIGNED_PAYLOAD and payload_hash != hashlib.sha256(body).hexdigest():
+            return False
+        signed = {name: headers[name] for name in match[2].split(";")}
+        canonical, _ = self.signer.canonical_request(method, path, query, signed, payload_hash)
+        return match[3] == self.signer.signature(headers["x-amz-date"], canonical)
+
+    def handle(self, method: str, path: str, query: dict[str, str], headers: dict[str, str], body: bytes) -> Reply:
+        bucket, _, key = path.lstrip("/").partition("/")
+        if bucket != BUCKET:
+            return error(404, "NoSuchBucket")
+        if not key:
+            if method == "POST" and "delete" in query:
+                self.calls.append("DeleteObjects")
+                return self.delete_objects(headers, body)
+            if method == "GET" and query.get("list-type") == "2":
+                self.calls.append("ListObjectsV2")
+                return self.list_objects(query)
+            return error(400, "InvalidRequest")
+        if "uploads" in query:
+            self.calls.append("CreateMultipartUpload")
+            upload_id = uuid4().hex
+            self.uploads[upload_id] = (key, metadata(headers), {})
+            return Reply(
+                200,
+                f"<InitiateMultipartUploadResult><UploadId>{upload_id}</UploadId></InitiateMultipartUploadResult>".encode(),
+            )
+        if "uploadId" in query:
+            return self.multipart(method, key, query, body)
+        if method == "PUT" and "x-amz-copy-source" in headers:
+            self.calls.append("CopyObject")
+            source = self.objects.get(urllib.parse.unquote(headers["x-amz-copy-source"]).partition(f"/{BUCKET}/")[2])
+            if source is None:
+                return error(404, "NoSuchKey")
+            self.objects[key] = StoredObject(source.body, dict(source.metadata))
+            return Reply(200, b"<CopyObjectResult></CopyObjectResult>")
+        if method == "PUT":
+            self.calls.append("PutObject")
+            self.objects[key] = StoredObject(body, metadata(headers))
+            return Reply(200, headers={"etag": self.objects[key].etag})
+        if method == "DELETE":
+            self.calls.append("DeleteObject")
+            self.objects.pop(key, None)
+            return Reply(204)
+        stored = self.objects.get(key)
+        if stored is None:
+            return error(404, "NoSuchKey")
+        self.calls.append("HeadObject" if method == "HEAD" else "GetObject")
+        reply = Reply(
+            200,
+            stored.body,
+            {
+                "etag": stored.etag,
+                "accept-ranges": "bytes",
+                "last-modified": format_datetime(stored.modified, usegmt=True),
+                **stored.metadata,
+            },
+        )
+        if "range" in headers:
+            start, _, end = headers["range"].removeprefix("bytes=").partition("-")
+            first, last = int(start), min(int(end or len(stored.body) - 1), len(stored.body) - 1)
+            if first > last:
+                return Reply(416, headers={"content-range": f"bytes */{len(stored.body)}"})
+            reply = Reply(206, stored.body[first : last + 1], reply.headers)
+            reply.headers["content-range"] = f"bytes {first}-{last}/{len(stored.body)}"
+        return reply
+
+    def multipart(self, method: str, key: str, query: dict[str, str], body: bytes) -> Reply:
+        upload = self.uploads.get(query["uploadId"])
+        if upload is None or upload[0] != key:
+            return error(404, "NoSuchUpload")
+        if method == "PUT":
+            self.calls.append("UploadPart")
+            upload[2][int(query["partNumber"])] = body
+            return Reply(200, headers={"etag": f'"{hashlib.md5(body).hexdigest()}"'})
+        del self.uploads[query["uploadId"]]
+        if method == "DELETE":
+            self.calls.append("AbortMultipartUpload")
+            return Reply(204)
+        self.calls.append("CompleteMultipartUpload")
+        numbers = [int(part.findtext("PartNumber") or 0) for part in ET.fromstring(body).findall("Part")]
+        self.objects[key] = StoredObject(b"".join(upload[2][number] for number in numbers), upload[1])
+        return Reply(200, b"<CompleteMultipartUploadResult></CompleteMultipartUploadResult>")
+
+    def delete_objects(self, headers: dict[str, str], body: bytes) -> Reply:
+        if headers.get("content-md5") != base64.b64encode(hashlib.md5(body).digest()).decode():
+            return error(400, "InvalidDigest")
+        for key in ET.fromstring(body).findall("Object/Key"):
+            self.objects.pop(key.text or "", None)
+        return Reply(200, b"<DeleteResult></DeleteResult>")
+
+    def list_objects(self, query: dict[str, str]) -> Reply:
+        # Continues after the last key listed, like S3 itself, so deleting listed keys does not skip others
+        after = query.get("continuation-token", query.get("start-after", ""))
+        page_size = min(self.page_size, int(query.get("max-keys", 1000)))
+        keys = sorted(key for key in self.objects if key.startswith(query.get("prefix", "")) and key > after)
+        page = keys[:page_size]
+        truncated = len(keys) > page_size
+        contents = "".join(f"<Contents><Key>{escape(key)}</Key></Contents>" for key in page)
+        token = f"<NextContinuationToken>{escape(page[-1])}</NextContinuationToken>" if truncated else ""
+        result = (
+            f"<ListBucketResult><IsTruncated>{str(truncated).lower()}</IsTruncated>{contents}{token}</ListBucketResult>"
+        )
+        return Reply(200, result.encode())
+
+
+def metadata(headers: dict[str, str]) -> dict[str, str]:
+    return {name: value for name, value in headers.items() if name.startswith("x-amz-meta-") or name == "content-type"}
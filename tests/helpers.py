@@ -1,16 +1,19 @@
+import asyncio
 import datetime
 import os
 import random
 from collections.abc import AsyncGenerator, Callable, Generator
+from contextlib import AbstractContextManager, contextmanager
 from typing import TYPE_CHECKING, Any, ClassVar, Generic, Literal, TypeVar
 from uuid import UUID
 
 import pytest
 from httpx import Response
+from sqlalchemy import Engine, event
 
 from src.model.base import Base
 
-HTTP_CODE = Literal[200, 201, 204, 404, 500, 409]
+HTTP_CODE = Literal[200, 201, 202, 204, 404, 500, 409]
 T = TypeVar("T", bound=Base)
 
 
@@ -66,6 +69,42 @@ class ResponseValidator:
         ResponseValidator.validate_status(409, response)
 
 
+# Type of the `assert_queries` fixture
+AssertQueries = Callable[[int], AbstractContextManager[list[str]]]
+
+
+@contextmanager
+def recorded_statements() -> Generator[list[str], None, None]:
+    """SQL statements executed by any engine within the block."""
+    statements: list[str] = []
+
+    def record(conn, cursor, statement, *_) -> None:  # type: ignore[no-untyped-def]
+        statements.append(statement)
+
+    event.listen(Engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(Engine, "before_cursor_execute", record)
+
+
+async def wait_for_job(test_client: "AsyncTestClient", response: Response, timeout: float = 5) -> dict[str, Any]:
+    """Poll the job referenced by an accepted request until it has finished."""
+    assert response.status_code == 202
+    return await wait_for_location(test_client, response.headers["location"], timeout)
+
+
+async def wait_for_location(test_client: "AsyncTestClient", location: str, timeout: float = 5) -> dict[str, Any]:
+    """Poll the job at `location` until it has finished."""
+    async with asyncio.timeout(timeout):
+        while True:
+            job = await test_client.get(location)
+            assert job.status_code == 200
+            if job.json()["status"] not in ("pending", "running"):
+                return job.json()  # type: ignore[no-any-return]
+            await asyncio.sleep(0.01)
+
+
 class FixtureManager:
     def __init__(
         self,
@@ -0,0 +1,24 @@
+from sqlalchemy import create_engine, inspect
+
+from src.model.base import Base
+from src.model.migrate import create_missing_indexes
+
+
+def index_names(connection) -> set[str]:  # type: ignore[no-untyped-def]
+    inspector = inspect(connection)
+    return {index["name"] for table in Base.metadata.sorted_tables for index in inspector.get_indexes(table.name)}
+
+
+def test_missing_indexes_are_added_to_existing_tables() -> None:
+    engine = create_engine("sqlite://")
+    with engine.begin() as connection:
+        Base.metadata.create_all(connection)
+        expected = index_names(connection)
+        # Tables created before the indexes were declared
+        for name in expected:
+            connection.exec_driver_sql(f"DROP INDEX {name}")
+        assert index_names(connection) == set()
+
+        assert set(create_missing_indexes(connection)) == expected
+        assert index_names(connection) == expected
+        assert create_missing_indexes(connection) == []
@@ -1,11 +1,27 @@
+import hashlib
+import io
 import json
-from collections.abc import AsyncGenerator
+import struct
+import zlib
+from collections.abc import AsyncGenerator, Generator
+from pathlib import Path
 from uuid import UUID, uuid4
 
+import httpx
 import pytest
+from litestar import Litestar
+from litestar.di import Provide
 from litestar.testing import AsyncTestClient
+from PIL import Image
 
-from src.service.storage import StorageServer
+from src.router import ImageController
+from src.service.storage import S3Storage, StorageServer
+from src.service.storage.streaming import body_chunks, stream_open_file
+from src.service.variants import DerivativeCache, ImageVariants
+from src.service.variants.cache import DerivativePath
+from src.settings import get_settings
+from tests.fake_s3 import ACCESS_KEY, BUCKET, ENDPOINT, SECRET_KEY, FakeS3
+from tests.helpers import wait_for_job
 
 
 async def test_request_invalid_image_throws(test_client: "AsyncTestClient") -> None:
@@ -31,7 +47,8 @@ async def setup(test_client: "AsyncTestClient", storage: "StorageServer") -> Asy
             "project_id": str(project_id),
         },
     )
-    assert request.status_code == 201
+    assert request.status_code == 202
+    await wait_for_job(test_client, request)
     request_id = request.json()["id"]
     request = await test_client.get(f"request/{request_id}")
     assert request.status_code == 200
@@ -44,3 +61,211 @@ async def test_read_valid_image(test_client: "AsyncTestClient", setup: UUID) ->
     image_id = setup
     result = await test_client.get(f"image/{image_id}")
     assert result.status_code == 200
+
+
+async def test_read_valid_image_reports_length(test_client: "AsyncTestClient", setup: UUID) -> None:
+    result = await test_client.get(f"image/{setup}")
+    assert result.content == FIRST_IMAGE
+    assert result.headers["content-length"] == str(len(FIRST_IMAGE))
+    assert result.headers["accept-ranges"] == "bytes"
+
+
+@pytest.mark.parametrize(
+    "byte_range, expected",
+    [("bytes=0-4", FIRST_IMAGE[:5]), ("bytes=6-", FIRST_IMAGE[6:]), ("bytes=-5", FIRST_IMAGE[-5:])],
+)
+async def test_read_image_range(test_client: "AsyncTestClient", setup: UUID, byte_range: str, expected: bytes) -> None:
+    result = await test_client.get(f"image/{setup}", headers={"Range": byte_range})
+    assert result.status_code == 206
+    assert result.content == expected
+    assert result.headers["content-length"] == str(len(expected))
+    assert result.headers["content-range"].endswith(f"/{len(FIRST_IMAGE)}")
+
+
+async def test_repeated_reads_are_served_from_memory(test_client: "AsyncTestClient", setup: UUID) -> None:
+    before = (await test_client.get("stats/cache")).json()["storage"]
+    for _ in range(2):
+        assert (await test_client.get(f"image/{setup}")).content == FIRST_IMAGE
+    after = (await test_client.get("stats/cache")).json()["storage"]
+    assert after["hits"] == before["hits"] + 2
+    assert after["misses"] == before["misses"]
+
+
+async def test_read_image_unsatisfiable_range(test_client: "AsyncTestClient", setup: UUID) -> None:
+    result = await test_client.get(f"image/{setup}", headers={"Range": "bytes=100-"})
+    assert result.status_code == 416
+
+
+async def test_read_image_ignores_invalid_range(test_client: "AsyncTestClient", setup: UUID) -> None:
+    result = await test_client.get(f"image/{setup}", headers={"Range": "bytes=5-3"})
+    assert result.status_code == 200
+    assert result.content == FIRST_IMAGE
+
+
+def make_png(width: int, height: int) -> bytes:
+    output = io.BytesIO()
+    Image.new("RGBA", (width, height), (200, 30, 30, 128)).save(output, format="PNG")
+    return output.getvalue()
+
+
+def png_chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+
+PNG_IMAGE = make_png(400, 200)
+
+
+@pytest.fixture(scope="function")
+async def setup_png(test_client: "AsyncTestClient", storage: "StorageServer") -> AsyncGenerator[UUID, None]:
+    yield await storage.create(PNG_IMAGE)
+
+
+async def test_original_has_its_sniffed_content_type(test_client: "AsyncTestClient", setup_png: UUID) -> None:
+    result = await test_client.get(f"image/{setup_png}")
+    assert result.headers["content-type"] == "image/png"
+    assert result.content == PNG_IMAGE
+
+
+async def test_head_reports_metadata(test_client: "AsyncTestClient", setup_png: UUID) -> None:
+    result = await test_client.head(f"image/{setup_png}")
+    assert result.status_code == 200
+    assert result.content == b""
+    assert result.headers["content-type"] == "image/png"
+    assert result.headers["content-length"] == str(len(PNG_IMAGE))
+    assert result.headers["etag"] == f'"{hashlib.sha256(PNG_IMAGE).hexdigest()}"'
+    assert "last-modified" in result.headers
+    assert (await test_client.head(f"image/{uuid4()}")).status_code == 404
+
+
+async def test_list_images_pages_through_blobs(test_client: "AsyncTestClient", storage: "StorageServer") -> None:
+    ids = sorted([str(await storage.create(PNG_IMAGE)) for _ in range(3)])
+    first = (await test_client.get("image", params={"limit": 2})).json()
+    assert [blob["id"] for blob in first] == ids[:2]
+    assert first[0]["content_type"] == "image/png"
+    assert first[0]["size"] == len(PNG_IMAGE)
+    rest = (await test_client.get("image", params={"after": first[-1]["id"]})).json()
+    assert [blob["id"] for blob in rest] == ids[2:]
+
+
+def decode(content: bytes) -> Image.Image:
+    return Image.open(io.BytesIO(content))
+
+
+async def test_read_resized_variant(test_client: "AsyncTestClient", setup_png: UUID) -> None:
+    result = await test_client.get(f"image/{setup_png}", params={"width": 100, "format": "webp"})
+    assert result.status_code == 200
+    assert result.headers["content-type"] == "image/webp"
+    image = decode(result.content)
+    assert (image.format, image.size) == ("WEBP", (100, 50))
+    again = await test_client.get(f"image/{setup_png}", params={"width": 100, "format": "webp"})
+    assert again.content == result.content
+    assert len(list((DerivativePath / "test").iterdir())) == 1
+
+
+async def test_variant_is_never_upscaled(test_client: "AsyncTestClient", setup_png: UUID) -> None:
+    result = await test_client.get(f"image/{setup_png}", params={"width": 1000, "format": "jpeg"})
+    assert result.headers["content-type"] == "image/jpeg"
+    assert decode(result.content).size == (400, 200)
+
+
+@pytest.mark.parametrize(
+    "accept, expected",
+    [("image/webp,*/*", "WEBP"), ("image/jpeg;q=0.9,image/webp;q=0.5", "JPEG"), ("*/*", "JPEG")],
+)
+async def test_resized_variant_format_follows_accept(
+    test_client: "AsyncTestClient", setup_png: UUID, accept: str, expected: str
+) -> None:
+    result = await test_client.get(f"image/{setup_png}", params={"width": 40}, headers={"Accept": accept})
+    assert result.headers["vary"] == "Accept"
+    assert decode(result.content).format == expected
+
+
+@pytest.mark.parametrize("accept", ["image/avif,image/webp,*/*", "image/*"])
+async def test_plain_read_serves_original_whatever_accept(
+    test_client: "AsyncTestClient", setup_png: UUID, accept: str
+) -> None:
+    result = await test_client.get(f"image/{setup_png}", headers={"Accept": accept})
+    assert result.content == PNG_IMAGE
+    assert result.headers["content-type"] == "image/png"
+    assert "vary" not in result.headers
+
+
+async def test_variant_follows_updated_blob(
+    test_client: "AsyncTestClient", setup_png: UUID, storage: "StorageServer"
+) -> None:
+    params: dict[str, str | int] = {"width": 100, "format": "webp"}
+    assert decode((await test_client.get(f"image/{setup_png}", params=params)).content).size == (100, 50)
+    await storage.update(make_png(200, 200), setup_png)
+    assert decode((await test_client.get(f"image/{setup_png}", params=params)).content).size == (100, 100)
+
+
+async def test_unknown_variant_format_throws(test_client: "AsyncTestClient", setup_png: UUID) -> None:
+    result = await test_client.get(f"image/{setup_png}", params={"format": "gif"})
+    assert result.status_code == 400
+
+
+async def test_variant_of_oversized_image(test_client: "AsyncTestClient", storage: "StorageServer") -> None:
+    # Only the header is read, its dimensions are past Pillow's decompression bomb limit
+    header = struct.pack(">IIBBBBB", 30000, 30000, 8, 0, 0, 0, 0)
+    image = b"\x89PNG\r\n\x1a\n" + png_chunk(b"IHDR", header) + png_chunk(b"IEND", b"")
+    image_id = await storage.create(image)
+    result = await test_client.get(f"image/{image_id}", params={"width": 100})
+    assert result.status_code == 422
+
+
+async def test_variant_evicted_while_sent(storage: "StorageServer", tmp_path: Path) -> None:
+    variants = ImageVariants(DerivativeCache(tmp_path, 1024 * 1024), workers=1)
+    file, size = await variants.open(storage, await storage.create(PNG_IMAGE), 100, "png")
+    await variants.cache.delete_all()
+    response = await stream_open_file(file, size)
+    body = b"".join([chunk async for chunk in body_chunks(response)])
+    assert (len(body), decode(body).size) == (size, (100, 50))
+    await variants.stop(Litestar())
+
+
+async def test_variant_of_non_image(test_client: "AsyncTestClient", setup: UUID) -> None:
+    result = await test_client.get(f"image/{setup}", params={"format": "webp"})
+    assert result.status_code == 415
+    result = await test_client.get(f"image/{setup}", headers={"Accept": "image/webp"})
+    assert result.status_code == 200
+    assert result.content == FIRST_IMAGE
+
+
+@pytest.fixture(scope="function")
+def image_redirects(monkeypatch: pytest.MonkeyPatch) -> Generator[None, None, None]:
+    monkeypatch.setenv("IMAGE_REDIRECTS", "1")
+    get_settings.cache_clear()
+    yield
+    get_settings.cache_clear()
+
+
+@pytest.mark.usefixtures("image_redirects")
+async def test_originals_redirect_to_presigned_urls() -> None:
+    fake_s3 = FakeS3()
+    storage = S3Storage(ENDPOINT, BUCKET, ACCESS_KEY, SECRET_KEY, transport=httpx.ASGITransport(app=fake_s3))
+    image_id = await storage.create(FIRST_IMAGE)
+    variants = ImageVariants(DerivativeCache(DerivativePath / "test", 1024), workers=1)
+    app = Litestar(
+        [ImageController],
+        dependencies={
+            "storage": Provide(lambda: storage, sync_to_thread=False),
+            # Never started, originals do not go through it
+            "image_variants": Provide(lambda: variants, sync_to_thread=False),
+        },
+    )
+    async with AsyncTestClient(app=app) as client:
+        response = await client.get(f"image/{image_id}", headers={"Range": "bytes=0-4"}, follow_redirects=False)
+    assert response.status_code == 307
+    assert "Get" not in " ".join(fake_s3.calls)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=fake_s3)) as s3_client:
+        image = await s3_client.get(response.headers["location"], headers={"Range": "bytes=0-4"})
+    assert image.status_code == 206
+    assert image.content == FIRST_IMAGE[:5]
+    await storage.aclose()
+
+
+@pytest.mark.usefixtures("image_redirects")
+async def test_backends_without_presigned_urls_stream(test_client: "AsyncTestClient", setup: UUID) -> None:
+    result = await test_client.get(f"image/{setup}", follow_redirects=False)
+    assert result.status_code == 200
+    assert result.content == FIRST_IMAGE
@@ -0,0 +1,58 @@
+import json
+
+import pytest
+from litestar.testing import AsyncTestClient
+
+from src.service.metrics import generation_duration, http_request_duration, http_request_sql_statements
+from tests.helpers import wait_for_job
+
+
+def count(histogram_series: object) -> int:
+    return getattr(histogram_series, "count", 0)
+
+
+async def test_metrics_are_exposed_in_text_format(test_client: "AsyncTestClient") -> None:
+    project_id = (await test_client.post("project", json={"name": "metrics"})).json()["id"]
+    await test_client.get(f"project/{project_id}")
+    res = await test_client.get("metrics")
+    assert res.status_code == 200
+    assert res.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert "# TYPE http_request_duration_seconds histogram" in res.text
+    assert 'http_request_duration_seconds_count{method="GET",route="/project/{id:uuid}",status="200"}' in res.text
+    assert "sql_statement_duration_seconds_count" in res.text
+    await test_client.delete(f"project/{project_id}")
+
+
+@pytest.mark.usefixtures("dto_serialization")
+async def test_requests_are_labelled_by_route_and_status(test_client: "AsyncTestClient") -> None:
+    project_id = (await test_client.post("project", json={"name": "metrics"})).json()["id"]
+    route = "/project/{id:uuid}"
+    found = count(http_request_duration.series("GET", route, "200"))
+    not_found = count(http_request_duration.series("GET", route, "404"))
+    statements = http_request_sql_statements.series("GET", route)
+    before = (count(statements), getattr(statements, "sum", 0))
+
+    await test_client.get(f"project/{project_id}")
+    await test_client.delete(f"project/{project_id}")
+    await test_client.get(f"project/{project_id}")
+
+    assert count(http_request_duration.series("GET", route, "200")) == found + 1
+    assert count(http_request_duration.series("GET", route, "404")) == not_found + 1
+    statements = http_request_sql_statements.series("GET", route)
+    assert statements is not None
+    assert statements.count == before[0] + 2
+    # Version, ETag, project and (no) requests, then only the version and ETag rows of the deleted project
+    assert statements.sum == before[1] + 4 + 2
+
+
+async def test_generation_duration_is_recorded(test_client: "AsyncTestClient") -> None:
+    project_id = (await test_client.post("project", json={"name": "metrics"})).json()["id"]
+    done = count(generation_duration.series("done"))
+    request = await test_client.post(
+        "request",
+        files=[("images", b"")],
+        data={"text": json.dumps(["a dog"]), "id": json.dumps([None]), "project_id": project_id},
+    )
+    assert (await wait_for_job(test_client, request))["status"] == "done"
+    assert count(generation_duration.series("done")) == done + 1
+    await test_client.delete(f"project/{project_id}")
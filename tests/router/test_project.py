@@ -1,10 +1,12 @@
 from collections.abc import AsyncGenerator
+from uuid import UUID
 
 import pytest
 from litestar.testing import AsyncTestClient
 
 from src.model import Project
-from tests.helpers import AbstractBaseTestSuite, setup
+from src.service.cache import project_tree_cache
+from tests.helpers import AbstractBaseTestSuite, AssertQueries, setup
 
 
 class TestProject(AbstractBaseTestSuite[Project]):
@@ -26,3 +28,110 @@ class TestProject(AbstractBaseTestSuite[Project]):
     async def test_read_by_name(self, test_client: "AsyncTestClient") -> None:
         result = await test_client.get("project", params={"name": "first_project"})
         assert result.status_code == 200
+
+    async def test_list_paginates_by_cursor(self, test_client: "AsyncTestClient") -> None:
+        first_page = await test_client.get("project", params={"limit": 2})
+        assert first_page.status_code == 200
+        assert len(first_page.json()) == 2
+        cursor = first_page.headers["x-next-cursor"]
+
+        second_page = await test_client.get("project", params={"limit": 2, "cursor": cursor})
+        assert second_page.status_code == 200
+        assert len(second_page.json()) == 1
+        assert "x-next-cursor" not in second_page.headers
+        ids = [item["id"] for item in first_page.json() + second_page.json()]
+        assert sorted(ids) == sorted(str(id) for id in self.fixture_id.values())
+
+    async def test_list_rejects_invalid_cursor(self, test_client: "AsyncTestClient") -> None:
+        result = await test_client.get("project", params={"cursor": "not-a-cursor"})
+        assert result.status_code == 400
+
+    async def test_list_rejects_out_of_range_limit(self, test_client: "AsyncTestClient") -> None:
+        result = await test_client.get("project", params={"limit": 0})
+        assert result.status_code == 400
+
+    async def test_read_answers_if_none_match_with_two_queries(
+        self, test_client: "AsyncTestClient", assert_queries: AssertQueries
+    ) -> None:
+        id = self.fixture_id["first"]
+        result = await test_client.get(f"project/{id}")
+        etag = result.headers["etag"]
+        project_tree_cache.clear()
+
+        # Version and ETag
+        with assert_queries(2):
+            cached = await test_client.get(f"project/{id}", headers={"If-None-Match": etag})
+        assert cached.status_code == 304
+        assert cached.content == b""
+        assert cached.headers["etag"] == etag
+
+    async def test_cached_tree_is_served_after_a_version_query(
+        self, test_client: "AsyncTestClient", assert_queries: AssertQueries
+    ) -> None:
+        id = self.fixture_id["first"]
+        first = await test_client.get(f"project/{id}")
+        hits = project_tree_cache.hits
+
+        with assert_queries(2):
+            cached = await test_client.get(f"project/{id}")
+            not_modified = await test_client.get(f"project/{id}", headers={"If-None-Match": first.headers["etag"]})
+        assert cached.json() == first.json()
+        assert cached.headers["etag"] == first.headers["etag"]
+        assert not_modified.status_code == 304
+        assert project_tree_cache.hits == hits + 2
+
+        stats = (await test_client.get("stats/cache")).json()["project_tree"]
+        assert stats["hits"] == project_tree_cache.hits
+        assert stats["entries"] >= 1
+
+    async def test_cached_tree_follows_writes_of_other_processes(self, test_client: "AsyncTestClient") -> None:
+        id = self.fixture_id["first"]
+        await test_client.get(f"project/{id}")
+        stale = project_tree_cache._entries[UUID(str(id))]
+        await test_client.put(f"project/{id}", json={"name": "renamed"})
+        # As left by a process that did not make the write
+        with project_tree_cache.filling(UUID(str(id))) as fill:
+            fill.store(stale)
+
+        result = await test_client.get(f"project/{id}")
+        assert result.json()["name"] == "renamed"
+        assert result.headers["etag"] != stale.etag
+
+    async def test_cached_tree_follows_request_and_prompt_writes(self, test_client: "AsyncTestClient") -> None:
+        id = self.fixture_id["first"]
+        await test_client.get(f"project/{id}")
+        request = (await test_client.post("request/base", json={"project_id": str(id)})).json()
+        assert [item["id"] for item in (await test_client.get(f"project/{id}")).json()["requests"]] == [request["id"]]
+
+        prompt = (
+            await test_client.post("prompt", files={"image": b""}, data={"text": "dog", "request_id": request["id"]})
+        ).json()
+        tree = (await test_client.get(f"project/{id}")).json()
+        assert [item["text"] for item in tree["requests"][0]["prompts"]] == ["dog"]
+
+        await test_client.put(
+            f"prompt/{prompt['id']}", files={"image": b""}, data={"text": "cat", "request_id": request["id"]}
+        )
+        tree = (await test_client.get(f"project/{id}")).json()
+        assert [item["text"] for item in tree["requests"][0]["prompts"]] == ["cat"]
+
+        await test_client.delete(f"prompt/{prompt['id']}")
+        assert (await test_client.get(f"project/{id}")).json()["requests"][0]["prompts"] == []
+
+        await test_client.delete(f"request/{request['id']}")
+        assert (await test_client.get(f"project/{id}")).json()["requests"] == []
+
+    async def test_cached_tree_follows_project_update(self, test_client: "AsyncTestClient") -> None:
+        id = self.fixture_id["first"]
+        await test_client.get(f"project/{id}")
+        await test_client.put(f"project/{id}", json={"name": "renamed"})
+        assert (await test_client.get(f"project/{id}")).json()["name"] == "renamed"
+
+    async def test_etag_changes_with_the_project_graph(self, test_client: "AsyncTestClient") -> None:
+        id = self.fixture_id["first"]
+        etag = (await test_client.get(f"project/{id}")).headers["etag"]
+        await test_client.post("request/base", json={"project_id": str(id)})
+        changed = await test_client.get(f"project/{id}", headers={"If-None-Match": etag})
+        assert changed.status_code == 200
+        assert changed.headers["etag"] != etag
+        assert len(changed.json()["requests"]) == 1
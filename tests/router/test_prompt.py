@@ -167,3 +167,37 @@ async def test_update_new_prompt_no_text_throws_error(
 
     res = await test_client.put(f"/prompt/{id}", files={"image": new_image}, data={"request_id": setup})
     assert res.status_code == 400
+
+
+async def test_upload_larger_than_one_chunk(test_client: AsyncTestClient, setup: UUID, storage: StorageServer) -> None:
+    image = bytes(range(256)) * 1024
+    res = await test_client.post("/prompt", files={"image": image}, data={"text": PROMPT, "request_id": setup})
+    assert res.status_code == 201
+    assert await storage.read(res.json()["image"]) == image
+
+
+async def test_list_prompts_paginates(test_client: AsyncTestClient, setup: UUID) -> None:
+    for _ in range(3):
+        await test_client.post("/prompt", files={"image": b""}, data={"text": PROMPT, "request_id": setup})
+    seen: list[str] = []
+    cursor = None
+    while True:
+        res = await test_client.get("/prompt", params={"limit": 2, **({"cursor": cursor} if cursor else {})})
+        assert res.status_code == 200, res.text
+        seen.extend(item["id"] for item in res.json())
+        cursor = res.headers.get("x-next-cursor")
+        if cursor is None:
+            break
+    assert len(seen) == len(set(seen)) == 3
+
+
+async def test_prompt_etag_follows_updates(
+    test_client: AsyncTestClient, setup_prompt: tuple[UUID, UUID], setup: UUID
+) -> None:
+    id, _ = setup_prompt
+    etag = (await test_client.get(f"/prompt/{id}")).headers["etag"]
+    assert (await test_client.get(f"/prompt/{id}", headers={"If-None-Match": f"W/{etag}"})).status_code == 304
+    await test_client.put(f"/prompt/{id}", files={"image": IMAGE}, data={"text": "new_prompt", "request_id": setup})
+    res = await test_client.get(f"/prompt/{id}", headers={"If-None-Match": etag})
+    assert res.status_code == 200
+    assert res.json()["text"] == "new_prompt"
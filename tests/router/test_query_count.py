@@ -0,0 +1,79 @@
+import json
+from collections.abc import AsyncGenerator
+from typing import Any
+
+import pytest
+from litestar.testing import AsyncTestClient
+
+from src.service.cache import project_tree_cache
+from tests.helpers import AssertQueries
+
+# The counts below are those of the DTO path, see test_serialization for the row-based one
+pytestmark = pytest.mark.usefixtures("dto_serialization")
+
+
+@pytest.fixture(scope="function")
+async def ids(test_client: "AsyncTestClient") -> AsyncGenerator[dict[str, str], None]:
+    projects = [(await test_client.post("project", json={"name": f"project_{i}"})).json()["id"] for i in range(2)]
+    requests = []
+    for project_id in projects:
+        for _ in range(2):
+            request_id = (await test_client.post("request/base", json={"project_id": project_id})).json()["id"]
+            requests.append(request_id)
+            for k in range(2):
+                await test_client.post("prompt", files={"image": b""}, data={"text": str(k), "request_id": request_id})
+    prompt_id = (await test_client.get(f"request/{requests[0]}")).json()["prompts"][0]["id"]
+    project_tree_cache.clear()
+    yield {"project": projects[0], "request": requests[0], "prompt": prompt_id}
+    for project_id in projects:
+        await test_client.delete(f"project/{project_id}")
+
+
+# Statements per route, relationships are only loaded by the routes serializing them
+ROUTES: list[tuple[str, str, dict[str, Any], int]] = [
+    ("GET", "project", {}, 1),
+    # Version, ETag, project, requests, prompts
+    ("GET", "project/{project}", {}, 5),
+    ("POST", "project", {"json": {"name": "new"}}, 3),
+    ("PUT", "project/{project}", {"json": {"name": "renamed"}}, 3),
+    # Requests and their prompts
+    ("GET", "request", {}, 2),
+    ("GET", "request/{request}", {}, 3),
+    ("POST", "request/base", {"json": {"project_id": "{project}"}}, 3),
+    # Prompts joined with their request
+    ("GET", "prompt", {}, 1),
+    ("GET", "prompt/{prompt}", {}, 2),
+    ("POST", "prompt", {"files": {"image": b""}, "data": {"text": "new", "request_id": "{request}"}}, 3),
+    ("PUT", "prompt/{prompt}", {"files": {"image": b""}, "data": {"text": "new", "request_id": "{request}"}}, 3),
+]
+
+
+@pytest.mark.parametrize(("method", "path", "kwargs", "expected"), ROUTES)
+async def test_statements_per_route(
+    test_client: "AsyncTestClient",
+    ids: dict[str, str],
+    assert_queries: AssertQueries,
+    method: str,
+    path: str,
+    kwargs: dict[str, Any],
+    expected: int,
+) -> None:
+    for key in ("json", "data"):
+        if key in kwargs:
+            kwargs = {**kwargs, key: {name: value.format(**ids) for name, value in kwargs[key].items()}}
+    with assert_queries(expected):
+        res = await test_client.request(method, path.format(**ids), **kwargs)
+    assert res.status_code < 300, res.text
+
+
+@pytest.mark.parametrize("size", [1, 10])
+async def test_batch_statements_do_not_grow_with_its_size(
+    test_client: "AsyncTestClient", ids: dict[str, str], assert_queries: AssertQueries, size: int
+) -> None:
+    items = [{"project_id": ids["project"], "text": ["a", "b"]} for _ in range(size)]
+    # Known projects, then requests, prompts and jobs
+    with assert_queries(4):
+        res = await test_client.post(
+            "request/batch", files=[("images", b"")] * 2 * size, data={"requests": json.dumps(items)}
+        )
+    assert res.status_code == 202, res.text
@@ -1,19 +1,26 @@
+import asyncio
 import json
 import random
 from collections.abc import AsyncGenerator, Generator
 from typing import Any
-from uuid import UUID
+from uuid import UUID, uuid4
 
 import pytest
+from httpx import Response
 from litestar.testing import AsyncTestClient
+from sqlalchemy import create_engine, delete, update
 
-from src.model import Project, Request
+from src.model import Job, JobStatus, Project, Request
+from src.router.prompt import store_images
+from src.service.metrics import generation_duration, storage_operation_duration
 from src.service.storage.base import StorageServer
 from tests.helpers import (
     AbstractBaseTestSuite,
     FixtureManager,
     ResponseValidator,
     setup,
+    wait_for_job,
+    wait_for_location,
 )
 
 fixture_manager = FixtureManager()
@@ -137,7 +144,8 @@ async def setup_prompts_with_image(
             "project_id": str(project_id),
         },
     )
-    assert request.status_code == 201
+    assert request.status_code == 202
+    assert (await wait_for_job(test_client, request))["status"] == "done"
     yield project_id, request.json()["id"]
 
 
@@ -155,7 +163,8 @@ async def setup_prompts_with_and_without_image(
             "project_id": str(project_id),
         },
     )
-    assert request.status_code == 201
+    assert request.status_code == 202
+    assert (await wait_for_job(test_client, request))["status"] == "done"
     yield project_id, request.json()["id"]
 
 
@@ -209,7 +218,8 @@ async def test_given_request_with_and_without_image_update_remove_image_from_pro
             "project_id": str(project_id),
         },
     )
-    assert request.status_code == 200
+    assert request.status_code == 202
+    await wait_for_job(test_client, request)
 
     # Validate
     no_image_prompt = await test_client.get(f"prompt/{no_image}")
@@ -236,7 +246,8 @@ async def test_given_request_with_and_without_image_update_add_image_from_prompt
             "project_id": str(project_id),
         },
     )
-    assert request.status_code == 200
+    assert request.status_code == 202
+    await wait_for_job(test_client, request)
 
     # Validate
     no_image_prompt = await test_client.get(f"prompt/{no_image}")
@@ -265,7 +276,8 @@ async def test_given_request_with_and_without_image_update_add_null_id_add_new_p
             "project_id": str(project_id),
         },
     )
-    assert request.status_code == 200
+    assert request.status_code == 202
+    await wait_for_job(test_client, request)
     request = await test_client.get(f"request/{request_id}")
     assert len(request.json()["prompts"]) == 3
     new_prompt_id = None
@@ -304,7 +316,8 @@ async def test_given_request_with_and_without_image_update_no_remention_previous
             "project_id": str(project_id),
         },
     )
-    assert request.status_code == 200
+    assert request.status_code == 202
+    await wait_for_job(test_client, request)
     request = await test_client.get(f"request/{request_id}")
     assert len(request.json()["prompts"]) == 2
     new_prompt_id = None
@@ -342,7 +355,8 @@ async def test_given_request_with_and_without_image_update_remove_previous_promp
             "project_id": str(project_id),
         },
     )
-    assert request.status_code == 200
+    assert request.status_code == 202
+    await wait_for_job(test_client, request)
     request = await test_client.get(f"request/{request_id}")
     assert len(request.json()["prompts"]) == 1
     new_prompt_id = None
@@ -466,3 +480,329 @@ async def test_delete_request_cleans_up_output(
     request = await test_client.delete(f"request/{request_id}")
     assert request.status_code == 204
     assert await storage.read(output) is None
+
+
+async def test_request_etag_changes_when_a_prompt_is_removed(
+    test_client: "AsyncTestClient", get_prompts_with_and_without_image: tuple[UUID, UUID, UUID, UUID]
+) -> None:
+    _, request_id, _, no_image = get_prompts_with_and_without_image
+    etag = (await test_client.get(f"request/{request_id}")).headers["etag"]
+    assert (await test_client.get(f"request/{request_id}", headers={"If-None-Match": etag})).status_code == 304
+    await test_client.delete(f"prompt/{no_image}")
+    res = await test_client.get(f"request/{request_id}", headers={"If-None-Match": etag})
+    assert res.status_code == 200
+    assert len(res.json()["prompts"]) == 1
+
+
+async def test_delete_project_cleans_up_requests_prompts_and_images(
+    test_client: "AsyncTestClient", setup_project: UUID, storage: "StorageServer"
+) -> None:
+    project_id = setup_project
+    request_ids = []
+    for image in (FIRST_IMAGE, SECOND_IMAGE):
+        request = await test_client.post(
+            "request",
+            files=[("images", image), ("images", b"")],
+            data={
+                "text": json.dumps([FIRST_PROMPT, SECOND_PROMPT]),
+                "id": json.dumps([None, None]),
+                "project_id": str(project_id),
+            },
+        )
+        assert (await wait_for_job(test_client, request))["status"] == "done"
+        request_ids.append(request.json()["id"])
+    requests = [(await test_client.get(f"request/{id}")).json() for id in request_ids]
+    prompt_ids = [prompt["id"] for request in requests for prompt in request["prompts"]]
+    blob_ids = [request["output_image"] for request in requests]
+    blob_ids += [prompt["image"] for request in requests for prompt in request["prompts"] if prompt["image"]]
+    assert len(blob_ids) == 4
+
+    response = await test_client.delete(f"project/{project_id}")
+    assert response.status_code == 204
+    for id in request_ids:
+        assert (await test_client.get(f"request/{id}")).status_code == 404
+    for id in prompt_ids:
+        assert (await test_client.get(f"prompt/{id}")).status_code == 404
+    for id in blob_ids:
+        assert await storage.read(id) is None
+
+
+async def test_update_replaces_output_once_job_is_done(
+    test_client: "AsyncTestClient", setup_prompts_with_image: tuple[UUID, UUID], storage: "StorageServer"
+) -> None:
+    project_id, request_id = setup_prompts_with_image
+    request = await test_client.get(f"request/{request_id}")
+    previous_output = request.json()["output_image"]
+    request = await test_client.put(
+        f"request/{request_id}",
+        files=[("images", FIRST_IMAGE)],
+        data={
+            "text": json.dumps([UPDATE_PROMPT]),
+            "id": json.dumps([None]),
+            "project_id": str(project_id),
+        },
+    )
+    assert request.status_code == 202
+    job = await wait_for_job(test_client, request)
+    assert job["status"] == "done"
+    assert job["request_id"] == request_id
+    request = await test_client.get(f"request/{request_id}")
+    output = request.json()["output_image"]
+    assert output not in (None, previous_output)
+    assert await storage.read(output) is not None
+    assert await storage.read(previous_output) is None
+
+
+async def test_identical_prompts_reuse_the_generated_output(
+    test_client: "AsyncTestClient", setup_project: UUID, storage: "StorageServer"
+) -> None:
+    files = [("images", FIRST_IMAGE), ("images", b"")]
+    data = {
+        "text": json.dumps([FIRST_PROMPT, SECOND_PROMPT]),
+        "id": json.dumps([None, None]),
+        "project_id": str(setup_project),
+    }
+    cached = generation_duration.series("cached")
+    before_hits = cached.count if cached else 0
+    outputs = []
+    for _ in range(2):
+        request = await test_client.post("request", files=files, data=data)
+        assert (await wait_for_job(test_client, request))["status"] == "done"
+        outputs.append((request.json()["id"], (await test_client.get(f"request/{request.json()['id']}")).json()))
+    cached = generation_duration.series("cached")
+    assert cached is not None
+    assert cached.count == before_hits + 1
+    (first_id, first), (_, second) = outputs
+    assert first["output_image"] != second["output_image"]
+    assert await storage.read(second["output_image"]) == await storage.read(first["output_image"])
+    # Each request owns its output
+    assert (await test_client.delete(f"request/{first_id}")).status_code == 204
+    assert await storage.read(second["output_image"]) is not None
+
+
+async def resend(
+    test_client: "AsyncTestClient", project_id: UUID, request_id: UUID, texts: list[str], images: list[bytes]
+) -> Response:
+    prompts = (await test_client.get(f"request/{request_id}")).json()["prompts"]
+    prompts.sort(key=lambda prompt: prompt["text"])
+    return await test_client.put(
+        f"request/{request_id}",
+        files=[("images", image) for image in images],
+        data={
+            "text": json.dumps(texts),
+            "id": json.dumps([prompt["id"] for prompt in prompts]),
+            "project_id": str(project_id),
+        },
+    )
+
+
+async def test_update_without_changes_skips_writes_and_generation(
+    test_client: "AsyncTestClient", setup_prompts_with_and_without_image: tuple[UUID, UUID]
+) -> None:
+    project_id, request_id = setup_prompts_with_and_without_image
+    before = (await test_client.get(f"request/{request_id}")).json()
+    texts = sorted(prompt["text"] for prompt in before["prompts"])
+    images = [FIRST_IMAGE if text == FIRST_PROMPT else b"" for text in texts]
+    writes = storage_operation_duration.series("update")
+    before_writes = writes.count if writes else 0
+    response = await resend(test_client, project_id, request_id, texts, images)
+    assert response.status_code == 200
+    writes = storage_operation_duration.series("update")
+    assert (writes.count if writes else 0) == before_writes
+    assert "location" not in response.headers
+    assert response.headers["x-update-summary"] == "created=0, updated=0, deleted=0, unchanged=2"
+    after = (await test_client.get(f"request/{request_id}")).json()
+    for request in (before, after):
+        request["prompts"].sort(key=lambda prompt: prompt["id"])
+    assert after == before
+
+
+async def test_update_only_writes_changed_prompts(
+    test_client: "AsyncTestClient", setup_prompts_with_and_without_image: tuple[UUID, UUID], storage: "StorageServer"
+) -> None:
+    project_id, request_id = setup_prompts_with_and_without_image
+    before = {prompt["text"]: prompt for prompt in (await test_client.get(f"request/{request_id}")).json()["prompts"]}
+    texts = sorted(before)
+    # Same image under a new text, a new image for the prompt without one
+    images = [FIRST_IMAGE if text == FIRST_PROMPT else SECOND_IMAGE for text in texts]
+    response = await resend(test_client, project_id, request_id, [f"{text}_renamed" for text in texts], images)
+    assert response.status_code == 202
+    assert response.headers["x-update-summary"] == "created=0, updated=2, deleted=0, unchanged=0"
+    assert (await wait_for_job(test_client, response))["status"] == "done"
+    after = {prompt["text"]: prompt for prompt in (await test_client.get(f"request/{request_id}")).json()["prompts"]}
+    assert after[f"{FIRST_PROMPT}_renamed"]["image"] == before[FIRST_PROMPT]["image"]
+    assert await storage.read(after[f"{SECOND_PROMPT}_renamed"]["image"]) == SECOND_IMAGE
+
+
+async def test_update_responds_with_the_updated_prompts(
+    test_client: "AsyncTestClient", setup_prompts_with_and_without_image: tuple[UUID, UUID]
+) -> None:
+    project_id, request_id = setup_prompts_with_and_without_image
+    prompts = {prompt["text"]: prompt for prompt in (await test_client.get(f"request/{request_id}")).json()["prompts"]}
+    # Keep the first prompt, drop the second and add a new one
+    response = await test_client.put(
+        f"request/{request_id}",
+        files=[("images", FIRST_IMAGE), ("images", UPDATE_IMAGE)],
+        data={
+            "text": json.dumps([FIRST_PROMPT, UPDATE_PROMPT]),
+            "id": json.dumps([prompts[FIRST_PROMPT]["id"], None]),
+            "project_id": str(project_id),
+        },
+    )
+    assert response.status_code == 202
+    assert response.headers["x-update-summary"] == "created=1, updated=0, deleted=1, unchanged=1"
+    assert sorted(prompt["text"] for prompt in response.json()["prompts"]) == [FIRST_PROMPT, UPDATE_PROMPT]
+    await wait_for_job(test_client, response)
+
+
+async def test_create_for_unknown_project_not_found(test_client: "AsyncTestClient") -> None:
+    request = await test_client.post(
+        "request",
+        files=[("images", FIRST_IMAGE)],
+        data={"text": json.dumps([FIRST_PROMPT]), "id": json.dumps([None]), "project_id": str(uuid4())},
+    )
+    assert request.status_code == 404
+
+
+async def test_create_removes_images_of_failed_insert(
+    test_client: "AsyncTestClient", storage: "StorageServer", monkeypatch: pytest.MonkeyPatch
+) -> None:
+    project_id = (await test_client.post("project", json={"name": "deleted"})).json()["id"]
+    stored: list[UUID | None] = []
+
+    async def store_then_delete_project(*args: Any) -> list[UUID | None]:
+        stored.extend(await store_images(*args))
+        # The project goes away between the check and the insert
+        with create_engine("sqlite:///test.sqlite").begin() as connection:
+            connection.execute(delete(Project).where(Project.id == UUID(project_id)))
+        return stored
+
+    monkeypatch.setattr("src.router.request.store_images", store_then_delete_project)
+    request = await test_client.post(
+        "request",
+        files=[("images", FIRST_IMAGE)],
+        data={"text": json.dumps([FIRST_PROMPT]), "id": json.dumps([None]), "project_id": project_id},
+    )
+    assert request.status_code == 409
+    assert stored[0] is not None
+    assert await storage.read(stored[0]) is None
+
+
+async def test_failure_of_a_cancelled_job_keeps_it_cancelled(
+    test_client: "AsyncTestClient",
+    setup_project: UUID,
+    monkeypatch: pytest.MonkeyPatch,
+    caplog: pytest.LogCaptureFixture,
+) -> None:
+    async def cancel_then_fail(*_: Any) -> UUID:
+        # As a newer job of the request would, while this one runs
+        with create_engine("sqlite:///test.sqlite").begin() as connection:
+            connection.execute(update(Job).values(status=JobStatus.CANCELLED))
+        raise RuntimeError("generation failed")
+
+    monkeypatch.setattr("src.service.jobs.queue.generate_output", cancel_then_fail)
+    request = await test_client.post(
+        "request",
+        files=[("images", FIRST_IMAGE)],
+        data={"text": json.dumps([f"{uuid4()}"]), "id": json.dumps([None]), "project_id": str(setup_project)},
+    )
+    async with asyncio.timeout(5):
+        while "Generation job" not in caplog.text:
+            await asyncio.sleep(0.01)
+    assert (await wait_for_job(test_client, request))["status"] == "cancelled"
+
+
+async def test_unknown_job_not_found(test_client: "AsyncTestClient") -> None:
+    response = await test_client.get(f"job/{uuid4()}")
+    assert response.status_code == 404
+
+
+async def test_create_many_prompts_keeps_text_and_image_pairs(
+    test_client: "AsyncTestClient", setup_project: UUID, storage: "StorageServer"
+) -> None:
+    texts = [f"prompt_{i}" for i in range(12)]
+    images = [f"image_{i}".encode() if i % 3 else b"" for i in range(12)]
+    request = await test_client.post(
+        "request",
+        files=[("images", image) for image in images],
+        data={"text": json.dumps(texts), "id": json.dumps([None] * len(texts)), "project_id": str(setup_project)},
+    )
+    assert request.status_code == 202
+    await wait_for_job(test_client, request)
+    prompts = (await test_client.get(f"request/{request.json()['id']}")).json()["prompts"]
+    assert len(prompts) == len(texts)
+    for prompt in prompts:
+        image = images[texts.index(prompt["text"])]
+        if image:
+            assert await storage.read(prompt["image"]) == image
+        else:
+            assert prompt["image"] is None
+
+
+async def test_cached_project_tree_shows_generated_output(test_client: "AsyncTestClient", setup_project: UUID) -> None:
+    request = await test_client.post(
+        "request",
+        files=[("images", FIRST_IMAGE)],
+        data={"text": json.dumps([FIRST_PROMPT]), "id": json.dumps([None]), "project_id": str(setup_project)},
+    )
+    await test_client.get(f"project/{setup_project}")
+    assert (await wait_for_job(test_client, request))["status"] == "done"
+    output = (await test_client.get(f"request/{request.json()['id']}")).json()["output_image"]
+    tree = (await test_client.get(f"project/{setup_project}")).json()
+    assert [item["output_image"] for item in tree["requests"]] == [output]
+
+
+async def test_batch_creates_every_request_with_its_prompts(
+    test_client: "AsyncTestClient", setup_project: UUID, storage: "StorageServer"
+) -> None:
+    items = [{"project_id": str(setup_project), "text": [f"prompt_{i}_{k}" for k in range(i)]} for i in range(4)]
+    images = [f"image_{i}_{k}".encode() if k else b"" for i in range(4) for k in range(i)]
+    response = await test_client.post(
+        "request/batch",
+        files=[("images", image) for image in images],
+        data={"requests": json.dumps(items)},
+    )
+    assert response.status_code == 202, response.text
+    results = response.json()
+    assert [result["status_code"] for result in results] == [202] * 4
+    for i, result in enumerate(results):
+        job = await wait_for_location(test_client, f"/job/{result['job_id']}")
+        assert job["status"] == "done"
+        request = (await test_client.get(f"request/{result['id']}")).json()
+        assert sorted(prompt["text"] for prompt in request["prompts"]) == items[i]["text"]
+        assert request["output_image"] is not None
+        for prompt in result["prompts"]:
+            k = int(prompt["text"].rsplit("_", 1)[1])
+            if k:
+                assert await storage.read(prompt["image"]) == f"image_{i}_{k}".encode()
+            else:
+                assert prompt["image"] is None
+    tree = (await test_client.get(f"project/{setup_project}")).json()
+    assert len(tree["requests"]) == 4
+
+
+async def test_batch_reports_unknown_projects_per_item(test_client: "AsyncTestClient", setup_project: UUID) -> None:
+    items = [
+        {"project_id": str(uuid4()), "text": [FIRST_PROMPT]},
+        {"project_id": str(setup_project), "text": [SECOND_PROMPT]},
+    ]
+    response = await test_client.post(
+        "request/batch",
+        files=[("images", FIRST_IMAGE), ("images", SECOND_IMAGE)],
+        data={"requests": json.dumps(items)},
+    )
+    assert response.status_code == 202
+    missing, created = response.json()
+    assert (missing["status_code"], missing["id"]) == (404, None)
+    assert created["status_code"] == 202
+    assert (await test_client.get(f"request/{created['id']}")).json()["prompts"][0]["text"] == SECOND_PROMPT
+
+
+@pytest.mark.parametrize(
+    "requests",
+    ["not json", json.dumps([{"text": ["a"]}]), json.dumps([{"project_id": str(uuid4()), "text": ["a", "b"]}])],
+    ids=["malformed", "missing_project", "missing_image"],
+)
+async def test_batch_rejects_invalid_body(test_client: "AsyncTestClient", requests: str) -> None:
+    response = await test_client.post("request/batch", files=[("images", FIRST_IMAGE)], data={"requests": requests})
+    assert response.status_code == 400
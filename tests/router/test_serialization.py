@@ -0,0 +1,75 @@
+from collections.abc import AsyncGenerator, Generator
+from uuid import UUID, uuid4
+
+import pytest
+from litestar.testing import AsyncTestClient
+
+from src.model import Request
+from src.router.typing.types import RequestDTO
+from src.router.utils.dto import DTOGenerator
+from src.service.cache import project_tree_cache
+from src.settings import get_settings
+
+
+@pytest.fixture(scope="function")
+async def project(test_client: "AsyncTestClient") -> AsyncGenerator[UUID, None]:
+    project_id = (await test_client.post("project", json={"name": "project"})).json()["id"]
+    for i in range(3):
+        request_id = (await test_client.post("request/base", json={"project_id": project_id})).json()["id"]
+        for k in range(i):
+            image = b"image" if k % 2 else b""
+            await test_client.post(
+                "prompt", files={"image": image}, data={"text": f"{i}.{k}", "request_id": request_id}
+            )
+    await test_client.post("project", json={"name": "empty"})
+    yield project_id
+    await test_client.delete(f"project/{project_id}")
+
+
+@pytest.fixture(scope="function")
+def fast_serialization(monkeypatch: pytest.MonkeyPatch) -> Generator[None, None, None]:
+    monkeypatch.setenv("FAST_SERIALIZATION", "1")
+    get_settings.cache_clear()
+    yield
+    get_settings.cache_clear()
+
+
+async def read_all(test_client: "AsyncTestClient", project: UUID) -> list[bytes]:
+    project_tree_cache.clear()
+    bodies = [(await test_client.get(f"project/{project}")).content]
+    for path in ("request", "prompt"):
+        for limit in (2, 100):
+            res = await test_client.get(path, params={"limit": limit})
+            assert res.status_code == 200
+            bodies.append(res.content)
+            cursor = res.headers.get("x-next-cursor")
+            if cursor is not None:
+                bodies.append((await test_client.get(path, params={"limit": limit, "cursor": cursor})).content)
+    return bodies
+
+
+async def test_fast_serialization_matches_dto_output(
+    test_client: "AsyncTestClient", project: UUID, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    expected = await read_all(test_client, project)
+    monkeypatch.setenv("FAST_SERIALIZATION", "1")
+    get_settings.cache_clear()
+    try:
+        assert get_settings().fast_serialization
+        assert await read_all(test_client, project) == expected
+    finally:
+        get_settings.cache_clear()
+
+
+async def test_fast_serialization_unknown_project_not_found(
+    test_client: "AsyncTestClient", fast_serialization: None
+) -> None:
+    assert (await test_client.get(f"project/{uuid4()}")).status_code == 404
+
+
+def test_dto_classes_are_built_once_per_config() -> None:
+    assert RequestDTO.read_dto is RequestDTO.read_dto
+    assert RequestDTO.write_dto is not RequestDTO.read_dto
+    same_config = DTOGenerator[Request](read_kwargs={"max_nested_depth": 1}, write_kwargs={"max_nested_depth": 0})
+    assert same_config.read_dto is RequestDTO.read_dto
+    assert DTOGenerator[Request]().read_dto is not RequestDTO.read_dto
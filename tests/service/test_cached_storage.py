@@ -0,0 +1,190 @@
+import asyncio
+from collections.abc import AsyncGenerator
+from uuid import UUID, uuid4
+
+import pytest
+from litestar.exceptions import HTTPException
+from litestar.response import Stream
+
+from src.service.storage import BlobInfo, CachedStorage, LocalFileStorage
+from src.service.storage.streaming import CHUNK_SIZE, body_chunks
+
+IMAGE = b"image"
+OTHER_IMAGE = b"other_image"
+
+
+class CountingStorage(LocalFileStorage):
+    """Local storage counting reads and lookups, whose reads wait for `gate` once it is set."""
+
+    def __init__(self) -> None:
+        super().__init__("test", content_addressed=True)
+        self.reads = 0
+        self.lookups = 0
+        self.gate: asyncio.Event | None = None
+
+    async def read(self, id: UUID) -> bytes | None:
+        self.reads += 1
+        data = await super().read(id)
+        if self.gate is not None:
+            await self.gate.wait()
+        return data
+
+    async def info(self, id: UUID) -> BlobInfo | None:
+        self.lookups += 1
+        return await super().info(id)
+
+    async def stream(self, id: UUID, range: str | None = None) -> Stream:
+        self.lookups += 1
+        return await super().stream(id, range)
+
+
+async def body(response: Stream) -> bytes:
+    return b"".join([chunk async for chunk in body_chunks(response)])
+
+
+@pytest.fixture(scope="function")
+async def inner() -> AsyncGenerator[CountingStorage, None]:
+    storage = CountingStorage()
+    yield storage
+    await storage.delete_all()
+
+
+@pytest.fixture(scope="function")
+def cached(inner: CountingStorage) -> CachedStorage:
+    return CachedStorage(inner, max_bytes=32, max_entry_bytes=16)
+
+
+async def test_reads_are_served_from_memory(cached: CachedStorage, inner: CountingStorage) -> None:
+    id = await inner.create(IMAGE)
+    assert await cached.read(id) == IMAGE
+    assert await cached.read(id) == IMAGE
+    assert await cached.read(str(id)) == IMAGE  # type: ignore[arg-type]
+    assert inner.reads == 1
+    assert cached.stats() == {
+        "entries": 1,
+        "bytes": len(IMAGE),
+        "max_bytes": 32,
+        "hits": 2,
+        "misses": 1,
+        "hit_ratio": 2 / 3,
+        "evictions": 0,
+    }
+
+
+async def test_writes_go_through(cached: CachedStorage, inner: CountingStorage) -> None:
+    async def chunks() -> AsyncGenerator[bytes, None]:
+        yield OTHER_IMAGE[:5]
+        yield OTHER_IMAGE[5:]
+
+    created = await cached.create(IMAGE)
+    streamed = await cached.create_stream(chunks())
+    assert await cached.read(created) == IMAGE
+    assert await cached.read(streamed) == OTHER_IMAGE
+    await cached.update(OTHER_IMAGE, created)
+    assert await cached.read(created) == OTHER_IMAGE
+    assert await inner.read(created) == OTHER_IMAGE
+    assert inner.reads == 1
+    assert cached.misses == 0
+
+
+async def test_deletes_drop_cached_content(cached: CachedStorage) -> None:
+    first, second, third = [await cached.create(IMAGE) for _ in range(3)]
+    await cached.delete(first)
+    await cached.delete_many([second])
+    assert await cached.read(first) is None
+    assert await cached.read(second) is None
+    await cached.delete_all()
+    assert cached.size == 0
+    assert await cached.read(third) is None
+
+
+async def test_least_recently_used_blobs_are_evicted(cached: CachedStorage, inner: CountingStorage) -> None:
+    ids = [await cached.create(bytes([index]) * 12) for index in range(3)]
+    assert cached.evictions == 1
+    assert cached.size == 24
+    await cached.read(ids[1])
+    await cached.create(b"x" * 12)
+    # The first blob was evicted, then the third as the second was read since
+    assert await cached.read(ids[1]) == bytes([1]) * 12
+    assert inner.reads == 0
+    assert await cached.read(ids[2]) == bytes([2]) * 12
+    assert inner.reads == 1
+
+
+async def test_large_blobs_are_left_to_the_backend(cached: CachedStorage, inner: CountingStorage) -> None:
+    data = bytes(range(20))
+    id = await cached.create(data)
+    assert cached.size == 0
+    response = await cached.stream(id, "bytes=2-4")
+    assert response.status_code == 206
+    assert response.headers["Content-Range"] == "bytes 2-4/20"
+    assert inner.reads == 0
+    assert await cached.read(id) == data
+    assert cached.size == 0
+
+
+async def test_large_blobs_stream_in_one_backend_call(cached: CachedStorage, inner: CountingStorage) -> None:
+    data = bytes(range(40))
+    id = await inner.create(data)
+    for _ in range(2):
+        response = await cached.stream(id)
+        assert response.headers["Content-Length"] == "40"
+        assert await body(response) == data
+    # The first stream found the blob too large while passing it on, the second went straight to the backend
+    assert inner.lookups == 2
+    assert cached.size == 0
+
+
+async def test_streams_pass_chunks_on_as_they_are_read(inner: CountingStorage) -> None:
+    data = bytes(3 * CHUNK_SIZE)
+    id = await inner.create(data)
+    cached = CachedStorage(inner, max_bytes=len(data), max_entry_bytes=len(data))
+    chunks = aiter(body_chunks(await cached.stream(id)))
+    assert await anext(chunks) == data[:CHUNK_SIZE]
+    assert cached.size == 0
+    assert b"".join([chunk async for chunk in chunks]) == data[CHUNK_SIZE:]
+    # Cached once sent whole
+    assert cached.size == len(data)
+    assert await body(await cached.stream(id)) == data
+    assert inner.lookups == 1
+
+
+async def test_stream_overlapping_an_update_is_not_cached(cached: CachedStorage, inner: CountingStorage) -> None:
+    id = await inner.create(IMAGE)
+    chunks = aiter(body_chunks(await cached.stream(id)))
+    assert await anext(chunks) == IMAGE
+    await cached.update(OTHER_IMAGE, id)
+    assert [chunk async for chunk in chunks] == []
+    assert await cached.read(id) == OTHER_IMAGE
+
+
+async def test_ranges_are_served_from_memory(cached: CachedStorage, inner: CountingStorage) -> None:
+    id = await inner.create(b"0123456789")
+    response = await cached.stream(id)
+    assert response.headers["Content-Length"] == "10"
+    assert await body(response) == b"0123456789"
+    response = await cached.stream(id, "bytes=-3")
+    assert response.status_code == 206
+    assert response.headers["Content-Range"] == "bytes 7-9/10"
+    assert await body(response) == b"789"
+    with pytest.raises(HTTPException) as e:
+        await cached.stream(id, "bytes=20-")
+    assert e.value.status_code == 416
+    assert inner.lookups == 1
+    with pytest.raises(HTTPException) as e:
+        await cached.stream(uuid4())
+    assert e.value.status_code == 404
+    assert inner.lookups == 2
+
+
+async def test_read_overlapping_an_update_is_not_cached(cached: CachedStorage, inner: CountingStorage) -> None:
+    id = await inner.create(IMAGE)
+    inner.gate = asyncio.Event()
+    read = asyncio.create_task(cached.read(id))
+    await asyncio.sleep(0.05)
+    await cached.update(OTHER_IMAGE, id)
+    inner.gate.set()
+    # The read may have seen either content, it must not replace the one written
+    assert await read in (IMAGE, OTHER_IMAGE)
+    assert await cached.read(id) == OTHER_IMAGE
+    assert inner.reads == 1
@@ -0,0 +1,52 @@
+import sqlite3
+
+import pytest
+from litestar import Litestar
+from litestar.testing import AsyncTestClient
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from src.helpers import sqlite_pragmas
+from src.service.database import ReadDatabase
+from src.settings import Settings
+
+
+def read_database(test_client: AsyncTestClient[Litestar]) -> ReadDatabase:
+    database: ReadDatabase = test_client.app.state.read_database
+    return database
+
+
+async def test_connections_use_the_configured_profile(test_client: AsyncTestClient[Litestar]) -> None:
+    async with read_database(test_client).session() as session:
+        assert await session.scalar(text("PRAGMA journal_mode")) == "wal"
+        assert await session.scalar(text("PRAGMA synchronous")) == 1
+        assert await session.scalar(text("PRAGMA foreign_keys")) == 1
+
+
+async def test_read_session_rejects_writes(test_client: AsyncTestClient[Litestar]) -> None:
+    async with read_database(test_client).session() as session:
+        with pytest.raises(OperationalError, match="readonly"):
+            await session.execute(text("DELETE FROM project_table"))
+
+
+async def test_reads_see_the_last_commit_while_a_write_is_open(test_client: AsyncTestClient[Litestar]) -> None:
+    await test_client.post("project", json={"name": "committed"})
+    writer = sqlite3.connect("test.sqlite", isolation_level=None)
+    try:
+        writer.execute("PRAGMA busy_timeout=0")
+        writer.execute("BEGIN IMMEDIATE")
+        writer.execute("DELETE FROM project_table")
+        res = await test_client.get("project")
+        assert res.status_code == 200
+        assert [project["name"] for project in res.json()] == ["committed"]
+    finally:
+        writer.execute("ROLLBACK")
+        writer.close()
+
+
+@pytest.mark.parametrize(
+    "settings", [Settings(sqlite_journal_mode="WAL2"), Settings(sqlite_synchronous="LAZY")], ids=["journal", "sync"]
+)
+def test_unknown_pragma_values_are_rejected(settings: Settings) -> None:
+    with pytest.raises(ValueError, match="Unknown SQLite"):
+        sqlite_pragmas(settings)
@@ -0,0 +1,28 @@
+import asyncio
+from pathlib import Path
+
+from src.service.variants import DerivativeCache
+
+
+async def test_entries_are_registered_once_written(tmp_path: Path) -> None:
+    cache = DerivativeCache(tmp_path, max_bytes=10)
+    put = asyncio.create_task(cache.put("a", b"12345"))
+    while not put.done():
+        path = await cache.get("a")
+        assert path is None or path.read_bytes() == b"12345"
+        await asyncio.sleep(0)
+    assert await put == tmp_path / "a"
+    assert await cache.get("a") == tmp_path / "a"
+    assert cache.size == 5
+
+
+async def test_least_recently_used_entries_are_evicted(tmp_path: Path) -> None:
+    cache = DerivativeCache(tmp_path, max_bytes=10)
+    for key in "abc":
+        await cache.put(key, b"12345")
+    assert cache.size == 10
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["b", "c"]
+    await cache.get("b")
+    await cache.put("d", b"12345")
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["b", "d"]
+    assert await cache.get("c") is None
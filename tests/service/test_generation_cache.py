@@ -0,0 +1,88 @@
+from collections.abc import AsyncGenerator
+from datetime import UTC, datetime, timedelta
+from uuid import UUID, uuid4
+
+import pytest
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from src.model import GenerationResult
+from src.model.base import Base
+from src.service.cache import GenerationCache, generation_fingerprint
+
+Sessions = async_sessionmaker[AsyncSession]
+
+
+@pytest.fixture(scope="function")
+async def sessions() -> AsyncGenerator[Sessions, None]:
+    # The test client serves the app on another event loop, its engine cannot be shared
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    yield async_sessionmaker(engine)
+    await engine.dispose()
+
+
+async def store(sessions: Sessions, cache: GenerationCache, key: str, size: int) -> list[UUID]:
+    async with sessions() as session, session.begin():
+        return await cache.store(session, key, uuid4(), size)
+
+
+async def lookup(sessions: Sessions, cache: GenerationCache, key: str) -> UUID | None:
+    async with sessions() as session, session.begin():
+        return await cache.lookup(session, key)
+
+
+def test_fingerprint_depends_on_prompt_order_and_rules() -> None:
+    prompts = [("cat", None), ("dog", "digest")]
+    assert generation_fingerprint(prompts, "v1") == generation_fingerprint(list(prompts), "v1")
+    assert generation_fingerprint(prompts, "v1") != generation_fingerprint(prompts[::-1], "v1")
+    assert generation_fingerprint(prompts, "v1") != generation_fingerprint(prompts, "v2")
+    assert generation_fingerprint([("cat", None)], "v1") != generation_fingerprint([("cat", "")], "v1")
+
+
+async def test_lookup_counts_hits_and_misses(sessions: Sessions) -> None:
+    cache = GenerationCache(100, 60)
+    assert await lookup(sessions, cache, "key") is None
+    assert await store(sessions, cache, "key", 10) == []
+    assert await lookup(sessions, cache, "key") is not None
+    assert cache.stats() | {"hits": 1, "misses": 1, "evictions": 0} == cache.stats()
+
+
+async def test_second_store_of_a_fingerprint_releases_its_output(sessions: Sessions) -> None:
+    cache = GenerationCache(100, 60)
+    await store(sessions, cache, "key", 10)
+    cached = await lookup(sessions, cache, "key")
+    async with sessions() as session, session.begin():
+        output = uuid4()
+        assert await cache.store(session, "key", output, 10) == [output]
+    assert await lookup(sessions, cache, "key") == cached
+
+
+async def test_expired_entries_are_missed_and_dropped(sessions: Sessions) -> None:
+    cache = GenerationCache(100, 60)
+    await store(sessions, cache, "old", 10)
+    old = await lookup(sessions, cache, "old")
+    async with sessions() as session, session.begin():
+        await session.execute(update(GenerationResult).values(created_at=datetime.now(UTC) - timedelta(seconds=61)))
+    assert await lookup(sessions, cache, "old") is None
+    assert await store(sessions, cache, "new", 10) == [old]
+    assert cache.evictions == 1
+
+
+async def test_least_recently_used_entry_is_evicted(sessions: Sessions) -> None:
+    cache = GenerationCache(100, 60)
+    await store(sessions, cache, "first", 40)
+    await store(sessions, cache, "second", 40)
+    second = await lookup(sessions, cache, "second")
+    await lookup(sessions, cache, "first")
+    assert await store(sessions, cache, "third", 40) == [second]
+    assert await lookup(sessions, cache, "second") is None
+    assert await lookup(sessions, cache, "first") is not None
+
+
+async def test_entry_larger_than_budget_is_not_stored(sessions: Sessions) -> None:
+    cache = GenerationCache(10, 60)
+    assert len(await store(sessions, cache, "key", 11)) == 1
+    assert await lookup(sessions, cache, "key") is None
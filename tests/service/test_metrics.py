@@ -0,0 +1,60 @@
+import pytest
+
+from src.service.metrics import Registry, storage_bytes, storage_operation_duration
+from src.service.storage import InstrumentedStorage, LocalFileStorage
+from src.service.storage.streaming import body_chunks
+
+
+def test_histogram_renders_cumulative_buckets() -> None:
+    registry = Registry()
+    histogram = registry.histogram("latency_seconds", "Latency", ("route",), buckets=(0.1, 1))
+    for value in (0.05, 0.1, 0.5, 3):
+        histogram.observe(value, "/a")
+    assert registry.render().splitlines() == [
+        "# HELP latency_seconds Latency",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{route="/a",le="0.1"} 2',
+        'latency_seconds_bucket{route="/a",le="1"} 3',
+        'latency_seconds_bucket{route="/a",le="+Inf"} 4',
+        'latency_seconds_sum{route="/a"} 3.65',
+        'latency_seconds_count{route="/a"} 4',
+    ]
+
+
+def test_counter_escapes_label_values() -> None:
+    registry = Registry()
+    counter = registry.counter("hits_total", "Hits", ("path",))
+    counter.inc('a"b\\c')
+    counter.inc('a"b\\c', amount=2)
+    assert registry.render().splitlines()[-1] == 'hits_total{path="a\\"b\\\\c"} 3'
+
+
+def test_metric_names_are_unique() -> None:
+    registry = Registry()
+    registry.counter("hits_total", "Hits")
+    with pytest.raises(ValueError):
+        registry.histogram("hits_total", "Hits")
+
+
+async def test_instrumented_storage_records_operations_and_bytes() -> None:
+    storage = InstrumentedStorage(LocalFileStorage("test", content_addressed=True))
+    written, read, streamed = storage_bytes.value("create"), storage_bytes.value("read"), storage_bytes.value("stream")
+    reads = getattr(storage_operation_duration.series("read"), "count", 0)
+
+    id = await storage.create(b"image")
+    assert await storage.read(id) == b"image"
+    assert await storage.read(id) == b"image"
+
+    assert storage_bytes.value("create") == written + 5
+    assert storage_bytes.value("read") == read + 10
+    response = await storage.stream(id, "bytes=1-3")
+    assert storage_bytes.value("stream") == streamed
+    assert b"".join([chunk async for chunk in body_chunks(response)]) == b"mag"
+    assert storage_bytes.value("stream") == streamed + 3
+    series = storage_operation_duration.series("read")
+    assert series is not None
+    assert series.count == reads + 2
+    # Backend specific attributes are forwarded
+    assert storage.content_addressed
+    await storage.delete(id)
+    await storage.aclose()
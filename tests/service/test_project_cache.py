@@ -0,0 +1,67 @@
+from datetime import UTC, datetime
+from uuid import uuid4
+
+from src.service.cache import CachedTree, ProjectTreeCache
+
+VERSION = (1, datetime(2024, 1, 1, tzinfo=UTC))
+
+
+def tree(size: int) -> CachedTree:
+    return CachedTree(b"x" * size, f'"{size}"', VERSION)
+
+
+def test_get_counts_hits_and_misses() -> None:
+    cache = ProjectTreeCache(100)
+    id = uuid4()
+    assert cache.get(id, VERSION) is None
+    with cache.filling(id) as fill:
+        fill.store(tree(10))
+    assert cache.get(id, VERSION) == tree(10)
+    assert cache.stats() | {"hits": 1, "misses": 1, "entries": 1, "bytes": 10} == cache.stats()
+
+
+def test_least_recently_used_tree_is_evicted() -> None:
+    cache = ProjectTreeCache(100)
+    first, second, third = uuid4(), uuid4(), uuid4()
+    for id in (first, second):
+        with cache.filling(id) as fill:
+            fill.store(tree(40))
+    cache.get(first, VERSION)
+    with cache.filling(third) as fill:
+        fill.store(tree(40))
+    assert cache.get(second, VERSION) is None
+    assert cache.get(first, VERSION) is not None
+    assert cache.size == 80
+    assert cache.evictions == 1
+
+
+def test_tree_larger_than_budget_is_not_stored() -> None:
+    cache = ProjectTreeCache(10)
+    id = uuid4()
+    with cache.filling(id) as fill:
+        fill.store(tree(11))
+    assert cache.get(id, VERSION) is None
+    assert cache.size == 0
+
+
+def test_fill_racing_an_invalidation_is_discarded() -> None:
+    cache = ProjectTreeCache(100)
+    id = uuid4()
+    with cache.filling(id) as fill:
+        cache.invalidate(id)
+        fill.store(tree(10))
+    assert cache.get(id, VERSION) is None
+    # Later fills read the state after the write
+    with cache.filling(id) as fill:
+        fill.store(tree(10))
+    assert cache.get(id, VERSION) is not None
+
+
+def test_tree_of_another_version_is_dropped() -> None:
+    cache = ProjectTreeCache(100)
+    id = uuid4()
+    with cache.filling(id) as fill:
+        fill.store(tree(10))
+    assert cache.get(id, (2, VERSION[1])) is None
+    assert cache.size == 0
+    assert cache.stats() | {"hits": 0, "misses": 1, "invalidations": 1} == cache.stats()
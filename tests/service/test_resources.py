@@ -0,0 +1,50 @@
+import asyncio
+from pathlib import Path
+
+from src.service.image_generation.generator import ResourcePath
+from src.service.image_generation.resources import ResourceCache
+
+SMALL = "dog_v1.jpeg"
+MEDIUM = "golden-retriever.jpg"
+LARGE = "dog_v2.jpeg"
+
+
+async def test_payload_matches_file() -> None:
+    cache = ResourceCache(ResourcePath, 4 * 1024 * 1024)
+    assert await cache.get(SMALL) == (ResourcePath / SMALL).read_bytes()
+    assert SMALL in cache
+
+
+async def test_least_recently_used_is_evicted_over_budget() -> None:
+    size = (ResourcePath / MEDIUM).stat().st_size + (ResourcePath / LARGE).stat().st_size
+    cache = ResourceCache(ResourcePath, size)
+    await cache.get(SMALL)
+    await cache.get(MEDIUM)
+    await cache.get(SMALL)
+    await cache.get(LARGE)
+    assert MEDIUM not in cache
+    assert SMALL in cache
+    assert LARGE in cache
+    assert cache.size <= size
+
+
+async def test_payload_over_budget_is_not_cached() -> None:
+    cache = ResourceCache(ResourcePath, 1024)
+    assert await cache.get(SMALL) == (ResourcePath / SMALL).read_bytes()
+    assert SMALL not in cache
+    assert cache.size == 0
+
+
+async def test_preload_skips_missing_files(tmp_path: Path) -> None:
+    (tmp_path / "present.jpg").write_bytes(b"image")
+    cache = ResourceCache(tmp_path, 1024)
+    await cache.preload(["missing.jpg", "present.jpg"])
+    assert "present.jpg" in cache
+    assert "missing.jpg" not in cache
+
+
+async def test_concurrent_misses_share_one_payload() -> None:
+    cache = ResourceCache(ResourcePath, 4 * 1024 * 1024)
+    payloads = await asyncio.gather(*(cache.get(LARGE) for _ in range(8)))
+    assert all(payload is payloads[0] for payload in payloads)
+    assert cache.size == len(payloads[0])
@@ -0,0 +1,73 @@
+import json
+import os
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from src.service.image_generation.generator import get_output
+from src.service.image_generation.rules import KeywordMatcher, Rule, RuleEngine, RuleSet, load_rules
+
+
+def write_rules(path: Path, rules: list[dict[str, Any]]) -> Path:
+    path.write_text(json.dumps(rules))
+    return path
+
+
+def test_matcher_finds_overlapping_keywords() -> None:
+    keywords = ["he", "she", "his", "hers"]
+    matcher = KeywordMatcher(keywords)
+    assert {keywords[index] for index in matcher.scan("ushers")} == {"he", "she", "hers"}
+    assert matcher.scan("nothing") == set()
+
+
+def test_rule_needs_every_keyword() -> None:
+    rules = RuleSet([Rule(("red", "dress"), ("red_dress.png",)), Rule(("dress",), ("dress.png",))])
+    assert rules.match("a red dress") == rules.rules[0]
+    assert rules.match("a blue dress") == rules.rules[1]
+    assert rules.match("a red hat") is None
+
+
+def test_highest_priority_wins_then_file_order() -> None:
+    rules = RuleSet(
+        [
+            Rule(("dog",), ("first_dog.png",), priority=1),
+            Rule(("golden",), ("golden.png",), priority=5),
+            Rule(("dog",), ("second_dog.png",), priority=1),
+        ]
+    )
+    assert rules.match("golden dog").outputs == ("golden.png",)  # type: ignore[union-attr]
+    assert rules.match("a dog").outputs == ("first_dog.png",)  # type: ignore[union-attr]
+
+
+@pytest.mark.parametrize(
+    ("text", "outputs"),
+    [
+        ("black shoes", {"model_outfit_hat_bag_shoe_v1.png", "model_outfit_hat_bag_shoe_v2.png"}),
+        ("golden dog", {"dog_v1.jpeg", "dog_v2.jpeg"}),
+        ("golden retriever", {"golden-retriever.jpg"}),
+        ("leather jacket with shoe", {"jacket.png"}),
+        ("a cat", {"dog_v1.jpeg"}),
+    ],
+)
+async def test_bundled_rules_keep_previous_mapping(text: str, outputs: set[str]) -> None:
+    assert await get_output(text) in outputs
+
+
+def test_invalid_rule_is_rejected(tmp_path: Path) -> None:
+    with pytest.raises(ValueError, match="rule 0"):
+        load_rules(write_rules(tmp_path / "rules.json", [{"keywords": [], "outputs": ["a.png"]}]))
+
+
+async def test_engine_reloads_changed_file(tmp_path: Path) -> None:
+    path = write_rules(tmp_path / "rules.json", [{"keywords": ["dog"], "outputs": ["dog.png"]}])
+    engine = RuleEngine(path, reload_interval=0)
+    assert (await engine.current()).match("dog").outputs == ("dog.png",)  # type: ignore[union-attr]
+
+    write_rules(path, [{"keywords": ["dog"], "outputs": ["puppy.png"]}])
+    os.utime(path, ns=(engine.mtime + 1_000_000, engine.mtime + 1_000_000))
+    assert (await engine.current()).match("dog").outputs == ("puppy.png",)  # type: ignore[union-attr]
+
+    path.write_text("not json")
+    os.utime(path, ns=(engine.mtime + 1_000_000, engine.mtime + 1_000_000))
+    assert (await engine.current()).match("dog").outputs == ("puppy.png",)  # type: ignore[union-attr]
@@ -0,0 +1,340 @@
+import hashlib
+import sqlite3
+from collections.abc import AsyncGenerator
+from uuid import uuid4
+
+import pytest
+from litestar.exceptions import HTTPException
+from litestar.stores.file import FileStore
+
+from src.service.storage.local import LocalFileStorage
+from src.service.storage.migrate import migrate_layout, unwrap_legacy_blobs, unwrap_once, verify_layout
+from src.service.storage.sniff import sniff_content_type
+from src.service.storage.streaming import body_chunks
+
+IMAGE = b"image"
+OTHER_IMAGE = b"other_image"
+
+
+@pytest.fixture(scope="function")
+async def cas_storage() -> AsyncGenerator[LocalFileStorage, None]:
+    storage = LocalFileStorage("test", content_addressed=True)
+    yield storage
+    await storage.delete_all()
+
+
+async def count_blobs(storage: LocalFileStorage) -> int:
+    return len([path for path in storage.root.iterdir() if len(path.name) == 64])
+
+
+async def test_identical_payloads_are_stored_once(cas_storage: LocalFileStorage) -> None:
+    first = await cas_storage.create(IMAGE)
+    second = await cas_storage.create(IMAGE)
+    assert first != second
+    assert await cas_storage.read(first) == IMAGE
+    assert await cas_storage.read(second) == IMAGE
+    assert await count_blobs(cas_storage) == 1
+
+
+async def test_delete_keeps_bytes_until_last_reference(cas_storage: LocalFileStorage) -> None:
+    first = await cas_storage.create(IMAGE)
+    second = await cas_storage.create(IMAGE)
+    await cas_storage.delete(first)
+    assert await cas_storage.read(first) is None
+    assert await cas_storage.read(second) == IMAGE
+    await cas_storage.delete(second)
+    assert await cas_storage.read(second) is None
+    assert await count_blobs(cas_storage) == 0
+
+
+async def test_update_repoints_only_the_updated_id(cas_storage: LocalFileStorage) -> None:
+    first = await cas_storage.create(IMAGE)
+    second = await cas_storage.create(IMAGE)
+    await cas_storage.update(OTHER_IMAGE, first)
+    assert await cas_storage.read(first) == OTHER_IMAGE
+    assert await cas_storage.read(second) == IMAGE
+    assert await count_blobs(cas_storage) == 2
+    await cas_storage.update(OTHER_IMAGE, second)
+    assert await count_blobs(cas_storage) == 1
+
+
+async def test_unindexed_blobs_remain_readable(cas_storage: LocalFileStorage) -> None:
+    legacy = await LocalFileStorage("test").create(IMAGE)
+    assert await cas_storage.read(legacy) == IMAGE
+    await cas_storage.delete(legacy)
+    assert await cas_storage.read(legacy) is None
+
+
+async def test_legacy_filestore_blobs_are_unwrapped(cas_storage: LocalFileStorage) -> None:
+    legacy_id = uuid4()
+    await FileStore(cas_storage.root).set(str(legacy_id), IMAGE)
+    assert await cas_storage.read(legacy_id) != IMAGE
+    assert unwrap_legacy_blobs(cas_storage.root) == 1
+    assert await cas_storage.read(legacy_id) == IMAGE
+
+
+async def test_legacy_blobs_are_unwrapped_once(cas_storage: LocalFileStorage) -> None:
+    await FileStore(cas_storage.root).set(str(uuid4()), IMAGE)
+    assert unwrap_once(cas_storage.root) == 1
+    # Later blobs are raw files, the store is not scanned again
+    await FileStore(cas_storage.root).set(str(uuid4()), IMAGE)
+    assert unwrap_once(cas_storage.root) == 0
+
+
+async def chunked(data: bytes, size: int = 3) -> AsyncGenerator[bytes, None]:
+    for start in range(0, len(data), size):
+        yield data[start : start + size]
+
+
+@pytest.mark.parametrize("content_addressed", [True, False])
+async def test_streamed_writes_round_trip(content_addressed: bool) -> None:
+    storage = LocalFileStorage("test", content_addressed=content_addressed)
+    id = await storage.create_stream(chunked(IMAGE))
+    assert await storage.read(id) == IMAGE
+    await storage.update_stream(chunked(OTHER_IMAGE), id)
+    assert await storage.read(id) == OTHER_IMAGE
+    assert not [path for path in storage.root.iterdir() if ".tmp" in path.name]
+    await storage.delete_all()
+
+
+async def test_streamed_writes_are_deduplicated(cas_storage: LocalFileStorage) -> None:
+    first = await cas_storage.create(IMAGE)
+    second = await cas_storage.create_stream(chunked(IMAGE))
+    assert await cas_storage.read(second) == IMAGE
+    assert await count_blobs(cas_storage) == 1
+    await cas_storage.delete(first)
+    assert await cas_storage.read(second) == IMAGE
+
+
+@pytest.mark.parametrize("content_addressed", [True, False])
+async def test_delete_many_removes_every_blob(content_addressed: bool) -> None:
+    storage = LocalFileStorage("test", content_addressed=content_addressed)
+    ids = [await storage.create(IMAGE if i % 2 else OTHER_IMAGE) for i in range(5)]
+    kept = await storage.create(IMAGE)
+    await storage.delete_many(ids, batch_size=2)
+    assert [await storage.read(id) for id in ids] == [None] * 5
+    assert await storage.read(kept) == IMAGE
+    await storage.delete_all()
+
+
+@pytest.mark.parametrize("content_addressed", [True, False])
+async def test_digest_is_the_sha256_of_the_content(content_addressed: bool) -> None:
+    storage = LocalFileStorage("test", content_addressed=content_addressed)
+    id = await storage.create(IMAGE)
+    assert await storage.digest(id) == hashlib.sha256(IMAGE).hexdigest()
+    await storage.update(OTHER_IMAGE, id)
+    assert await storage.digest(id) == hashlib.sha256(OTHER_IMAGE).hexdigest()
+    await storage.delete(id)
+    assert await storage.digest(id) is None
+    await storage.delete_all()
+
+
+@pytest.mark.parametrize("content_addressed", [True, False])
+async def test_copy_outlives_the_original(content_addressed: bool) -> None:
+    storage = LocalFileStorage("test", content_addressed=content_addressed)
+    id = await storage.create(IMAGE)
+    copy = await storage.copy(id)
+    assert copy is not None
+    assert copy != id
+    await storage.delete(id)
+    assert await storage.read(copy) == IMAGE
+    assert await storage.copy(id) is None
+    if content_addressed:
+        assert await count_blobs(storage) == 1
+    await storage.delete_all()
+
+
+@pytest.mark.parametrize("content_addressed", [True, False])
+async def test_sharded_layout_round_trip(content_addressed: bool) -> None:
+    storage = LocalFileStorage("test", content_addressed=content_addressed, layout="sharded")
+    id = await storage.create(IMAGE)
+    streamed = await storage.create_stream(chunked(OTHER_IMAGE))
+    assert await storage.read(id) == IMAGE
+    assert await storage.read(streamed) == OTHER_IMAGE
+    assert not [path for path in storage.root.iterdir() if path.is_file() and path.name.isalnum()]
+    assert verify_layout(storage.root, "sharded") == []
+    await storage.update(OTHER_IMAGE, id)
+    assert await storage.read(id) == OTHER_IMAGE
+    await storage.delete(id)
+    assert await storage.read(id) is None
+    await storage.delete_all()
+
+
+def test_unknown_layout_is_rejected() -> None:
+    with pytest.raises(ValueError, match="layout"):
+        LocalFileStorage("test", layout="nested")
+
+
+async def test_flat_store_migrates_to_sharded_and_back(cas_storage: LocalFileStorage) -> None:
+    ids = [await cas_storage.create(IMAGE), await cas_storage.create(OTHER_IMAGE)]
+    legacy = await LocalFileStorage("test").create(IMAGE)
+    assert verify_layout(cas_storage.root, "flat") == []
+    assert len(verify_layout(cas_storage.root, "sharded")) == 5
+
+    assert migrate_layout(cas_storage.root, "sharded") == 3
+    assert verify_layout(cas_storage.root, "sharded") == []
+    sharded = LocalFileStorage("test", content_addressed=True, layout="sharded")
+    assert [await sharded.read(id) for id in [*ids, legacy]] == [IMAGE, OTHER_IMAGE, IMAGE]
+    assert migrate_layout(cas_storage.root, "sharded") == 0
+
+    assert migrate_layout(cas_storage.root, "flat") == 3
+    assert verify_layout(cas_storage.root, "flat") == []
+    assert not [path for path in cas_storage.root.iterdir() if path.is_dir()]
+    assert [await cas_storage.read(id) for id in [*ids, legacy]] == [IMAGE, OTHER_IMAGE, IMAGE]
+
+
+PNG_HEADER = b"\x89PNG\r\n\x1a\n"
+
+
+@pytest.mark.parametrize(
+    "head, expected",
+    [
+        (PNG_HEADER + b"\x00\x00\x00\x0dIHDR", "image/png"),
+        (b"\xff\xd8\xff\xe0\x00\x10JFIF", "image/jpeg"),
+        (b"RIFF\x24\x00\x00\x00WEBPVP8 ", "image/webp"),
+        (b"GIF89a\x01\x00", "image/gif"),
+        (b"RIFF\x24\x00\x00\x00WAVEfmt ", "application/octet-stream"),
+        (b"<svg xmlns=", "application/octet-stream"),
+        (b"", "application/octet-stream"),
+    ],
+)
+def test_content_type_is_sniffed(head: bytes, expected: str) -> None:
+    assert sniff_content_type(head) == expected
+
+
+async def test_index_records_blob_metadata(cas_storage: LocalFileStorage) -> None:
+    image = PNG_HEADER + b"pixels"
+    id = await cas_storage.create(image)
+    streamed = await cas_storage.create_stream(chunked(IMAGE))
+    created = await cas_storage.metadata(id)
+    assert created is not None
+    assert (created.size, created.content_type, created.digest) == (
+        len(image),
+        "image/png",
+        hashlib.sha256(image).hexdigest(),
+    )
+    assert created.created_at == created.updated_at
+    metadata = await cas_storage.metadata(streamed)
+    assert metadata is not None
+    assert (metadata.size, metadata.content_type, metadata.digest) == (
+        len(IMAGE),
+        "application/octet-stream",
+        hashlib.sha256(IMAGE).hexdigest(),
+    )
+    await cas_storage.update(IMAGE, id)
+    updated = await cas_storage.metadata(id)
+    assert updated is not None
+    assert (updated.size, updated.content_type, updated.created_at) == (
+        len(IMAGE),
+        "application/octet-stream",
+        created.created_at,
+    )
+    assert updated.updated_at is not None and created.updated_at is not None
+    assert updated.updated_at > created.updated_at
+    await cas_storage.delete(id)
+    assert await cas_storage.metadata(id) is None
+
+
+async def test_metadata_does_not_touch_blob_files(cas_storage: LocalFileStorage) -> None:
+    image = PNG_HEADER + b"pixels"
+    id = await cas_storage.create(image)
+    digest = hashlib.sha256(image).hexdigest()
+    path = cas_storage._path(digest)
+    path.rename(path.with_name("moved"))
+    try:
+        assert await cas_storage.info(id) == (len(image), digest)
+        assert await cas_storage.digest(id) == digest
+        metadata = await cas_storage.metadata(id)
+        assert metadata is not None
+        assert metadata.content_type == "image/png"
+        assert [blob.id for blob in await cas_storage.list_blobs()] == [id]
+    finally:
+        path.with_name("moved").rename(path)
+    response = await cas_storage.stream(id)
+    assert response.headers["Content-Type"] == "image/png"
+
+
+async def test_streams_open_the_file_once_sent(cas_storage: LocalFileStorage) -> None:
+    id = await cas_storage.create(IMAGE)
+    path = cas_storage._path(hashlib.sha256(IMAGE).hexdigest())
+    path.rename(path.with_name("moved"))
+    try:
+        with pytest.raises(HTTPException) as e:
+            await cas_storage.stream(id, "bytes=100-")
+        assert e.value.status_code == 416
+        response = await cas_storage.stream(id, "bytes=1-")
+    finally:
+        path.with_name("moved").rename(path)
+    assert b"".join([chunk async for chunk in body_chunks(response)]) == IMAGE[1:]
+
+
+@pytest.mark.parametrize("byte_range", ["bytes=abc", "bytes=-", "bytes=5-3", "bytes=1-x", "bytes=--1"])
+async def test_invalid_ranges_are_ignored(cas_storage: LocalFileStorage, byte_range: str) -> None:
+    id = await cas_storage.create(OTHER_IMAGE)
+    response = await cas_storage.stream(id, byte_range)
+    assert response.status_code == 200
+    assert response.headers["Content-Length"] == str(len(OTHER_IMAGE))
+
+
+async def test_list_blobs_pages_in_id_order(cas_storage: LocalFileStorage) -> None:
+    ids = sorted([await cas_storage.create(IMAGE) for _ in range(5)], key=str)
+    first = await cas_storage.list_blobs(limit=3)
+    assert [blob.id for blob in first] == ids[:3]
+    rest = await cas_storage.list_blobs(after=first[-1].id, limit=3)
+    assert [blob.id for blob in rest] == ids[3:]
+    assert {blob.size for blob in [*first, *rest]} == {len(IMAGE)}
+
+
+async def test_indexes_without_metadata_are_upgraded(cas_storage: LocalFileStorage) -> None:
+    # Index and blob as written before the index recorded metadata
+    legacy_id, digest = uuid4(), hashlib.sha256(PNG_HEADER).hexdigest()
+    cas_storage.root.mkdir(parents=True, exist_ok=True)
+    cas_storage._path(digest).write_bytes(PNG_HEADER)
+    with sqlite3.connect(cas_storage.root / "index.sqlite") as conn:
+        conn.executescript(
+            "CREATE TABLE blob (digest TEXT PRIMARY KEY, refcount INTEGER NOT NULL);"
+            "CREATE TABLE blob_ref (id TEXT PRIMARY KEY, digest TEXT NOT NULL REFERENCES blob (digest));"
+        )
+        conn.execute("INSERT INTO blob VALUES (?, 1)", (digest,))
+        conn.execute("INSERT INTO blob_ref VALUES (?, ?)", (str(legacy_id), digest))
+    conn.close()
+    storage = LocalFileStorage("test", content_addressed=True)
+    legacy = await storage.metadata(legacy_id)
+    assert legacy is not None
+    assert (legacy.size, legacy.content_type, legacy.digest, legacy.created_at) == (
+        len(PNG_HEADER),
+        "image/png",
+        digest,
+        None,
+    )
+    assert (await storage.stream(legacy_id)).headers["Content-Type"] == "image/png"
+    id = await storage.create(IMAGE)
+    assert {blob.id for blob in await storage.list_blobs()} == {legacy_id, id}
+    await storage.aclose()
+
+
+async def test_index_lookups_share_a_connection(cas_storage: LocalFileStorage) -> None:
+    id = await cas_storage.create(IMAGE)
+    conn = cas_storage.index._conn
+    assert conn is not None
+    assert await cas_storage.read(id) == IMAGE
+    assert await cas_storage.metadata(id) is not None
+    assert cas_storage.index._conn is conn
+    # Cleared through another instance, the index file is replaced under the open connection
+    await LocalFileStorage("test", content_addressed=True).delete_all()
+    assert await cas_storage.read(id) is None
+    other = await cas_storage.create(OTHER_IMAGE)
+    assert await cas_storage.read(other) == OTHER_IMAGE
+    assert cas_storage.index._conn is not conn
+
+
+async def test_plain_storage_describes_blobs_from_their_files() -> None:
+    storage = LocalFileStorage("test")
+    id = await storage.create(PNG_HEADER)
+    metadata = await storage.metadata(id)
+    assert metadata is not None
+    assert (metadata.size, metadata.content_type, metadata.digest) == (len(PNG_HEADER), "image/png", None)
+    assert (await storage.stream(id)).headers["Content-Type"] == "image/png"
+    with pytest.raises(NotImplementedError):
+        await storage.list_blobs()
+    await storage.delete_all()